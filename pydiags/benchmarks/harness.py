@@ -0,0 +1,454 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Overhead of the diag harness itself on synthetic fio json+ outputs.
+
+fio is not run: realistic json+ outputs are generated for every step of every
+DUT and the stages the diag runs on them are timed one by one, the same way
+the diag runs them:
+  parse: jsonstream.load_step of every fio output.
+  compress: results.compress of every fio output kept in the log dir.
+  evaluate: BenchmarkSuite.evaluate_all on the results of all the DUTs.
+  emit: OCP bandwidth, IOPS and latency measurements of every job and a
+    diagnosis of every step.
+  report: Report reading back every fio output.
+Every stage reports its wall-clock time, throughput and peak Python memory
+(tracemalloc).
+
+Usage:
+  python3 -m pydiags.benchmarks.harness --scales=small,medium
+A stage slower or bigger than its baseline by more than --tolerance, 50% by
+default, makes the run exit with 1, --update_baselines records the run as the
+new baselines. Times are kept in multiples of a reference workload timed on
+the host running the harness, see calibrate, so that baselines recorded on
+one host hold on a faster or slower one. Peak memory is kept in bytes.
+"""
+import argparse
+import contextlib
+import dataclasses
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import ocptv.output as tv
+from ocptv.output.config import get_config
+
+from ..libs import commonlib
+from ..libs import jsonstream
+from ..libs import performance
+from ..libs import results
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+MIB = 1 << 20
+# the percentiles fio prints by default
+_FIO_PERCENTILES = (1, 5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99, 99.5,
+                    99.9, 99.95, 99.99)
+_IO_TYPES = ("read", "write")
+_IOS_PER_JOB = 1000000
+_RUNTIME_MSEC = 60000
+# a stage faster than this is too noisy to be compared with its baseline
+_MIN_COMPARED_SEC = 0.05
+_MIN_COMPARED_BYTES = MIB
+_CALIBRATION_RUNS = 10
+
+
+@dataclasses.dataclass(frozen=True)
+class Scale:
+  """Size of a synthetic run.
+
+  Attributes:
+    duts: number of DUTs.
+    steps: playbook steps run on every DUT.
+    jobs: fio jobs of every step.
+    bins: latency bins of every job and data direction, fio json+ reports up
+      to 1856 of them.
+  """
+  duts: int
+  steps: int
+  jobs: int
+  bins: int
+
+
+SCALES = {
+    "small": Scale(duts=2, steps=2, jobs=4, bins=256),
+    "medium": Scale(duts=16, steps=4, jobs=8, bins=1024),
+    "large": Scale(duts=128, steps=2, jobs=8, bins=1024),
+}
+
+
+@dataclasses.dataclass
+class StageResult:
+  """Cost of a single stage.
+
+  Attributes:
+    scale: name of the scale.
+    stage: name of the stage.
+    seconds: wall-clock time of the stage.
+    items: what the stage went through, e.g. jobs parsed.
+    unit: unit of the items.
+    peak_bytes: peak Python memory allocated during the stage.
+  """
+  scale: str
+  stage: str
+  seconds: float
+  items: int
+  unit: str
+  peak_bytes: int
+
+  @property
+  def key(self):
+    return "%s.%s" % (self.scale, self.stage)
+
+  @property
+  def throughput(self):
+    return self.items / self.seconds if self.seconds else float("inf")
+
+
+def _latency_section(rng, bins, ios):
+  """Returns a json+ latency section with log-normally distributed bins."""
+  values = np.unique(
+      rng.lognormal(mean=11, sigma=0.8, size=bins * 2).astype(np.int64))
+  values = np.sort(rng.choice(values, size=min(bins, values.size),
+                              replace=False))
+  weights = rng.lognormal(size=values.size)
+  counts = np.maximum(1, (weights / weights.sum() * ios).astype(np.int64))
+  cumulative = np.cumsum(counts)
+  ranks = np.searchsorted(cumulative,
+                          np.asarray(_FIO_PERCENTILES) * cumulative[-1] / 100)
+  return {
+      "min": int(values[0]),
+      "max": int(values[-1]),
+      "mean": float(np.average(values, weights=counts)),
+      "stddev": float(np.std(values)),
+      "N": int(cumulative[-1]),
+      "percentile": {
+          "%f" % percentile: int(values[min(rank, values.size - 1)])
+          for percentile, rank in zip(_FIO_PERCENTILES, ranks)
+      },
+      "bins": {str(value): int(count) for value, count in zip(values, counts)},
+  }
+
+
+def fio_output(scale, seed=0):
+  """Generates the json+ output of a single step.
+
+  Args:
+    scale: size of the output.
+    seed: seed of the latency distributions.
+  Returns:
+    The fio output, as fio --output-format=json+ prints it.
+  """
+  rng = np.random.default_rng(seed)
+  jobs = []
+  for job_index in range(scale.jobs):
+    job = {
+        "jobname": "job%d" % job_index,
+        "groupid": 0,
+        "error": 0,
+        "job options": {"rw": "randrw", "bs": "4k", "iodepth": "256"},
+        "usr_cpu": float(rng.uniform(1, 10)),
+        "sys_cpu": float(rng.uniform(10, 40)),
+    }
+    for io_type in _IO_TYPES:
+      iops = _IOS_PER_JOB * 1000 / _RUNTIME_MSEC
+      job[io_type] = {
+          "io_bytes": _IOS_PER_JOB * 4096,
+          "io_kbytes": _IOS_PER_JOB * 4,
+          "bw": int(iops * 4),
+          "iops": iops,
+          "runtime": _RUNTIME_MSEC,
+          "total_ios": _IOS_PER_JOB,
+          "slat_ns": {"min": 500, "max": 90000, "mean": 1500.5, "N":
+                      _IOS_PER_JOB},
+          "clat_ns": _latency_section(rng, scale.bins, _IOS_PER_JOB),
+          "lat_ns": {"min": 1500, "max": 990000, "mean": 91500.5, "N":
+                     _IOS_PER_JOB},
+      }
+    jobs.append(job)
+  return {
+      "fio version": "fio-3.35",
+      "timestamp": 1700000000,
+      "global options": {"direct": "1", "ioengine": "libaio"},
+      "jobs": jobs,
+      "disk_util": [{"name": "nvme0n1", "util": 99.5}],
+  }
+
+
+def targets(scale):
+  """Returns a target file checking every step with histogram targets."""
+  workloads = [{
+      "ioType": "rand" + io_type,
+      "workloadNum": index + 1,
+      "targets": {
+          "bwMbytesPerSec": "10",
+          "lat999thUsec": "7000",
+          "lat99999thUsec": "20000",
+          "latFracAboveUsec": {"thresholdUsec": "5000",
+                               "maxFraction": "0.0001"},
+      },
+  } for index, io_type in enumerate(_IO_TYPES)]
+  return {"benchmarks": [{
+      "basename": "Benchmark%d" % step,
+      "step": "step%d.fio" % step,
+      "workloads": workloads,
+  } for step in range(scale.steps)]}
+
+
+class _NullWriter(tv.Writer):
+  """Counts the OCP output instead of printing it."""
+
+  def __init__(self):
+    self.written = 0
+
+  def write(self, buffer: str):
+    self.written += len(buffer)
+
+
+@contextlib.contextmanager
+def _measure(scale_name, stage, unit, stage_results, trace_memory):
+  """Times a stage or tracks its peak memory, the items are set by it."""
+  stage_result = StageResult(scale_name, stage, 0, 0, unit, 0)
+  if trace_memory:
+    tracemalloc.start()
+  start = time.perf_counter()
+  try:
+    yield stage_result
+  finally:
+    stage_result.seconds = time.perf_counter() - start
+    if trace_memory:
+      stage_result.peak_bytes = tracemalloc.get_traced_memory()[1]
+      tracemalloc.stop()
+  stage_results.append(stage_result)
+
+
+def _emit(ocp_run, dut, steps):
+  """Emits the results of a DUT the way the diag reports its steps."""
+  count = 0
+  with ocp_run.scope(dut=tv.Dut(id="bench", name=dut)):
+    for step_result in steps:
+      step = ocp_run.add_step(step_result.name)
+      with step.scope():
+        for job in step_result.jobs:
+          for io_type, io_stats in job.io_stats.items():
+            prefix = "%s.%s." % (job.name, io_type)
+            step.add_measurement(name=prefix + "bwKbytesPerSec",
+                                 value=io_stats.bw, unit="KiB/s")
+            step.add_measurement(name=prefix + "iops", value=io_stats.iops,
+                                 unit="IOPS")
+            step.add_measurement(
+                name=prefix + "clat999thNsec",
+                value=io_stats.latencies["clat_ns"].percentiles["99.900000"],
+                unit="ns")
+            count += 3
+        step.add_diagnosis(tv.DiagnosisType.PASS,
+                           verdict="%s passed" % step_result.name)
+  return count
+
+
+def _copy_outputs(templates, duts, work_dir):
+  """Puts the fio outputs of every step in the log dir of every DUT."""
+  paths = {}
+  for dut in range(duts):
+    dut_dir = os.path.join(work_dir, "nvme%dn1" % dut)
+    os.makedirs(dut_dir, exist_ok=True)
+    paths["/dev/nvme%dn1" % dut] = [
+        shutil.copy(template, dut_dir) for template in templates
+    ]
+  return paths
+
+
+def _run_stages(scale_name, scale, paths, trace_memory):
+  """Runs every stage once, see run_scale."""
+  stage_results = []
+  logs = {}
+  with _measure(scale_name, "parse", "jobs", stage_results,
+                trace_memory) as stage:
+    for dut, dut_paths in paths.items():
+      logs[dut] = [
+          jsonstream.load_step("step%d.fio" % step, path)
+          for step, path in enumerate(dut_paths)
+      ]
+      stage.items += sum(len(step_result.jobs) for step_result in logs[dut])
+  with _measure(scale_name, "compress", "bytes", stage_results,
+                trace_memory) as stage:
+    for dut, dut_paths in paths.items():
+      for step_result, path in zip(logs[dut], dut_paths):
+        stage.items += os.path.getsize(path)
+        step_result.raw_path = results.compress(path)
+  with _measure(scale_name, "evaluate", "jobs", stage_results,
+                trace_memory) as stage:
+    performance.BenchmarkSuite(targets(scale)).evaluate_all(logs)
+    stage.items = scale.duts * scale.steps * scale.jobs
+  writer = get_config().writer
+  tv.config(writer=_NullWriter())
+  try:
+    with _measure(scale_name, "emit", "measurements", stage_results,
+                  trace_memory) as stage:
+      ocp_run = tv.TestRun(name="HarnessBench", version="1.0")
+      for dut, steps in logs.items():
+        stage.items += _emit(ocp_run, dut, steps)
+  finally:
+    tv.config(writer=writer)
+  with _measure(scale_name, "report", "steps", stage_results,
+                trace_memory) as stage:
+    sink = io.StringIO()
+    for steps in logs.values():
+      for step_result in steps:
+        print(step_result.load_raw(), file=sink)
+        sink.seek(0)
+        sink.truncate()
+        stage.items += 1
+  return stage_results
+
+
+def run_scale(scale_name, scale, work_dir):
+  """Runs every stage on a synthetic run of the given scale.
+
+  The stages run twice, timed first and then with tracemalloc tracking their
+  memory, which would slow the timed run down several times.
+
+  Args:
+    scale_name: name of the scale in the results.
+    scale: size of the run.
+    work_dir: directory the fio outputs are generated in.
+  Returns:
+    The cost of every stage.
+  """
+  templates = []
+  for step in range(scale.steps):
+    path = os.path.join(work_dir, "step%d.json" % step)
+    with open(path, "w") as f:
+      json.dump(fio_output(scale, seed=step), f, indent=2)
+    templates.append(path)
+  stage_results = _run_stages(
+      scale_name, scale, _copy_outputs(templates, scale.duts, work_dir),
+      trace_memory=False)
+  traced_results = _run_stages(
+      scale_name, scale, _copy_outputs(templates, scale.duts, work_dir),
+      trace_memory=True)
+  for stage_result, traced_result in zip(stage_results, traced_results):
+    stage_result.peak_bytes = traced_result.peak_bytes
+  return stage_results
+
+
+def calibrate(runs=_CALIBRATION_RUNS):
+  """Times a reference workload on this host.
+
+  The workload parses and compresses the fio json+ output of a medium step,
+  the bulk of what the stages do. The fastest of a few runs is the least
+  noisy.
+
+  Args:
+    runs: times the workload is run.
+  Returns:
+    The seconds the workload takes.
+  """
+  text = json.dumps(fio_output(SCALES["medium"]), indent=2)
+  fastest = float("inf")
+  for _ in range(runs):
+    start = time.perf_counter()
+    json.loads(text)
+    gzip.compress(text.encode(), compresslevel=commonlib.COMPRESS_LEVEL)
+    fastest = min(fastest, time.perf_counter() - start)
+  return fastest
+
+
+def compare(stage_results, baselines, tolerance, reference_sec):
+  """Returns the stages slower or bigger than their baselines.
+
+  Args:
+    stage_results: the stages run.
+    baselines: {scale.stage: {"relativeTime", "peakBytes"}} of earlier runs,
+      see to_baselines.
+    tolerance: relative slowdown or growth allowed, e.g. 0.5 for 50%.
+    reference_sec: seconds the reference workload takes on this host, see
+      calibrate.
+  Returns:
+    A message for every stage over its baseline.
+  """
+  slowdowns = []
+  for stage_result in stage_results:
+    baseline = baselines.get(stage_result.key)
+    if baseline is None:
+      continue
+    # what the baseline takes on this host
+    baseline_sec = baseline["relativeTime"] * reference_sec
+    if (stage_result.seconds > baseline_sec * (1 + tolerance) and
+        stage_result.seconds - baseline_sec > _MIN_COMPARED_SEC):
+      slowdowns.append("%s took %.3fs, baseline %.3fs on this host" % (
+          stage_result.key, stage_result.seconds, baseline_sec))
+    if (stage_result.peak_bytes > baseline["peakBytes"] * (1 + tolerance) and
+        stage_result.peak_bytes - baseline["peakBytes"] > _MIN_COMPARED_BYTES):
+      slowdowns.append("%s peaked at %.1f MiB, baseline %.1f MiB" % (
+          stage_result.key, stage_result.peak_bytes / MIB,
+          baseline["peakBytes"] / MIB))
+  return slowdowns
+
+
+def to_baselines(stage_results, reference_sec):
+  """Returns the baselines of the stages, times relative to the reference."""
+  return {
+      stage_result.key: {
+          "relativeTime": round(stage_result.seconds / reference_sec, 2),
+          "peakBytes": stage_result.peak_bytes}
+      for stage_result in stage_results
+  }
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument(
+      "--scales",
+      help="Comma separated scales to run: %s." % ", ".join(SCALES),
+      default="small,medium")
+  parser.add_argument(
+      "--baselines", help="JSON file with the baselines.", default=BASELINES)
+  parser.add_argument(
+      "--tolerance",
+      help="Relative slowdown or memory growth of a stage allowed.",
+      type=float,
+      default=0.5)
+  parser.add_argument(
+      "--update_baselines",
+      help="Record this run as the baselines of its scales.",
+      action="store_true")
+  config = parser.parse_args(argv)
+  reference_sec = calibrate()
+  stage_results = []
+  for scale_name in config.scales.split(","):
+    with tempfile.TemporaryDirectory() as work_dir:
+      stage_results.extend(run_scale(scale_name, SCALES[scale_name], work_dir))
+  print("reference workload: %.4fs" % reference_sec)
+  for stage_result in stage_results:
+    print("%-16s %8.3fs %14.1f %s/s %8.1f MiB" % (
+        stage_result.key, stage_result.seconds, stage_result.throughput,
+        stage_result.unit, stage_result.peak_bytes / MIB))
+  baselines = {}
+  if os.path.exists(config.baselines):
+    with open(config.baselines) as f:
+      baselines = json.load(f)
+  if config.update_baselines:
+    baselines.update(to_baselines(stage_results, reference_sec))
+    with open(config.baselines, "w") as f:
+      json.dump(baselines, f, indent=2, sort_keys=True)
+      f.write("\n")
+    return 0
+  slowdowns = compare(stage_results, baselines, config.tolerance,
+                      reference_sec)
+  for slowdown in slowdowns:
+    print("Harness slowdown: %s" % slowdown)
+  return 1 if slowdowns else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,83 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import tempfile
+import unittest
+
+import ocptv.output as tv
+from ocptv.output.config import get_config
+
+from . import harness
+from ..libs import performance
+from ..libs import results
+
+_TINY = harness.Scale(duts=2, steps=2, jobs=2, bins=32)
+
+
+class HarnessTest(unittest.TestCase):
+
+  def test_fio_output(self):
+    step_result = results.StepResult.from_fio(
+        "step0.fio", harness.fio_output(_TINY))
+    self.assertEqual(len(step_result.jobs), 2)
+    clat = step_result.jobs[0].io_stats["read"].latencies["clat_ns"]
+    self.assertEqual(clat.histogram.values.size, 32)
+    self.assertEqual(clat.histogram.total, clat.count)
+    self.assertEqual(clat.histogram.percentiles([99.9])[0],
+                     clat.percentiles["99.900000"])
+    # the synthetic latencies meet the targets of the suite
+    self.assertEqual(performance.BenchmarkSuite(
+        harness.targets(_TINY)).evaluate([step_result]), [])
+
+  def test_run_scale(self):
+    writer = tv.StdoutWriter()
+    self.addCleanup(tv.config, writer=get_config().writer)
+    tv.config(writer=writer)
+    with tempfile.TemporaryDirectory() as work_dir:
+      stage_results = harness.run_scale("tiny", _TINY, work_dir)
+    # the writer configured by the caller is put back after the emit stage
+    self.assertIs(get_config().writer, writer)
+    self.assertEqual(
+        [stage_result.key for stage_result in stage_results],
+        ["tiny.parse", "tiny.compress", "tiny.evaluate", "tiny.emit",
+         "tiny.report"])
+    items = {stage_result.stage: stage_result.items
+             for stage_result in stage_results}
+    self.assertEqual(items["parse"], 8)
+    self.assertEqual(items["emit"], 8 * 2 * 3)
+    self.assertEqual(items["report"], 4)
+    for stage_result in stage_results:
+      self.assertGreater(stage_result.seconds, 0)
+      self.assertGreater(stage_result.peak_bytes, 0)
+
+  def test_compare(self):
+    stage_results = [
+        harness.StageResult("medium", "emit", 2.0, 100, "measurements", 1000),
+        harness.StageResult("medium", "parse", 0.01, 8, "jobs", 8 * harness.MIB),
+        harness.StageResult("small", "parse", 0.01, 8, "jobs", 1000),
+    ]
+    baselines = harness.to_baselines(stage_results, reference_sec=0.01)
+    self.assertEqual(baselines["medium.emit"]["relativeTime"], 200)
+    self.assertEqual(harness.compare(stage_results, baselines, 0.5, 0.01), [])
+    # the same baselines on a host twice as slow
+    self.assertEqual(harness.compare(
+        [harness.StageResult("medium", "emit", 4.0, 100, "measurements",
+                             1000)], baselines, 0.5, 0.02), [])
+    stage_results[0].seconds = 4.0
+    # too short to be compared
+    stage_results[1].seconds = 0.03
+    stage_results[1].peak_bytes = 16 * harness.MIB
+    slowdowns = harness.compare(stage_results, baselines, 0.5, 0.01)
+    self.assertEqual(len(slowdowns), 2)
+    self.assertIn("medium.emit took 4.000s, baseline 2.000s", slowdowns[0])
+    self.assertIn("medium.parse peaked at 16.0 MiB", slowdowns[1])
+
+  def test_calibrate(self):
+    self.assertGreater(harness.calibrate(runs=1), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
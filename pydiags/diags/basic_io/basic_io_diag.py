@@ -7,23 +7,62 @@
 """Basic IO Diag, fio based test to check basic storage functionality."""
 import argparse
 import collections
+import contextlib
+import concurrent.futures
+import dataclasses
+import glob
 import json
 import os
 import tempfile
+import time
 
 import ocptv.output as tv
 
 from ...libs import argparser
+from ...libs import batch
+from ...libs import checkpoint
 from ...libs import commonlib
 from ...libs import diag
+from ...libs import dryrun
+from ...libs import dutrun
+from ...libs import endurance
+from ...libs import engine
+from ...libs import fiojob
 from ...libs import generic
+from ...libs import health
+from ...libs import histogram
+from ...libs import jsonstream
 from ...libs import operations
 from ...libs import performance
+from ...libs import playbook as playbook_lib
+from ...libs import precondition
+from ...libs import preflight
+from ...libs import regression
+from ...libs import remote
+from ...libs import results
+from ...libs import resultsdb
+from ...libs import shard
+from ...libs import streaming
+from ...libs import sweep
+from ...libs import timeseries
+from ...libs import verify
 from ...libs.diag import TestError
 
 _FIO_PATH = '/usr/bin/fio'
 _OUTPUT_FORMAT = '--output-format=json+'
 _ARGS = [_FIO_PATH, _OUTPUT_FORMAT]
+_BASELINE_FROM_RESULTS_DB = 'results_db'
+_RAW_SUFFIX = '.json.gz'
+# completion latency percentiles reported for every engine compared
+_ENGINE_PERCENTILES = (50, 99, 99.9)
+
+
+def _format_duration(seconds):
+  if seconds is None:
+    return 'unknown'
+  minutes, seconds = divmod(int(seconds), 60)
+  hours, minutes = divmod(minutes, 60)
+  return '%dh%02dm%02ds' % (hours, minutes, seconds)
 
 
 class BasicIODiag(diag.Diag):
@@ -46,28 +85,73 @@ class BasicIODiag(diag.Diag):
     self._config = config
     self._logs = collections.defaultdict(list)
     self._driver = driver
+    if self._config.dry_run:
+      self._driver = dryrun.SimulatedDUTOperations
     self._drives = []
-    self._log_dir = tempfile.mkdtemp()
-    self._run = tv.TestRun(name='BasicIODiag', version='1.0')
+    if self._config.resume and not self._config.log_dir:
+      raise TestError('--resume requires the --log_dir of the run to resume.')
+    if self._config.batch_steps > 1 and self._config.status_interval:
+      raise TestError('--batch_steps cannot report the progress of a step,'
+                      ' drop --status_interval.')
+    self._log_dir = self._config.log_dir or tempfile.mkdtemp()
     instructions = {}
     with open(self._config.playbook) as playbook:
       instructions = json.load(playbook)
-    self._scenarios = instructions['test_steps']
+    try:
+      self._scenarios = playbook_lib.parse_steps(instructions['test_steps'])
+      self._precondition = playbook_lib.parse_precondition(
+          instructions.get('precondition'))
+    except ValueError as e:
+      raise TestError('invalid playbook: %s' % e) from e
+    self._playbook_engine = instructions.get('engine')
+    self._playbook_verify = instructions.get('verify')
+    # checksum throughput of the host, measured by setUp if needed
+    self._verify_profile = None
     benchmark_targets = instructions.get('benchmark_targets', '')
     self._configs_path = os.path.join(os.getcwd(), 'pydiags', 'configs')
-    self._benchmark_evaluator = None
+    self._benchmark_targets = None
     if benchmark_targets:
       with open(os.path.join(self._configs_path, benchmark_targets)) as f:
-        self._benchmark_evaluator = performance.Benchmark(json.load(f))
+        self._benchmark_targets = json.load(f)
+    # built once the targets are validated by Preflight
+    self._benchmark_evaluator = None
     hostid = commonlib.cmdexec(['hostid']).strip()
     hostname = commonlib.cmdexec(['hostname']).strip()
+    self._hostname = hostname
+    self._results_store = None
+    if self._config.results_db:
+      self._results_store = resultsdb.ResultsStore(self._config.results_db)
+    self._baselines = None
+    if self._config.baseline == _BASELINE_FROM_RESULTS_DB:
+      if not self._results_store:
+        raise TestError('--baseline=%s requires --results_db.' %
+                        _BASELINE_FROM_RESULTS_DB)
+      self._baselines = regression.StoreBaselines(self._results_store)
+    elif self._config.baseline:
+      self._baselines = regression.FileBaselines(self._config.baseline)
     self._ocp_duts = dict()
+    # every DUT reports in a test run of its own, see dutrun.py
+    self._runs = dict()
+    self._writers = dict()
+    self._host_gate = remote.HostGate(self._config.parallel_per_host,
+                                      self._config.host_failure_policy)
     for dut in self._config.duts.split():
-      path = os.path.join(self._log_dir, dut.split('/')[-1])
+      try:
+        host, _ = remote.split_dut(dut)
+      except ValueError as e:
+        raise TestError(str(e)) from e
+      if host is not None and self._config.dry_run:
+        raise TestError('a dry run simulates local DUTs only: %s' % dut)
+      path = os.path.join(self._log_dir, remote.log_dir_name(dut))
       os.makedirs(path, exist_ok=True)
-      ocp_dut = tv.Dut(id=hostid, name=':'.join((hostname, dut)))
+      if host is None:
+        ocp_dut = tv.Dut(id=hostid, name=':'.join((hostname, dut)))
+      else:
+        ocp_dut = tv.Dut(id=host, name=dut)
       self._drives.append(self._driver(dut, path, ocp_dut))
       self._ocp_duts[dut] = ocp_dut
+      self._runs[dut], self._writers[dut] = dutrun.create_run(
+          'BasicIODiag', '1.0', path)
 
   def _report_errors(self, operation='test running'):
     """Reports the errors occured while performing different steps.
@@ -81,13 +165,115 @@ class BasicIODiag(diag.Diag):
     if self._driver.GetVUErrorLog():
       print('See vendor errors at:\n\t%s' % (self._driver.GetVUErrorLog()))
 
+  def Preflight(self):
+    """Validates the playbook and plans its steps without any DUT IO.
+
+    Every fio config is parsed, the benchmark targets are checked against the
+    jobs they apply to and the wall-clock time of every step is estimated.
+
+    Raises:
+      TestError: the playbook, its fio configs or its targets are invalid.
+    """
+    capacities = [
+        capacity for capacity in (
+            self._capacity(drive.name) for drive in self._drives)
+        if capacity
+    ]
+    # a time series target needs the fio logs of its step on every DUT
+    logged_steps = {
+        scenario.name for scenario in self._scenarios
+        if all(self._log_prefix(dut, scenario) for dut in self._drives)
+    }
+    plan = preflight.plan(self._scenarios, self._configs_path,
+                          self._benchmark_targets, _FIO_PATH,
+                          max(capacities, default=None),
+                          logged_steps=logged_steps)
+    print('Preflight plan:')
+    for step_plan in plan.steps:
+      print('\t%s: %s' % (step_plan.name,
+                           _format_duration(step_plan.estimate_sec)))
+    print('\ttotal per DUT: %s' % _format_duration(plan.total_sec))
+    for scenario, name in self._step_engines():
+      try:
+        engine.validate(name)
+      except ValueError as e:
+        plan.errors.append('%s: %s' % (scenario.name, e))
+    if self._playbook_verify is not None:
+      try:
+        playbook_lib.validate_verify(self._playbook_verify)
+      except ValueError as e:
+        plan.errors.append(str(e))
+    if plan.errors:
+      raise TestError('invalid playbook:\n%s' % '\n'.join(plan.errors))
+    if self._benchmark_targets:
+      self._benchmark_evaluator = performance.BenchmarkSuite(
+          self._benchmark_targets)
+
+  def _step_engines(self):
+    """Returns the steps running with a single engine and their engine."""
+    for scenario in self._scenarios:
+      name = (self._config.engine or scenario.engine or
+              self._playbook_engine)
+      if name and not scenario.compare_engines:
+        yield scenario, name
+
+  def _check_engines(self):
+    """Checks the host supports the engines of the steps.
+
+    fio --enghelp tells whether io_uring is supported, so it's left out of
+    Preflight.
+
+    Raises:
+      TestError: a step asks for an engine the host doesn't support.
+    """
+    print('io_uring: %s' % ('supported' if engine.io_uring_supported(
+        _FIO_PATH) else 'not supported'))
+    errors = []
+    for scenario, name in self._step_engines():
+      try:
+        engine.resolve(name, _FIO_PATH)
+      except ValueError as e:
+        errors.append('%s: %s' % (scenario.name, e))
+    if errors:
+      raise TestError('unsupported engines:\n%s' % '\n'.join(errors))
+
+  def _profile_verify(self):
+    """Measures the checksum throughput of the host, unless cached.
+
+    It takes a few seconds the first time, so it's left out of Preflight.
+    """
+    if verify.FASTEST not in [self._playbook_verify] + [
+        scenario.verify for scenario in self._scenarios]:
+      return
+    try:
+      self._verify_profile = verify.profile(self._hostname, _FIO_PATH,
+                                            self._config.crctest_cache)
+    except IOError as e:
+      print('verify: %s, %s is the fastest by default' % (
+          e, verify.FALLBACK))
+      return
+    fastest = self._verify_profile.fastest()
+    print('verify: %s is the fastest, %.0f MiB/s per CPU' % (
+        fastest, self._verify_profile.throughputs.get(fastest, 0)))
+
   def setUp(self):
-    """Sets up the device in the required mode.
+    """Validates the playbook and sets up the device in the required mode.
+
+    The engines of the steps are checked against the host here, and the
+    checksums of the host measured when a step asks for the fastest verify,
+    see verify.py.
 
     Raises:
       TestError: An error occurred while running one of the steps.
     """
+    self.Preflight()
+    self._check_engines()
+    self._profile_verify()
     for drive in self._drives:
+      if remote.is_remote(drive.name):
+        # the nvme commands of the driver only reach local DUTs
+        print('%s is remote, not identified nor set up.' % drive.name)
+        continue
       if not drive.IdentifyDUT():
         self._report_errors('identifying DUT')
         raise TestError("error occured in 'setUp' step.")
@@ -99,51 +285,937 @@ class BasicIODiag(diag.Diag):
   def PreDiag(self):
     """Implements extra steps required before test such as disk formating.
 
+    With a "precondition" in the playbook the DUTs are filled to the target
+    fullness, see precondition.py, as many of them at once as the playbook
+    runs on, see _run_parallel.
+
     Raises:
       TestError: An error occurred while running one of the steps.
     """
-    pass
+    if not self._precondition or not self._drives:
+      return
+    self._run_parallel(self._precondition_dut, 'PreDiag')
+
+  def _precondition_dut(self, dut):
+    """Fills a DUT and confirms its steady state, unless resumed after it.
+
+    Args:
+      dut: the driver of the DUT to precondition.
+    Raises:
+      IOError: fio failed or the DUT didn't reach steady state.
+    """
+    settings = self._precondition
+    record_path = os.path.join(dut.logs_dir, precondition.FILENAME)
+    name = precondition.step_name(settings)
+    ocp_run = self._runs[dut.name]
+    with ocp_run.scope(dut=dut.ocp_dut):
+      step = ocp_run.add_step('%s for %s' % (name, dut.name))
+      with step.scope():
+        previous = precondition.Record.load(record_path)
+        if (self._config.resume and previous and
+            previous.settings == json.loads(json.dumps(
+                dataclasses.asdict(settings)))):
+          step.add_log(tv.LogSeverity.INFO,
+                       message='%s already preconditioned at %s' % (
+                           dut.name, time.ctime(previous.started)))
+          step.add_diagnosis(tv.DiagnosisType.PASS,
+                             verdict='%s passed' % name)
+          return
+        capacity = self._capacity(dut.name)
+        shards = settings.shards
+        if capacity is None:
+          shards = 1
+        elif shards == playbook_lib.AUTO_SHARDS:
+          shards = shard.auto_shards(capacity)
+        config_path = os.path.join(dut.logs_dir, precondition.CONFIG)
+        with open(config_path, 'w') as f:
+          f.write(fiojob.dumps(
+              precondition.sections(settings, capacity, shards)))
+        if self._config.dry_run:
+          fiojob.write_with(config_path, config_path, dryrun.job_options(
+              self._config.dry_run, dut.logs_dir, {}))
+        with open(config_path) as f:
+          record = precondition.Record(
+              dataclasses.asdict(settings), f.read(), capacity, shards,
+              started=time.time())
+        raw_path = os.path.join(dut.logs_dir, name + _RAW_SUFFIX)
+        try:
+          step_result = self._execute_fio(
+              _ARGS + remote.fio_options(dut.name) + [config_path], step,
+              name, raw_path)
+          if not step_result.jobs or any(
+              job.error for job in step_result.jobs):
+            raise IOError('fio run completed with error.')
+          record.summarize(step_result)
+          if record.steady_state_attained is False:
+            if not self._config.dry_run:
+              raise IOError('%s did not reach steady state within %s' % (
+                  dut.name, settings.max_runtime))
+            step.add_log(tv.LogSeverity.WARNING,
+                         message='Steady state not reached in the dry run')
+        except IOError:
+          step.add_diagnosis(tv.DiagnosisType.FAIL,
+                             verdict='%s failed' % name)
+          raise
+        record.save(record_path)
+        step.add_measurement(name='bytesWritten', value=record.bytes_written,
+                             unit='B')
+        step.add_measurement(name='fillBwKbytesPerSec', value=record.fill_bw,
+                             unit='KiB/s')
+        step.add_measurement(name='durationSec', value=record.duration_sec,
+                             unit='s')
+        if record.steady_state_iops is not None:
+          step.add_measurement(name='steadyStateIops',
+                               value=record.steady_state_iops, unit='IOPS')
+        step.add_file(name=record_path, uri='file://' + record_path)
+        if self._results_store:
+          self._results_store.add_step(
+              self._hostname, getattr(dut, 'identity', {}), dut.name,
+              os.path.basename(self._config.playbook), step_result)
+          self._results_store.flush()
+        step.add_diagnosis(tv.DiagnosisType.PASS, verdict='%s passed' % name)
 
   def Run(self):
     """Runs the fio tests and emits log messages in OCP format.
 
+    DUTs are processed one after another unless --parallel_duts allows more
+    than one of them to run at the same time. Remote DUTs are driven through
+    fio client/server, see remote.py.
+
     Raises:
       TestError: An error occurred while running one of the steps.
     """
+    if self._config.parallel_duts > 1:
+      self._run_parallel(self._run_scenarios, 'Run')
+      return
     for dut in self._drives:
-      logs = self._logs[dut.name]
-      with self._run.scope(dut=dut.ocp_dut):
-        device_name = '--filename=%s' % dut.name
-        for scenario in self._scenarios:
-          step = self._run.add_step(scenario)
-          scenario_path = os.path.join(self._configs_path, scenario)
-          args = _ARGS + [device_name, scenario_path]
+      self._run_scenarios(dut)
+
+  def _run_parallel(self, work, phase):
+    """Runs work on every DUT in its own worker, up to --parallel_duts at once.
+
+    A failure on one DUT doesn't stop the workers of the other DUTs, the
+    failures are reported once all of them are done.
+
+    The DUTs are started host by host and --parallel_per_host bounds the
+    DUTs of a single host running at once. With --host_failure_policy
+    skip_host a failed DUT skips the DUTs of its host not started yet.
+
+    Args:
+      work: called with the driver of every DUT.
+      phase: name of the diag step the work belongs to, e.g. "Run".
+    Raises:
+      TestError: An error occurred while running one of the steps.
+    """
+    max_workers = min(self._config.parallel_duts, len(self._drives))
+    drives = {dut.name: dut for dut in self._drives}
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers) as executor:
+      futures = {
+          name: executor.submit(self._run_on_host, work, drives[name],
+                                max_workers > 1)
+          for name in remote.interleave(drives)
+      }
+    failed_duts = []
+    for name, future in futures.items():
+      exc = future.exception()
+      if exc is not None:
+        print('Error occured while running %s: %s' % (name, exc))
+        failed_duts.append(name)
+    if failed_duts:
+      raise diag.TestError("error occured in '%s' step for %s." % (
+          phase, ', '.join(failed_duts)))
+
+  def _run_on_host(self, work, dut, spooled):
+    """Runs work on a DUT once its host allows it.
+
+    With spooled set the artifacts of the DUT are written out once it's done,
+    so that they don't interleave with the ones of the DUTs running at the
+    same time.
+    """
+    writer = self._writers[dut.name]
+    with writer.spooled() if spooled else contextlib.nullcontext():
+      with self._host_gate.run(dut.name):
+        work(dut)
+
+  def _run_scenarios(self, dut):
+    """Runs all the playbook scenarios on a single DUT.
+
+    With --smart_interval set the SMART health of a local DUT is sampled in
+    the background while the scenarios run.
+
+    Args:
+      dut: the driver of the DUT to run the scenarios on.
+    Raises:
+      TestError: An error occurred while running one of the steps.
+    """
+    sampler = None
+    if (self._config.smart_interval and not self._config.dry_run and
+        not remote.is_remote(dut.name)):
+      sampler = health.HealthSampler(dut.name, self._config.smart_interval)
+      sampler.start()
+    try:
+      self._run_playbook(dut, sampler)
+    finally:
+      if sampler:
+        sampler.stop()
+      # the steps finished before a failure are stored too
+      if self._results_store:
+        self._results_store.flush()
+
+  def _run_playbook(self, dut, sampler):
+    """Runs all the playbook scenarios on a single DUT, see _run_scenarios."""
+    logs = self._logs[dut.name]
+    state, fingerprints, resume_index = self._load_checkpoint(dut)
+    ocp_run = self._runs[dut.name]
+    with ocp_run.scope(dut=dut.ocp_dut):
+      dut_options = remote.fio_options(dut.name)
+      batches = {}
+      if self._config.batch_steps > 1:
+        batches = {
+            indexes[0]: indexes for indexes in batch.plan(
+                self._scenarios, resume_index, self._config.batch_steps)
+            if len(indexes) > 1
+        }
+      # results of the steps already run by the batch they belong to
+      batched = {}
+      for index, scenario in enumerate(self._scenarios):
+        step = ocp_run.add_step(scenario.name)
+        if index < resume_index:
           with step.scope():
+            self._restore_step(state.steps[index], scenario, dut, step)
+          continue
+        with step.scope():
+          log_prefix = self._log_prefix(dut, scenario)
+          fio_options = dut_options + self._fio_options(scenario, log_prefix)
+          raw_path = self._raw_output_path(dut, scenario)
+          shards, shard_size = 1, 0
+          counters = None
+          with self._live_health(sampler, step):
             try:
-              logs.append(json.loads(commonlib.cmdexec(args)))
-              if logs[-1].get('jobs', [{'error': 1}])[0]['error']:
+              if scenario.reset:
+                self._reset_dut(dut, scenario, step)
+              unaccounted = self._unaccounted_writes(
+                  dut, scenario, index in batches or index in batched)
+              if unaccounted:
+                step.add_log(tv.LogSeverity.INFO,
+                             message='Writes not accounted, %s' % unaccounted)
+              else:
+                counters = dut.WriteCounters()
+              start = time.time()
+              job_options, shards, shard_size = self._job_options(
+                  dut, scenario, step)
+              if index in batches:
+                batched = self._run_batch(dut, batches[index], dut_options,
+                                          step)
+              if index in batched:
+                logs.append(batched[index].step_result)
+                log_prefix = batched[index].log_prefix
+                start = batched[index].start
+              elif scenario.sweep:
+                logs.append(self._run_sweep(
+                    dut, scenario, job_options, fio_options, step, raw_path))
+              elif scenario.compare_engines:
+                logs.append(self._compare_engines(
+                    dut, scenario, job_options, fio_options, step, raw_path))
+              else:
+                scenario_path = self._step_config(
+                    dut, scenario, job_options, raw_path[:-len(_RAW_SUFFIX)])
+                logs.append(self._execute_fio(
+                    _ARGS + fio_options + [scenario_path], step, scenario.name,
+                    raw_path))
+              if not logs[-1].jobs or any(job.error for job in logs[-1].jobs):
+                for failed in shard.failed_shards(logs[-1], shards, shard_size):
+                  step.add_log(
+                      tv.LogSeverity.ERROR,
+                      message='%s failed with error %d in region %d, %d bytes'
+                      ' from offset %d' % (failed.job, failed.error,
+                                           failed.index, failed.size,
+                                           failed.offset))
                 raise IOError('fio run completed with error.')
+              end = batched.pop(index).end if index in batched else time.time()
             except IOError as exc:
               step.add_diagnosis(
-                  tv.DiagnosisType.FAIL, verdict='%s failed' % scenario)
-              nvme_logs = dut.LogCollect()
-              nvme_logs.append(
-                  self._save_fio_log(logs[-1], scenario, dut.logs_dir))
-              self._add_logs_on_error(nvme_logs, step)
+                  tv.DiagnosisType.FAIL, verdict='%s failed' % scenario.name)
+              nvme_logs = ([] if remote.is_remote(dut.name)
+                           else dut.LogCollect())
+              # the fio outputs of the step, compressed unless they couldn't be
+              # parsed
+              fio_logs = sorted(glob.glob(
+                  glob.escape(raw_path[:-len(_RAW_SUFFIX)]) + '*.json*'))
+              self._add_logs_on_error(nvme_logs, fio_logs, step)
               raise diag.TestError("error occured in 'Run' step.") from exc
 
-            step.add_diagnosis(
-                tv.DiagnosisType.PASS,
-                verdict=('%s passed' % scenario))
+          if log_prefix:
+            logs[-1].job_logs = timeseries.read_job_logs(log_prefix)
+          if counters is not None:
+            end_counters = dut.WriteCounters()
+            data_units_written = end_counters.data_units_written
+            logs[-1].endurance = endurance.step_endurance(
+                logs[-1], counters, end_counters)
+            self._report_endurance(logs[-1].endurance, step)
+          else:
+            data_units_written = self._data_units_written(dut)
+          if shards > 1:
+            logs[-1] = shard.merge(logs[-1], shards)
+          if log_prefix:
+            self._report_timeseries(logs[-1], step)
+          if sampler:
+            samples = sampler.samples().between(start, end)
+            logs[-1].throttle_events = samples.throttle_events(start)
+            self._report_throttling(logs[-1].throttle_events, step)
+          if scenario.steady_state:
+            self._report_steady_state(logs[-1], step)
+          if 'verify' in job_options:
+            self._report_verify(dut, job_options['verify'], logs[-1], step)
+          if self._results_store:
+            self._results_store.add_step(
+                self._hostname, getattr(dut, 'identity', {}), dut.name,
+                os.path.basename(self._config.playbook), logs[-1])
+          state.record(checkpoint.FinishedStep(
+              index, scenario.name, fingerprints[index], logs[-1].raw_path,
+              log_prefix, data_units_written, shards,
+              [checkpoint.sweep_point(point)
+               for point in logs[-1].sweep or []],
+              endurance=(dataclasses.asdict(logs[-1].endurance)
+                         if logs[-1].endurance else None)))
+          step.add_diagnosis(
+              tv.DiagnosisType.PASS,
+              verdict=('%s passed' % scenario.name))
+
+  def _unaccounted_writes(self, dut, scenario, in_batch):
+    """Tells why the writes of a step can't be accounted, None if they can.
+
+    The write counters of the DUT are read before and after the step, they
+    can't tell apart what the fio runs of a step or a batch wrote each.
+    """
+    if remote.is_remote(dut.name):
+      return 'the write counters of a remote DUT are not read'
+    if in_batch:
+      return "the write counters can't tell apart the steps of a batch"
+    if scenario.sweep:
+      return "the write counters can't tell apart the points of a sweep"
+    if scenario.compare_engines:
+      return "the write counters can't tell apart the engines compared"
+    return None
+
+  def _log_prefix(self, dut, scenario):
+    """Returns the prefix of the fio logs of a step, empty if not collected."""
+    if (not self._config.log_avg_msec or scenario.sweep or
+        scenario.compare_engines or remote.is_remote(dut.name)):
+      return ''
+    return os.path.join(dut.logs_dir, os.path.splitext(
+        os.path.basename(scenario.config))[0])
+
+  def _fio_options(self, scenario, log_prefix):
+    """Returns the fio options of a step, without the DUT."""
+    fio_options = scenario.fio_options()
+    if log_prefix:
+      fio_options.extend(timeseries.fio_log_args(
+          log_prefix, self._config.log_avg_msec))
+    return fio_options
+
+  def _run_batch(self, dut, indexes, dut_options, step):
+    """Runs consecutive steps on a DUT with a single fio invocation.
+
+    The options every step gives fio are set in its jobs instead. The fio
+    logs of a step are prefixed like its output, so that two steps of the
+    batch with the same config don't mix their logs.
+
+    Args:
+      dut: the driver of the DUT to run the steps on.
+      indexes: indexes of the steps in the playbook, in order.
+      dut_options: fio options selecting the DUT.
+      step: OCP step of the first step, the fio run is reported on it.
+    Returns:
+      The batch.BatchedStep of every step by index.
+    Raises:
+      IOError: An error occurred while running fio.
+    """
+    jobs, group_counts, raw_paths, log_prefixes = [], [], [], []
+    for offset, index in enumerate(indexes):
+      scenario = self._scenarios[index]
+      raw_path = self._raw_output_path(dut, scenario, offset)
+      log_prefix = ''
+      if self._log_prefix(dut, scenario):
+        log_prefix = raw_path[:-len(_RAW_SUFFIX)]
+      job_options, _, _ = self._job_options(dut, scenario, None)
+      job_options.update(batch.option_dict(
+          self._fio_options(scenario, log_prefix)))
+      step_jobs = batch.step_jobs(
+          fiojob.read(os.path.join(self._configs_path, scenario.config)),
+          self._dry_run_options(dut, job_options))
+      jobs.extend(step_jobs)
+      group_counts.append(batch.group_count(step_jobs))
+      raw_paths.append(raw_path)
+      log_prefixes.append(log_prefix)
+    base_path = os.path.join(dut.logs_dir, '%d_batch' % len(
+        self._logs[dut.name]))
+    with open(base_path + '.fio', 'w') as f:
+      f.write(fiojob.dumps(jobs))
+    step.add_log(tv.LogSeverity.INFO,
+                 message='%s run by a single fio invocation: %s.fio' % (
+                     ', '.join(self._scenarios[index].name
+                               for index in indexes), base_path))
+    output_path = base_path + '.json'
+    start = time.time()
+    commonlib.cmdexec(_ARGS[:1] + ['--output=%s' % output_path] + _ARGS[1:] +
+                      dut_options + [base_path + '.fio'])
+    end = time.time()
+    try:
+      outputs = batch.split(output_path, group_counts, raw_paths)
+    except ValueError as exc:
+      raise IOError('fio output is not valid: %s' % exc) from exc
+    results.compress(output_path)
+    durations = [output.duration_sec for output in outputs]
+    batched = {}
+    for index, output, log_prefix in zip(indexes, outputs, log_prefixes):
+      step_result = results.StepResult(
+          self._scenarios[index].name, output.jobs, raw_path=output.raw_path)
+      if None in durations:
+        # the steps can't be told apart, they all ran during the whole batch
+        batched[index] = batch.BatchedStep(step_result, log_prefix, start, end)
+        continue
+      step_end = start + output.duration_sec
+      batched[index] = batch.BatchedStep(step_result, log_prefix, start,
+                                         step_end)
+      start = step_end
+    return batched
+
+  def _reset_dut(self, dut, scenario, step):
+    """Resets a DUT to a known state before a step and reports the time.
+
+    The time runs until the reset completed, e.g. until the sanitize log
+    reports the end of a sanitize. The reset runs in the worker of the DUT,
+    the DUTs are reset at the same time only with --parallel_duts.
+
+    Args:
+      dut: the driver of the DUT.
+      scenario: the step declaring the reset.
+      step: OCP step of the scenario.
+    Raises:
+      IOError: the reset failed.
+    """
+    if remote.is_remote(dut.name):
+      step.add_log(tv.LogSeverity.WARNING,
+                   message='%s is remote, %s skipped' % (dut.name,
+                                                         scenario.reset))
+      return
+    start = time.monotonic()
+    done = dut.ResetDUT(scenario.reset)
+    duration = time.monotonic() - start
+    step.add_measurement(name='resetSec', value=duration, unit='s')
+    if not done:
+      raise IOError('%s of %s failed after %.1fs' % (
+          scenario.reset, dut.name, duration))
+    step.add_log(tv.LogSeverity.INFO,
+                 message='%s reset with %s in %.1fs' % (
+                     dut.name, scenario.reset, duration))
+
+  def _run_sweep(self, dut, scenario, job_options, fio_options, step,
+                 raw_path):
+    """Runs every point of a swept step and reports its knee.
+
+    Args:
+      dut: the driver of the DUT to run the step on.
+      scenario: the swept step.
+      job_options: options to set in every job of the config.
+      fio_options: fio options of the step.
+      step: OCP step of the scenario.
+      raw_path: file the fio output of the step would be kept in, the points
+        are kept next to it.
+    Returns:
+      The results of the step, see sweep.step_result.
+    Raises:
+      IOError: An error occurred while running fio.
+    """
+    settings = scenario.sweep
+    points = sweep.grid(settings)
+    base_path = raw_path[:-len(_RAW_SUFFIX)]
+    for point in points:
+      config_path = self._step_config(
+          dut, scenario, {**job_options, **point.fio_options()},
+          '%s_%s' % (base_path, point.name))
+      point_result = self._execute_fio(
+          _ARGS + fio_options + [config_path], step, scenario.name,
+          '%s_%s%s' % (base_path, point.name, _RAW_SUFFIX))
+      if not point_result.jobs or any(job.error for job in point_result.jobs):
+        raise IOError('fio run completed with error at %s.' % point.name)
+      point.jobs = point_result.jobs
+      point.raw_path = point_result.raw_path
+      prefix = 'sweep.%s.' % point.name
+      step.add_measurement(name=prefix + 'iops', value=point.iops(),
+                           unit='IOPS')
+      step.add_measurement(name=prefix + 'bwKbytesPerSec', value=point.bw(),
+                           unit='KiB/s')
+      for percentile in sorted({50, 99, settings.sla_percentile}):
+        latency = point.latency_usec(percentile)
+        if latency is not None:
+          step.add_measurement(name=prefix + 'clat%gthUsec' % percentile,
+                               value=latency, unit='us')
+    step_result = sweep.step_result(scenario.name, settings, points)
+    if settings.sla_latency_usec is None:
+      return step_result
+    knee = sweep.knee(points, settings.sla_percentile,
+                      settings.sla_latency_usec)
+    if knee is None:
+      step.add_log(
+          tv.LogSeverity.WARNING,
+          message='No point of %s meets p%g <= %gus' % (
+              scenario.name, settings.sla_percentile,
+              settings.sla_latency_usec))
+      return step_result
+    step.add_measurement(name='sweep.kneeIops', value=knee.iops(),
+                         unit='IOPS')
+    step.add_log(
+        tv.LogSeverity.INFO,
+        message='Knee of %s at %s: %.0f IOPS with p%g <= %gus' % (
+            scenario.name, knee.name, knee.iops(), settings.sla_percentile,
+            settings.sla_latency_usec))
+    return step_result
+
+  def _compare_engines(self, dut, scenario, job_options, fio_options, step,
+                       raw_path):
+    """Runs a step with every engine to compare and reports them side by side.
+
+    Args:
+      dut: the driver of the DUT to run the step on.
+      scenario: the step comparing engines.
+      job_options: options to set in every job of the config.
+      fio_options: fio options of the step.
+      step: OCP step of the scenario.
+      raw_path: file the fio output of the first engine is kept in, the other
+        engines are kept next to it.
+    Returns:
+      The results of the step with the first engine, the reference the
+      targets apply to.
+    Raises:
+      IOError: An error occurred while running fio.
+    """
+    base_path = raw_path[:-len(_RAW_SUFFIX)]
+    step_result = None
+    for index, name in enumerate(scenario.compare_engines):
+      try:
+        resolved = engine.resolve(name, _FIO_PATH)
+      except ValueError as exc:
+        step.add_log(tv.LogSeverity.WARNING,
+                     message='%s skipped: %s' % (name, exc))
+        continue
+      engine_path = '%s_%s' % (base_path, resolved)
+      config_path = self._step_config(
+          dut, scenario, {**job_options, **engine.job_options(resolved)},
+          engine_path)
+      engine_result = self._execute_fio(
+          _ARGS + fio_options + [config_path], step, scenario.name,
+          raw_path if index == 0 else engine_path + _RAW_SUFFIX)
+      if (not engine_result.jobs or
+          any(job.error for job in engine_result.jobs)):
+        raise IOError('fio run completed with error with %s.' % resolved)
+      self._report_engine(resolved, engine_result, step)
+      step_result = step_result or engine_result
+    if step_result is None:
+      raise IOError('none of the engines of %s is supported.' % scenario.name)
+    return step_result
+
+  def _report_engine(self, name, step_result, step):
+    """Emits the IOPS, latency and host CPU usage of a step with an engine."""
+    job, _ = performance.aggregate_jobs(step_result.jobs)
+    io_stats = [stats for stats in job.io_stats.values() if stats.io_bytes]
+    iops = sum(stats.iops for stats in io_stats)
+    cpu = job.usr_cpu + job.sys_cpu
+    prefix = 'engine.%s.' % name
+    step.add_measurement(name=prefix + 'iops', value=iops, unit='IOPS')
+    step.add_measurement(name=prefix + 'usrCpuPercent', value=job.usr_cpu,
+                         unit='%')
+    step.add_measurement(name=prefix + 'sysCpuPercent', value=job.sys_cpu,
+                         unit='%')
+    if cpu:
+      step.add_measurement(name=prefix + 'iopsPerCpuPercent',
+                           value=iops / cpu, unit='IOPS/%')
+    histograms = [
+        stats.latencies['clat_ns'].histogram for stats in io_stats
+        if 'clat_ns' in stats.latencies and
+        stats.latencies['clat_ns'].histogram is not None
+    ]
+    if histograms:
+      merged = histogram.LatencyHistogram.merge(histograms)
+      for percentile, latency_ns in zip(
+          _ENGINE_PERCENTILES, merged.percentiles(_ENGINE_PERCENTILES)):
+        step.add_measurement(
+            name=prefix + 'clat%gthUsec' % percentile,
+            value=float(latency_ns) / performance.NS_IN_US, unit='us')
+
+  def _step_config(self, dut, scenario, job_options, base_path):
+    """Returns the fio config of a step with job options set.
+
+    A dry run always runs a copy, without the DUT.
+
+    Args:
+      dut: the driver of the DUT to run the step on.
+      scenario: the step.
+      job_options: options to set in every job, e.g. the engine.
+      base_path: path of the copy without extension, next to the fio output.
+    Returns:
+      The config of the playbook, or its copy if it needs options set.
+    """
+    config_path = os.path.join(self._configs_path, scenario.config)
+    job_options = self._dry_run_options(dut, job_options)
+    if not job_options:
+      return config_path
+    return fiojob.write_with(config_path, base_path + '.fio', job_options)
+
+  def _dry_run_options(self, dut, job_options):
+    """Returns the job options of a step, run without the DUT in a dry run."""
+    if not self._config.dry_run:
+      return job_options
+    return dryrun.job_options(self._config.dry_run, dut.logs_dir, job_options)
+
+  def _job_options(self, dut, scenario, step):
+    """Returns the options a step needs set in every job of its config.
+
+    The engine is the one of --engine, else of the step, else of the
+    playbook, the config keeps its own without any. So is the verify method,
+    see _verify_method. A sharded step has its jobs split into regions of the
+    DUT.
+
+    Args:
+      dut: the driver of the DUT to run the step on.
+      scenario: the step.
+      step: OCP step of the scenario, None not to report the regions.
+    Returns:
+      The job options, the number of regions and their size, a single region
+      of the whole DUT unless the step is sharded.
+    Raises:
+      IOError: the engine is not supported on this host.
+    """
+    job_options = {}
+    method = self._verify_method(dut, scenario)
+    if method:
+      job_options.update(verify.job_options(method))
+    name = self._config.engine or scenario.engine or self._playbook_engine
+    if name and not scenario.compare_engines:
+      try:
+        resolved = engine.resolve(name, _FIO_PATH)
+      except ValueError as exc:
+        raise IOError(str(exc)) from exc
+      job_options.update(engine.job_options(resolved))
+    if scenario.shards is None:
+      return job_options, 1, 0
+    capacity = self._capacity(dut.name)
+    if capacity is None:
+      if step:
+        step.add_log(tv.LogSeverity.WARNING,
+                     message='Size of %s unknown, %s is not sharded' % (
+                         dut.name, scenario.name))
+      return job_options, 1, 0
+    shards = scenario.shards
+    if shards == playbook_lib.AUTO_SHARDS:
+      shards = shard.auto_shards(capacity)
+    size = shard.shard_size(capacity, shards)
+    if step:
+      step.add_log(tv.LogSeverity.INFO,
+                   message='%s split into %d regions of %d bytes' % (
+                       scenario.name, shards, size))
+    job_options.update(shard.job_options(shards, size))
+    return job_options, shards, size
+
+  def _verify_method(self, dut, scenario):
+    """Returns the verify method of a step, None to keep the one of its config.
+
+    The method of the step, else of the playbook, replaces the one of a config
+    verifying data. The fastest is the one of the host, a remote host isn't
+    measured and verifies with verify.FALLBACK.
+    """
+    name = scenario.verify or self._playbook_verify
+    if not name or not verify.verifies(
+        fiojob.read(os.path.join(self._configs_path, scenario.config))):
+      return None
+    if name != verify.FASTEST:
+      return name
+    if remote.is_remote(dut.name) or self._verify_profile is None:
+      return verify.FALLBACK
+    return self._verify_profile.fastest()
+
+  def _report_verify(self, dut, method, step_result, step):
+    """Emits the verify method of a step and the CPU its checksums cost."""
+    step.add_measurement(name='verify.method', value=method)
+    if remote.is_remote(dut.name) or self._verify_profile is None:
+      return
+    throughput = self._verify_profile.throughputs.get(method)
+    if not throughput:
+      return
+    step.add_measurement(name='verify.checksumMiBPerSec', value=throughput,
+                         unit='MiB/s')
+    step.add_measurement(name='verify.cpuPercent',
+                         value=verify.cpu_percent(step_result, throughput),
+                         unit='%')
+
+  def _load_checkpoint(self, dut):
+    """Reads the steps already finished on a DUT when resuming.
+
+    Returns:
+      The checkpoint of the DUT, the fingerprint of every step and the index
+      of the first step to run.
+    """
+    path = os.path.join(dut.logs_dir, checkpoint.FILENAME)
+    playbook = os.path.basename(self._config.playbook)
+    config_paths = [
+        os.path.join(self._configs_path, scenario.config)
+        for scenario in self._scenarios
+    ]
+    fingerprints = [
+        checkpoint.fingerprint(config_path, dataclasses.asdict(scenario))
+        for config_path, scenario in zip(config_paths, self._scenarios)
+    ]
+    state = checkpoint.Checkpoint(path, playbook)
+    resume_index = 0
+    if self._config.resume:
+      state = checkpoint.Checkpoint.load(path, playbook)
+      resume_index = state.resume_index(
+          fingerprints,
+          [checkpoint.writes_pattern(path) for path in config_paths],
+          self._data_units_written(dut))
+    state.truncate(resume_index)
+    return state, fingerprints, resume_index
+
+  def _data_units_written(self, dut):
+    """Returns the data units written by a local DUT, None if unknown."""
+    if remote.is_remote(dut.name) or self._config.dry_run:
+      return None
+    return health.data_units_written(dut.name)
+
+  def _capacity(self, dut_name):
+    """Returns the size of a local DUT in bytes, None if unknown."""
+    if self._config.dry_run:
+      return dryrun.CAPACITY_BYTES
+    if remote.is_remote(dut_name):
+      return None
+    return preflight.device_capacity(dut_name)
+
+  def _restore_step(self, finished_step, scenario, dut, step):
+    """Reports a step finished before the resume from its kept output.
+
+    Args:
+      finished_step: the step as recorded in the checkpoint.
+      scenario: the step in the playbook.
+      dut: the driver of the DUT the step ran on.
+      step: OCP step of the resumed run.
+    """
+    if finished_step.sweep:
+      step_result = sweep.step_result(
+          finished_step.name, scenario.sweep,
+          [sweep.load_point(point) for point in finished_step.sweep])
+    else:
+      step_result = results.StepResult.from_fio(
+          finished_step.name, results.load_raw(finished_step.raw_path),
+          raw_path=finished_step.raw_path)
+    if finished_step.log_prefix:
+      step_result.job_logs = timeseries.read_job_logs(finished_step.log_prefix)
+    if finished_step.shards > 1:
+      step_result = shard.merge(step_result, finished_step.shards)
+    if finished_step.endurance:
+      step_result.endurance = endurance.Endurance(**finished_step.endurance)
+    self._logs[dut.name].append(step_result)
+    step.add_log(
+        tv.LogSeverity.INFO,
+        message='%s finished before the resume at %s, results restored from %s'
+        % (finished_step.name, time.ctime(finished_step.finished),
+           finished_step.raw_path))
+    step.add_diagnosis(
+        tv.DiagnosisType.PASS, verdict='%s passed' % finished_step.name)
+
+  def _raw_output_path(self, dut, scenario, offset=0):
+    """Returns the file the whole fio output of a step is kept in.
+
+    Args:
+      dut: the driver of the DUT the step runs on.
+      scenario: the step.
+      offset: steps between the next step to run and this one.
+    """
+    step_index = len(self._logs[dut.name]) + offset
+    return os.path.join(dut.logs_dir, '%d_%s%s' % (
+        step_index, os.path.splitext(os.path.basename(scenario.config))[0],
+        _RAW_SUFFIX))
 
-  def _save_fio_log(self, log_entry, scenario, log_dir):
-    filename = os.path.join(log_dir, scenario + '_fio_error_log')
-    with open(filename, 'w') as f:
-      f.write(log_entry)
-    return filename
+  def _report_steady_state(self, step_result, step):
+    """Emits whether every fio job reached the steady state and its level.
 
-  def _add_logs_on_error(self, logs, ocp_step):
-    for log in logs:
+    Args:
+      step_result: results of the step.
+      step: OCP step the fio run belongs to.
+    """
+    for job in step_result.jobs:
+      if job.steady_state_attained is None:
+        continue
+      prefix = '%s.steadyState' % job.name
+      step.add_measurement(
+          name=prefix + 'Attained', value=job.steady_state_attained)
+      if not job.steady_state_attained:
+        step.add_log(
+            tv.LogSeverity.WARNING,
+            message='%s did not reach steady state within runtime' % job.name)
+        continue
+      step.add_measurement(
+          name=prefix + 'Iops', value=job.steady_state_iops, unit='IOPS')
+      step.add_measurement(
+          name=prefix + 'BwKbytesPerSec', value=job.steady_state_bw,
+          unit='KiB/s')
+
+  def _report_endurance(self, step_endurance, step):
+    """Emits the bytes written by the host, received and written to NAND.
+
+    Args:
+      step_endurance: what the writes of the step cost the DUT.
+      step: OCP step the writes belong to.
+    """
+    step.add_measurement(name='endurance.hostBytesWritten',
+                         value=step_endurance.host_bytes, unit='B')
+    if step_endurance.device_bytes is not None:
+      step.add_measurement(name='endurance.deviceBytesWritten',
+                           value=step_endurance.device_bytes, unit='B')
+    if step_endurance.nand_bytes is not None:
+      step.add_measurement(name='endurance.nandBytesWritten',
+                           value=step_endurance.nand_bytes, unit='B')
+    if step_endurance.waf is not None:
+      step.add_measurement(name='endurance.waf', value=step_endurance.waf)
+
+  @contextlib.contextmanager
+  def _live_health(self, sampler, step):
+    """Emits the SMART samples on a step as the sampler takes them.
+
+    Every field is a measurement series of the step, ended with the block.
+
+    Args:
+      sampler: the HealthSampler of the DUT, None if not sampled.
+      step: OCP step the samples taken during the block belong to.
+    """
+    if sampler is None:
+      yield
+      return
+    series = {}
+
+    def emit(timestamp, sample):
+      for field in health.FIELDS:
+        if field not in series:
+          series[field] = step.start_measurement_series(
+              name='smart.%s' % field,
+              unit='Celsius' if field == 'temperature' else None)
+        series[field].add_measurement(value=float(sample[field]),
+                                      timestamp=timestamp)
+
+    sampler.listen(emit)
+    try:
+      yield
+    finally:
+      sampler.listen(None)
+      for field_series in series.values():
+        field_series.end()
+
+  def _report_throttling(self, throttle_events, step):
+    """Emits the throttling of the DUT during a step.
+
+    Args:
+      throttle_events: throttle events found in the SMART samples of the step.
+      step: OCP step the events belong to.
+    """
+    for event in throttle_events:
+      step.add_log(
+          tv.LogSeverity.WARNING,
+          message='DUT throttled from %d to %d ms at up to %.0f Celsius' % (
+              event.start_msec, event.end_msec, event.max_temperature_c))
+
+  def _throttle_notes(self, dut, step_name):
+    """Describes the throttling of the DUT during a step, if any.
+
+    The throttle events are lined up with the fio bandwidth logs to tell how
+    much the bandwidth dropped while the DUT was throttling.
+    """
+    notes = []
+    for step_result in self._logs[dut]:
+      if step_result.name != step_name or not step_result.throttle_events:
+        continue
+      bandwidth = None
+      if step_result.job_logs:
+        bandwidth = timeseries.combine([
+            series for job_logs in step_result.job_logs
+            for series in job_logs.get('bw', {}).values()
+        ])
+      for event in step_result.throttle_events:
+        note = 'throttled %d-%d ms at %.0f Celsius' % (
+            event.start_msec, event.end_msec, event.max_temperature_c)
+        if bandwidth is not None:
+          note += ', bw -%.0f%%' % health.drop_percent(event, bandwidth)
+        notes.append(note)
+    return ' (%s)' % '; '.join(notes) if notes else ''
+
+  def _report_timeseries(self, step_result, step):
+    """Emits the summary of the fio bandwidth and IOPS logs on the step.
+
+    Args:
+      step_result: results of the step with the time series of every job.
+      step: OCP step the fio logs belong to.
+    """
+    for job, logs in zip(step_result.jobs, step_result.job_logs):
+      for log_type, unit in (('bw', 'KiB/s'), ('iops', 'IOPS')):
+        for io_type, series in logs.get(log_type, {}).items():
+          prefix = '%s.%s.%s' % (job.name, io_type, log_type)
+          step.add_measurement(name=prefix + 'MinWindow',
+                               value=series.min_windowed(), unit=unit)
+          step.add_measurement(name=prefix + 'CovPercent',
+                               value=series.cov_percent(), unit='%')
+          step.add_measurement(name=prefix + 'MaxDropPercent',
+                               value=series.max_drop_percent(), unit='%')
+          for cliff_msec in series.cliffs():
+            step.add_log(
+                tv.LogSeverity.WARNING,
+                message='%s dropped more than %d%% at %d ms' % (
+                    prefix, timeseries.CLIFF_DROP_PERCENT, cliff_msec))
+
+  def _execute_fio(self, args, step, name, raw_path):
+    """Runs fio and returns the compact results of the step.
+
+    fio writes its output to a file in the DUT log dir that is parsed job by
+    job and kept compressed. With --status_interval set fio reports its
+    progress periodically on stdout instead and every report is emitted on
+    the step while fio is still running.
+
+    Args:
+      args: fio command line.
+      step: OCP step the fio run belongs to.
+      name: name of the step.
+      raw_path: file to keep the whole fio output in.
+    Returns:
+      The results of the step.
+    Raises:
+      IOError: An error occurred while running fio.
+    """
+    if not self._config.status_interval:
+      output_path = os.path.splitext(raw_path)[0]
+      commonlib.cmdexec(args[:1] + ['--output=%s' % output_path] + args[1:])
+      try:
+        step_result = jsonstream.load_step(name, output_path)
+      except ValueError as exc:
+        raise IOError('fio output is not valid: %s' % exc) from exc
+      step_result.raw_path = results.compress(output_path)
+      return step_result
+    args = args[:1] + [
+        '--status-interval=%d' % self._config.status_interval] + args[1:]
+    fio_output = streaming.stream(commonlib.cmdstream(args), step)
+    return results.StepResult.from_fio(
+        name, fio_output, raw_path=results.spill(fio_output, raw_path))
+
+  def _add_logs_on_error(self, nvme_logs, fio_logs, ocp_step):
+    for log in nvme_logs:
+      if log.error:
+        ocp_step.add_log(tv.LogSeverity.WARNING,
+                         message='Failed to collect %s after %.1fs: %s' % (
+                             log.name, log.duration_sec, log.error))
+        continue
+      ocp_step.add_file(name=log.path, uri=('file://' + log.path),
+                        metadata=tv.Metadata(
+                            sizeBytes=log.size,
+                            durationSec=round(log.duration_sec, 3)))
+    for log in fio_logs:
       ocp_step.add_file(name=log, uri=('file://' + log))
 
   def PostDiag(self):
@@ -152,24 +1224,33 @@ class BasicIODiag(diag.Diag):
     Raises:
       TestError: An error occurred while running one of the steps.
     """
-    if not self._benchmark_evaluator:
-      return
-    for dut, logs in self._logs.items():
-      with self._run.scope(dut=self._ocp_duts[dut]):
-        if not logs:
-          continue
-        # we only evaluate the first fio workload for perf targets on each dut
-        results = self._benchmark_evaluator.evaluate(logs[0])
-        step = self._run.add_step('Performance targets for %s' % dut)
+    if self._benchmark_evaluator:
+      self._evaluate_targets()
+    if self._baselines:
+      self._detect_regressions()
+
+  def _evaluate_targets(self):
+    """Reports the performance targets failed by every DUT."""
+    failed_results = self._benchmark_evaluator.evaluate_all(
+        {dut: logs for dut, logs in self._logs.items() if logs})
+    for dut, failed_benchmarks in failed_results.items():
+      with self._runs[dut].scope(dut=self._ocp_duts[dut]):
+        step = self._runs[dut].add_step('Performance targets for %s' % dut)
         with step.scope():
-          if results.failed_workloads:
+          if failed_benchmarks:
             error_messages = []
-            for failed_workload in results.failed_workloads:
-              error_message = '%d: %s %s' % (
-                  failed_workload.workload_id,
-                  failed_workload.io_type,
-                  ', '.join(failed_workload.failed_metrics))
-              error_messages.append(error_message)
+            for failed_benchmark in failed_benchmarks:
+              for failed_workload in failed_benchmark.failed_workloads:
+                error_message = '%s %s %s %d: %s %s' % (
+                    failed_benchmark.name,
+                    failed_benchmark.step,
+                    failed_workload.job_name,
+                    failed_workload.workload_id,
+                    failed_workload.io_type,
+                    ', '.join(failed_workload.failed_metrics))
+                error_message += self._throttle_notes(
+                    dut, failed_benchmark.step)
+                error_messages.append(error_message)
             step.add_diagnosis(
                 tv.DiagnosisType.FAIL,
                 verdict='Failed performance targets: %s' % '\n'.join(
@@ -179,12 +1260,57 @@ class BasicIODiag(diag.Diag):
                 tv.DiagnosisType.PASS,
                 verdict=('Performance test passed for %s' % dut))
 
+  def _detect_regressions(self):
+    """Compares the results of every DUT with the baselines."""
+    for drive in self._drives:
+      dut = drive.name
+      if not self._logs[dut]:
+        continue
+      with self._runs[dut].scope(dut=self._ocp_duts[dut]):
+        step = self._runs[dut].add_step('Regression check for %s' % dut)
+        with step.scope():
+          identity = getattr(drive, 'identity', {})
+          if (self._baselines.requires_identity and
+              not regression.identified(identity)):
+            step.add_log(
+                tv.LogSeverity.WARNING,
+                message='Model or firmware of %s unknown, regression check'
+                ' skipped' % dut)
+            continue
+          comparisons = []
+          for step_result in self._logs[dut]:
+            comparisons.extend(
+                regression.compare(self._baselines, step_result, identity))
+          for comparison in comparisons:
+            name = '%s.%s.%s.%s' % (comparison.step, comparison.job,
+                                    comparison.io_type, comparison.metric)
+            step.add_measurement(name=name, value=comparison.effect_size)
+          if not comparisons:
+            step.add_log(tv.LogSeverity.WARNING,
+                         message='No baseline found for %s' % dut)
+          regressions = [c for c in comparisons if c.regressed]
+          if regressions:
+            step.add_diagnosis(
+                tv.DiagnosisType.FAIL,
+                verdict='Performance regressions: %s' % '\n'.join(
+                    '%s %s %s: %s effect size %.3f, p-value %.2g' % (
+                        c.step, c.job, c.io_type, c.metric, c.effect_size,
+                        c.p_value) for c in regressions))
+          else:
+            step.add_diagnosis(
+                tv.DiagnosisType.PASS,
+                verdict='No performance regression for %s' % dut)
+
   def Report(self):
     """Prints previously collected fio logs in JSON format.
+
+    The logs are read back from the DUT log dirs one at a time.
     """
     for logs in self._logs.values():
       for log in logs:
-        print(log)
+        print(log.load_raw())
+    if self._results_store:
+      self._results_store.flush()
 
   def tearDown(self):
     """Rolls back the changes made in setUp method to the original state.
@@ -192,17 +1318,24 @@ class BasicIODiag(diag.Diag):
     Raises:
       TestError: An error occurred while running one of the steps.
     """
-    pass
+    if self._results_store:
+      self._results_store.close()
 
 if __name__ == '__main__':
   parser = argparser.create_parser()
-  io_diag = BasicIODiag(parser.parse_args())
+  config = parser.parse_args()
   try:
-    io_diag.setUp()
-    io_diag.PreDiag()
-    io_diag.Run()
-    io_diag.PostDiag()
-    io_diag.Report()
-    io_diag.tearDown()
+    io_diag = BasicIODiag(config)
+    try:
+      if config.preflight_only:
+        io_diag.Preflight()
+      else:
+        io_diag.setUp()
+        io_diag.PreDiag()
+        io_diag.Run()
+        io_diag.PostDiag()
+        io_diag.Report()
+    finally:
+      io_diag.tearDown()
   except diag.TestError as error_exc:
     print(error_exc)
@@ -4,41 +4,997 @@
 # license that can be found in the LICENSE file or at
 # https://opensource.org/licenses/MIT.
 
+import collections
+import json
+import os
+import shutil
+import socket
+import sqlite3
 import subprocess
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch, mock_open
 
+import ocptv.output as tv
+from ocptv.output.config import get_config
+
 from ...libs import argparser
+from ...libs import diag
+from ...libs import endurance
+from ...libs import fiojob
+from ...libs import verify
+from ...libs import generic
 from . import basic_io_diag
 
+_PLAYBOOK = ('{"test_steps": ["iops_rand_rd_4kb_bs_256_qd.fio",'
+             ' "iops_rand_wr_4kb_bs_256_qd.fio"]}')
+
+
+class FakeDUTOperations(generic.GenericDUTOperations):
+
+  def LogCollect(self):
+    return []
+
+  def WriteCounters(self):
+    return endurance.Counters()
+
+
+class _ArtifactWriter(tv.Writer):
+  """Keeps the OCP artifacts emitted, in order."""
+
+  def __init__(self):
+    self.artifacts = []
+
+  def write(self, buffer):
+    self.artifacts.append(json.loads(buffer))
+
+
+def _create_diag(args, playbook=_PLAYBOOK):
+  parser = argparser.create_parser()
+  mock_opener = mock_open(read_data=playbook)
+  with patch('builtins.open', mock_opener), \
+       patch.object(basic_io_diag.commonlib, 'cmdexec', return_value='host'):
+    io_diag = basic_io_diag.BasicIODiag(
+        parser.parse_args(args), driver=FakeDUTOperations)
+  return io_diag, mock_opener
+
+
+def _fio_output(error=0):
+  return json.dumps({'jobs': [{'jobname': 'job', 'error': error}]})
+
+
+def _write_fio_output(args, error=0):
+  """Writes the fio output where --output of the fio command line points."""
+  for arg in args:
+    if arg.startswith('--output='):
+      with open(arg[len('--output='):], 'w') as f:
+        f.write(_fio_output(error))
+  return ''
+
+
+_FIO_SERVER_PORT = 18765
+# output of fio-3.36 --client=host1 --output-format=json+ running a 4k random
+# read against a single server, latency bins trimmed
+_FIO_CLIENT_OUTPUT = """\
+hostname=host1, be=0, 64-bit, os=Linux, arch=x86-64, fio=fio-3.36, flags=1
+<host1> rand_rd: (g=0): rw=randread, bs=(R) 4096B-4096B, (W) 4096B-4096B, \
+(T) 4096B-4096B, ioengine=libaio, iodepth=256
+<host1> Starting 1 process
+{
+  "fio version" : "fio-3.36",
+  "timestamp" : 1718030516,
+  "timestamp_ms" : 1718030516412,
+  "time" : "Mon Jun 10 14:41:56 2024",
+  "global options" : {
+    "filename" : "/dev/nvme0n1"
+  },
+  "client_stats" : [
+    {
+      "jobname" : "rand_rd",
+      "groupid" : 0,
+      "job_start" : 1718030456402,
+      "error" : 0,
+      "job options" : {
+        "rw" : "randread",
+        "bs" : "4k",
+        "iodepth" : "256"
+      },
+      "read" : {
+        "io_bytes" : 244170752000,
+        "io_kbytes" : 238448000,
+        "bw_bytes" : 4069512533,
+        "bw" : 3974133,
+        "iops" : 993533.333333,
+        "runtime" : 60000,
+        "total_ios" : 59612000,
+        "short_ios" : 0,
+        "drop_ios" : 0,
+        "slat_ns" : {
+          "min" : 1012,
+          "max" : 60144,
+          "mean" : 2191.420000,
+          "stddev" : 903.120000,
+          "N" : 59612000
+        },
+        "clat_ns" : {
+          "min" : 19328,
+          "max" : 4603904,
+          "mean" : 255412.712000,
+          "stddev" : 60321.540000,
+          "N" : 59612000,
+          "percentile" : {
+            "50.000000" : 250880,
+            "99.000000" : 411648,
+            "99.900000" : 561152
+          },
+          "bins" : {
+            "19328" : 12,
+            "250880" : 29806000,
+            "411648" : 29209880,
+            "561152" : 536508,
+            "4603904" : 59600
+          }
+        },
+        "lat_ns" : {
+          "min" : 21504,
+          "max" : 4606976,
+          "mean" : 257604.132000,
+          "stddev" : 60344.210000,
+          "N" : 59612000
+        },
+        "bw_min" : 3801128,
+        "bw_max" : 4102144,
+        "bw_agg" : 100.000000,
+        "bw_mean" : 3974201.420000,
+        "bw_dev" : 21021.330000,
+        "bw_samples" : 120,
+        "iops_min" : 950282,
+        "iops_max" : 1025536,
+        "iops_mean" : 993550.350000,
+        "iops_stddev" : 5255.330000,
+        "iops_samples" : 120
+      },
+      "write" : {
+        "io_bytes" : 0,
+        "io_kbytes" : 0,
+        "bw_bytes" : 0,
+        "bw" : 0,
+        "iops" : 0.000000,
+        "runtime" : 0,
+        "total_ios" : 0,
+        "short_ios" : 0,
+        "drop_ios" : 0
+      },
+      "trim" : {
+        "io_bytes" : 0,
+        "io_kbytes" : 0,
+        "bw_bytes" : 0,
+        "bw" : 0,
+        "iops" : 0.000000,
+        "runtime" : 0,
+        "total_ios" : 0,
+        "short_ios" : 0,
+        "drop_ios" : 0
+      },
+      "job_runtime" : 60001,
+      "usr_cpu" : 14.221000,
+      "sys_cpu" : 61.902000,
+      "ctx" : 131081,
+      "majf" : 0,
+      "minf" : 279,
+      "iodepth_level" : {
+        "1" : 0.100000,
+        "2" : 0.100000,
+        "4" : 0.100000,
+        "8" : 0.100000,
+        "16" : 0.100000,
+        "32" : 0.100000,
+        ">=64" : 100.000000
+      },
+      "latency_ns" : {
+        "2" : 0.000000,
+        "4" : 0.000000
+      },
+      "hostname" : "host1",
+      "port" : 8765,
+      "latency_depth" : 256,
+      "latency_target" : 0,
+      "latency_percentile" : 100.000000,
+      "latency_window" : 0
+    }
+  ],
+  "disk_util" : [
+    {
+      "name" : "nvme0n1",
+      "read_ios" : 59611744,
+      "write_ios" : 0,
+      "util" : 99.921000
+    }
+  ]
+}
+<host1> client: host=host1 disconnected
+"""
+
+
+def _wait_for_port(port, timeout_sec=10):
+  deadline = time.time() + timeout_sec
+  while True:
+    try:
+      with socket.create_connection(('127.0.0.1', port), timeout=1):
+        return
+    except OSError:
+      if time.time() > deadline:
+        raise
+      time.sleep(0.1)
+
+
+def _write_playbook(work_dir, playbook):
+  path = os.path.join(work_dir, 'playbook.json')
+  with open(path, 'w') as f:
+    json.dump(playbook, f)
+  return path
+
 
 class BasicIODiagTest(unittest.TestCase):
-  @patch('os.getcwd')
-  @patch('subprocess.run',
-         side_effect=subprocess.CalledProcessError(cmd='fio', returncode=-1)
-         )
 
-  def test_run_fail(self, _, mock_getcwd):
-    mock_getcwd.return_value = '/mydir/'
-    parser = argparser.create_parser()
-    diag = basic_io_diag.BasicIODiag(
-        parser.parse_args(
-            ['--duts', '/dev/nvme1n1', '--playbook', 'playbook.fio'])
-    )
-    file_contents = [
-        '["basic_io_seq_wr_8kb_bs_1024_qd_known_pattern.fio"]',
-        '[basic_io_logical_reads-seq_wr]'
-    ]
-    mock_files = [
-        mock_open(read_data=content).return_value for content in file_contents
-    ]
-    mock_opener = mock_open()
-    mock_opener.side_effect = mock_files
+  def test_run_fail(self):
+    diag, mock_opener = _create_diag(
+        ['--duts', '/dev/nvme1n1', '--playbook', 'playbook.fio'])
+    mock_opener.assert_called_once_with('playbook.fio')
     with self.assertRaises(subprocess.CalledProcessError) as cm:
-      with patch('builtins.open', mock_opener):
+      with patch('subprocess.run',
+                 side_effect=subprocess.CalledProcessError(
+                     cmd='fio', returncode=-1)):
         diag.Run()
     self.assertEqual(cm.exception.returncode, -1)
-    mock_opener.assert_called_once_with('playbook.fio')
+
+  def test_run_parallel_failure_does_not_abort_other_duts(self):
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1 /dev/nvme1n1 /dev/nvme2n1',
+         '--parallel_duts', '2'])
+
+    def fake_fio(args, **_):
+      return _write_fio_output(
+          args, error=int('--filename=/dev/nvme1n1' in args))
+
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      with self.assertRaisesRegex(diag.TestError, '/dev/nvme1n1'):
+        io_diag.Run()
+    self.assertEqual(len(io_diag._logs['/dev/nvme0n1']), 2)
+    self.assertEqual(len(io_diag._logs['/dev/nvme1n1']), 1)
+    self.assertEqual(len(io_diag._logs['/dev/nvme2n1']), 2)
+
+  def test_run_parallel_keeps_the_artifacts_of_every_dut_together(self):
+    writer = _ArtifactWriter()
+    self.addCleanup(tv.config, writer=get_config().writer)
+    tv.config(writer=writer)
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1 /dev/nvme1n1', '--parallel_duts', '2'])
+    # both DUTs are in the middle of a step at the same time
+    barrier = threading.Barrier(2, timeout=10)
+
+    def fake_fio(args, **_):
+      barrier.wait()
+      return _write_fio_output(args)
+
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.Run()
+    blocks = []
+    for artifact in writer.artifacts:
+      run_artifact = artifact.get('testRunArtifact', {})
+      if 'testRunStart' in run_artifact:
+        blocks.append([artifact])
+      elif blocks and blocks[-1][-1] is not None:
+        blocks[-1].append(artifact)
+      if 'testRunEnd' in run_artifact:
+        blocks[-1].append(None)
+    self.assertEqual(
+        sorted(block[0]['testRunArtifact']['testRunStart']['dutInfo']['name']
+               for block in blocks),
+        ['host:/dev/nvme0n1', 'host:/dev/nvme1n1'])
+    for block in blocks:
+      artifacts = block[:-1]
+      # a single test run numbers the artifacts of the block one by one
+      sequence = [artifact['sequenceNumber'] for artifact in artifacts]
+      self.assertEqual(sequence,
+                       list(range(sequence[0], sequence[0] + len(sequence))))
+      self.assertEqual(
+          [artifact['testStepArtifact']['testStepStart']['name']
+           for artifact in artifacts
+           if 'testStepStart' in artifact.get('testStepArtifact', {})],
+          ['iops_rand_rd_4kb_bs_256_qd.fio', 'iops_rand_wr_4kb_bs_256_qd.fio'])
+
+  def test_smart_samples_emitted_live(self):
+    writer = _ArtifactWriter()
+    self.addCleanup(tv.config, writer=get_config().writer)
+    tv.config(writer=writer)
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1', '--smart_interval', '10'])
+    samplers = []
+    emitted = []
+
+    def fake_fio(args, **_):
+      # a sample taken while fio runs is on the step before fio is done
+      samplers[0].sample()
+      emitted.append(len(writer.artifacts))
+      return _write_fio_output(args)
+
+    with patch.object(basic_io_diag.health.HealthSampler, 'start',
+                      autospec=True, side_effect=samplers.append), \
+         patch.object(basic_io_diag.health.HealthSampler, 'stop'), \
+         patch.object(basic_io_diag.health, 'read_smart_log',
+                      return_value={'temperature': 320}), \
+         patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.Run()
+    elements = [
+        index for index, artifact in enumerate(writer.artifacts)
+        if 'measurementSeriesElement' in artifact.get('testStepArtifact', {})]
+    self.assertEqual(len(elements), 2 * len(basic_io_diag.health.FIELDS))
+    self.assertLess(elements[0], emitted[0])
+    step_artifacts = [artifact.get('testStepArtifact', {})
+                      for artifact in writer.artifacts]
+    temperature_ids = {
+        artifact['measurementSeriesStart']['measurementSeriesId']
+        for artifact in step_artifacts
+        if artifact.get('measurementSeriesStart', {}).get('name') ==
+        'smart.temperature'}
+    self.assertEqual(
+        [artifact['measurementSeriesElement']['value']
+         for artifact in step_artifacts
+         if 'measurementSeriesElement' in artifact and
+         artifact['measurementSeriesElement']['measurementSeriesId'] in
+         temperature_ids], [47, 47])
+
+  def test_results_of_a_failed_run_stored(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    results_db = os.path.join(log_dir, 'results.db')
+    io_diag, _ = _create_diag(['--duts', '/dev/nvme0n1', '--log_dir', log_dir,
+                               '--results_db', results_db])
+    self.addCleanup(io_diag.tearDown)
+
+    def fake_fio(args, **_):
+      return _write_fio_output(
+          args, error=int(any('rand_wr' in arg for arg in args)))
+
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      with self.assertRaises(diag.TestError):
+        io_diag.Run()
+    # neither Report nor tearDown run after a failure
+    connection = sqlite3.connect(results_db)
+    self.addCleanup(connection.close)
+    self.assertEqual(connection.execute('SELECT step FROM steps').fetchall(),
+                     [('iops_rand_rd_4kb_bs_256_qd.fio',)])
+
+  def test_resume_skips_finished_steps(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    args = ['--duts', '/dev/nvme0n1', '--log_dir', log_dir]
+    fio_runs = []
+
+    def fake_fio(args, **_):
+      fio_runs.extend(arg for arg in args if arg.endswith('.fio'))
+      return _write_fio_output(
+          args, error=int(any('rand_wr' in arg for arg in args)))
+
+    io_diag, _ = _create_diag(args)
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      with self.assertRaises(diag.TestError):
+        io_diag.Run()
+      io_diag, _ = _create_diag(args + ['--resume'])
+      fio_runs.clear()
+      with self.assertRaises(diag.TestError):
+        io_diag.Run()
+    self.assertEqual([os.path.basename(run) for run in fio_runs],
+                     ['iops_rand_wr_4kb_bs_256_qd.fio'])
+    self.assertEqual(len(io_diag._logs['/dev/nvme0n1']), 2)
+    self.assertEqual(io_diag._logs['/dev/nvme0n1'][0].jobs[0].name, 'job')
+
+  def test_run_sweep(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1', '--log_dir', log_dir],
+        playbook=json.dumps({'test_steps': [{
+            'config': 'iops_rand_rd_4kb_bs_256_qd.fio',
+            'sweep': {'iodepth': [1, 32], 'sla_latency_usec': 500},
+        }]}))
+    configs = []
+
+    def fake_fio(args, **_):
+      configs.extend(arg for arg in args if arg.endswith('.fio'))
+      return _write_fio_output(args)
+
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.Run()
+    self.assertEqual([os.path.basename(config) for config in configs], [
+        '0_iops_rand_rd_4kb_bs_256_qd_qd1_jobs1.fio',
+        '0_iops_rand_rd_4kb_bs_256_qd_qd32_jobs1.fio'])
+    with open(configs[1]) as f:
+      self.assertIn('iodepth=32', f.read())
+    step_result = io_diag._logs['/dev/nvme0n1'][0]
+    self.assertEqual([point.name for point in step_result.sweep],
+                     ['qd1_jobs1', 'qd32_jobs1'])
+
+  def test_engine_override(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1', '--log_dir', log_dir, '--engine',
+         'libaio'],
+        playbook=json.dumps({'engine': 'io_uring', 'test_steps': [{
+            'config': 'iops_rand_rd_4kb_bs_256_qd.fio',
+            'compare_engines': ['libaio', 'io_uring'],
+        }, 'iops_rand_wr_4kb_bs_256_qd.fio']}))
+    configs = []
+
+    def fake_fio(args, **_):
+      configs.extend(arg for arg in args if arg.endswith('.fio'))
+      return _write_fio_output(args)
+
+    with patch.object(basic_io_diag.engine, 'io_uring_supported',
+                      return_value=True), \
+         patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.Run()
+    self.assertEqual([os.path.basename(config) for config in configs], [
+        '0_iops_rand_rd_4kb_bs_256_qd_libaio.fio',
+        '0_iops_rand_rd_4kb_bs_256_qd_io_uring.fio',
+        '1_iops_rand_wr_4kb_bs_256_qd.fio'])
+    with open(configs[1]) as f:
+      self.assertIn('ioengine=io_uring', f.read())
+    # --engine wins over the engine of the playbook
+    with open(configs[2]) as f:
+      self.assertIn('ioengine=libaio', f.read())
+    self.assertEqual(len(io_diag._logs['/dev/nvme0n1']), 2)
+
+  def test_run_remote_duts(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    io_diag, _ = _create_diag(
+        ['--duts', 'host1:/dev/nvme0n1 host1:/dev/nvme1n1 host2:/dev/nvme0n1',
+         '--log_dir', log_dir, '--parallel_duts', '3',
+         '--parallel_per_host', '1', '--host_failure_policy', 'skip_host'])
+    fio_runs = []
+
+    def fake_fio(args, **_):
+      fio_runs.append(args)
+      return _write_fio_output(args, error=int('--client=host1' in args))
+
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      with self.assertRaisesRegex(diag.TestError, 'host1:/dev/nvme1n1'):
+        io_diag.Run()
+    # the second DUT of host1 is skipped once the first one failed
+    self.assertEqual(
+        sorted(args[args.index('--client=host1') + 1] for args in fio_runs
+               if '--client=host1' in args), ['--filename=/dev/nvme0n1'])
+    self.assertEqual(len(io_diag._logs['host2:/dev/nvme0n1']), 2)
+    for args in fio_runs:
+      client = [arg for arg in args if arg.startswith('--client=')][0]
+      # the options of the fio client itself precede the server
+      self.assertLess(
+          max(index for index, arg in enumerate(args)
+              if arg.startswith('--output')), args.index(client))
+    self.assertTrue(os.path.isdir(os.path.join(log_dir, 'host2_nvme0n1')))
+
+  def test_run_remote_dut_client_output(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    io_diag, _ = _create_diag(
+        ['--duts', 'host1:/dev/nvme0n1', '--log_dir', log_dir],
+        playbook='{"test_steps": ["iops_rand_rd_4kb_bs_256_qd.fio"]}')
+
+    def fake_fio(args, **_):
+      for arg in args:
+        if arg.startswith('--output='):
+          with open(arg[len('--output='):], 'w') as f:
+            f.write(_FIO_CLIENT_OUTPUT)
+      return ''
+
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.Run()
+    step_result = io_diag._logs['host1:/dev/nvme0n1'][0]
+    self.assertEqual([job.name for job in step_result.jobs], ['rand_rd'])
+    read = step_result.jobs[0].io_stats['read']
+    self.assertEqual(read.io_bytes, 244170752000)
+    self.assertEqual(read.bw, 3974133)
+    clat = read.latencies['clat_ns']
+    self.assertEqual(clat.percentiles['99.900000'], 561152)
+    self.assertEqual(clat.histogram.total, 59612000)
+    self.assertTrue(step_result.raw_path.endswith('.json.gz'))
+    self.assertEqual(
+        step_result.load_raw()['client_stats'][0]['hostname'], 'host1')
+
+  @unittest.skipUnless(os.path.exists(basic_io_diag._FIO_PATH),
+                       'fio is not installed')
+  def test_run_against_local_fio_servers(self):
+    work_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, work_dir)
+    config = os.path.join(work_dir, 'rand_rd.fio')
+    with open(config, 'w') as f:
+      f.write('[rand_rd]\nrw=randread\nbs=4k\nsize=4m\nioengine=psync\n'
+              'time_based\nruntime=1\n')
+    duts = []
+    for port in (_FIO_SERVER_PORT, _FIO_SERVER_PORT + 1):
+      server = subprocess.Popen(
+          [basic_io_diag._FIO_PATH, '--server=127.0.0.1,%d' % port],
+          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+      self.addCleanup(server.wait)
+      self.addCleanup(server.terminate)
+      _wait_for_port(port)
+      duts.append('127.0.0.1,%d:%s' % (port, os.path.join(work_dir,
+                                                           'dut%d' % port)))
+    io_diag = basic_io_diag.BasicIODiag(argparser.create_parser().parse_args(
+        ['--duts', ' '.join(duts), '--log_dir', os.path.join(work_dir, 'logs'),
+         '--parallel_duts', '2', '--playbook', _write_playbook(
+             work_dir, {'test_steps': [config]})]),
+        driver=FakeDUTOperations)
+    io_diag.Run()
+    for dut in duts:
+      jobs = io_diag._logs[dut][0].jobs
+      self.assertEqual([job.name for job in jobs], ['rand_rd'])
+      self.assertGreater(jobs[0].io_stats['read'].io_bytes, 0)
+
+  def test_dry_run(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/sim0 /dev/sim1', '--log_dir', log_dir, '--dry_run',
+         '--engine', 'io_uring'])
+    configs = []
+
+    def fake_fio(args, **_):
+      configs.extend(arg for arg in args if arg.endswith('.fio'))
+      return _write_fio_output(args)
+
+    with patch.object(basic_io_diag.engine, 'io_uring_supported',
+                      return_value=True), \
+         patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.setUp()
+      io_diag.Run()
+      io_diag.PostDiag()
+      io_diag.Report()
+    self.assertEqual(len(configs), 4)
+    for config in configs:
+      self.assertTrue(config.startswith(log_dir))
+      with open(config) as f:
+        # the dry run wins over --engine
+        self.assertIn('ioengine=null', f.read())
+    self.assertEqual(io_diag._drives[0].identity['serial'], 'DRYRUN')
+
+  def test_reset_between_steps(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    playbook = json.dumps({'test_steps': [
+        'iops_rand_rd_4kb_bs_256_qd.fio',
+        {'config': 'iops_rand_wr_4kb_bs_256_qd.fio', 'reset': 'discard'},
+    ]})
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/sim0 /dev/sim1', '--log_dir', log_dir, '--dry_run',
+         '--parallel_duts', '2'], playbook=playbook)
+    resets = []
+
+    def fake_reset(driver, method):
+      resets.append((driver.name, method))
+      return driver.name != '/dev/sim1'
+
+    fio_runs = []
+
+    def fake_fio(args, **_):
+      fio_runs.append(args)
+      return _write_fio_output(args)
+
+    with patch.object(basic_io_diag.dryrun.SimulatedDUTOperations,
+                      'ResetDUT', autospec=True, side_effect=fake_reset), \
+         patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.setUp()
+      with self.assertRaisesRegex(diag.TestError, '/dev/sim1'):
+        io_diag.Run()
+    self.assertCountEqual(resets, [('/dev/sim0', 'discard'),
+                                   ('/dev/sim1', 'discard')])
+    # the step isn't run on a DUT whose reset failed
+    self.assertEqual(len(fio_runs), 3)
+
+  def test_sanitize_between_steps(self):
+    writer = _ArtifactWriter()
+    self.addCleanup(tv.config, writer=get_config().writer)
+    tv.config(writer=writer)
+    playbook = json.dumps({'test_steps': [
+        {'config': 'iops_rand_wr_4kb_bs_256_qd.fio',
+         'reset': 'sanitize_crypto_erase'},
+    ]})
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1 /dev/nvme1n1', '--parallel_duts', '2'],
+        playbook=playbook)
+    # with --parallel_duts the DUTs are sanitized at the same time
+    barrier = threading.Barrier(2, timeout=10)
+    polls = collections.Counter()
+
+    def fake_cmdexec(args, *_, **__):
+      if args[:2] == ['nvme', 'sanitize']:
+        barrier.wait()
+        return ''
+      if args[:2] == ['nvme', 'sanitize-log']:
+        polls[args[-1]] += 1
+        # in progress for the first two polls
+        return json.dumps({'sstat': 0x2 if polls[args[-1]] < 3 else 0x101})
+      return _write_fio_output(args)
+
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_cmdexec), \
+         patch.object(generic, '_SANITIZE_POLL_SEC', 0.1):
+      io_diag.Run()
+    self.assertEqual(polls, {'/dev/nvme0n1': 3, '/dev/nvme1n1': 3})
+    reset_secs = [
+        artifact['testStepArtifact']['measurement']['value']
+        for artifact in writer.artifacts
+        if artifact.get('testStepArtifact', {}).get(
+            'measurement', {}).get('name') == 'resetSec']
+    # the time the sanitize log was polled for is part of the reset
+    self.assertEqual(len(reset_secs), 2)
+    for reset_sec in reset_secs:
+      self.assertGreaterEqual(reset_sec, 0.2)
+
+  def test_batch_steps(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    playbook = json.dumps({'test_steps': [
+        'iops_rand_rd_4kb_bs_256_qd.fio',
+        {'config': 'iops_rand_wr_4kb_bs_256_qd.fio',
+         'steady_state': {'metric': 'iops', 'tolerance': '2%'}},
+        'iops_rand_rd_4kb_bs_256_qd.fio',
+    ]})
+    fio_runs = []
+
+    def fake_fio(error_group):
+
+      def run(args, **_):
+        fio_runs.append(args)
+        jobs = fiojob.read(args[-1])
+        output = [{'jobname': job.name, 'groupid': groupid, 'elapsed': 1,
+                   'error': 5 if groupid == error_group else 0}
+                  for groupid, job in enumerate(jobs)]
+        with open(args[1][len('--output='):], 'w') as f:
+          json.dump({'jobs': output}, f)
+        return ''
+
+      return run
+
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/sim0', '--log_dir', log_dir, '--dry_run',
+         '--batch_steps', '3'], playbook=playbook)
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio(None)):
+      io_diag.setUp()
+      io_diag.Run()
+    self.assertEqual(len(fio_runs), 1)
+    jobs = fiojob.read(fio_runs[0][-1])
+    self.assertEqual(len(jobs), 3)
+    self.assertIn('steadystate', jobs[1].options)
+    self.assertNotIn('steadystate', jobs[2].options)
+    self.assertEqual(jobs[2].get('ioengine'), 'null')
+    step_results = io_diag._logs['/dev/sim0']
+    self.assertEqual([len(step.jobs) for step in step_results], [1, 1, 1])
+    self.assertEqual(step_results[1].jobs[0].name, jobs[1].name)
+    self.assertEqual(len({step.raw_path for step in step_results}), 3)
+
+    # a step failing in the batch fails like a step run on its own
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/sim0', '--log_dir', log_dir, '--dry_run',
+         '--batch_steps', '3'], playbook=playbook)
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio(1)):
+      io_diag.setUp()
+      with self.assertRaises(diag.TestError):
+        io_diag.Run()
+    self.assertEqual(len(io_diag._logs['/dev/sim0']), 2)
+
+  def test_batch_steps_without_status_interval(self):
+    with self.assertRaisesRegex(diag.TestError, '--status_interval'):
+      _create_diag(['--duts', '/dev/nvme0n1', '--batch_steps', '2',
+                    '--status_interval', '5'])
+
+  def test_fastest_verify(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    playbook = json.dumps({
+        'verify': 'fastest',
+        'test_steps': [
+            'basic_io_logical_seq_wr_8kb_bs_1024_qd_known_pattern.fio',
+            'iops_rand_rd_4kb_bs_256_qd.fio',
+        ]})
+    profile = verify.Profile('host', 'fio-3.36', 0,
+                             {'crc32c': 1000.0, 'xxhash': 2000.0})
+    configs = []
+
+    def fake_fio(args, **_):
+      configs.append(args[-1])
+      return _write_fio_output(args)
+
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/sim0', '--log_dir', log_dir, '--dry_run=file'],
+        playbook=playbook)
+    with patch.object(basic_io_diag.verify, 'profile',
+                      return_value=profile), \
+         patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio), \
+         patch.object(io_diag, '_report_verify') as report_verify:
+      io_diag.setUp()
+      io_diag.Run()
+    self.assertEqual(fiojob.read(configs[0])[0].get('verify'), 'xxhash')
+    self.assertNotIn('verify', fiojob.read(configs[1])[0].options)
+    report_verify.assert_called_once()
+    self.assertEqual(report_verify.call_args[0][1], 'xxhash')
+
+  def test_write_amplification(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    targets = json.dumps({'basename': 'Benchmark', 'workloads': [{
+        'ioType': 'randwrite', 'workloadNum': 1,
+        'targets': {'wafMax': 2.5}}]})
+    playbook = json.dumps({
+        'test_steps': ['iops_rand_wr_4kb_bs_256_qd.fio'],
+        'benchmark_targets': 'targets.json'})
+    # every step writes 10 data units, the DUT writes 3 times as much to NAND
+    counters = [endurance.Counters(100, 0),
+                endurance.Counters(110, 3 * 10 * endurance.DATA_UNIT_BYTES)]
+
+    def fake_fio(args, **_):
+      for arg in args:
+        if arg.startswith('--output='):
+          with open(arg[len('--output='):], 'w') as f:
+            json.dump({'jobs': [{
+                'jobname': 'job', 'write': {
+                    'io_bytes': 10 * endurance.DATA_UNIT_BYTES, 'bw': 1,
+                    'clat_ns': {'percentile': {}}}}]}, f)
+      return ''
+
+    parser = argparser.create_parser()
+    files = {'targets.json': targets}
+    real_open = open
+
+    def fake_open(path, *args, **kwargs):
+      name = os.path.basename(path)
+      if name in files:
+        return mock_open(read_data=files[name])()
+      if name == 'playbook.json':
+        return mock_open(read_data=playbook)()
+      return real_open(path, *args, **kwargs)
+
+    with patch('builtins.open', side_effect=fake_open), \
+         patch.object(basic_io_diag.commonlib, 'cmdexec', return_value='host'):
+      io_diag = basic_io_diag.BasicIODiag(
+          parser.parse_args(['--duts', '/dev/nvme0n1', '--log_dir', log_dir,
+                             '--playbook', 'playbook.json']),
+          driver=FakeDUTOperations)
+    with patch.object(FakeDUTOperations, 'WriteCounters',
+                      side_effect=counters), \
+         patch.object(basic_io_diag.health,
+                      'data_units_written') as data_units_written, \
+         patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.Preflight()
+      io_diag.Run()
+    # the checkpoint keeps the counters read at the end of the step
+    data_units_written.assert_not_called()
+    with open(os.path.join(log_dir, 'nvme0n1', 'checkpoint.json')) as f:
+      self.assertEqual(json.load(f)['steps'][0]['data_units_written'], 110)
+    step_endurance = io_diag._logs['/dev/nvme0n1'][0].endurance
+    self.assertEqual(step_endurance.host_bytes,
+                     10 * endurance.DATA_UNIT_BYTES)
+    self.assertEqual(step_endurance.device_bytes,
+                     10 * endurance.DATA_UNIT_BYTES)
+    self.assertEqual(step_endurance.waf, 3)
+    failed = io_diag._benchmark_evaluator.evaluate(
+        io_diag._logs['/dev/nvme0n1'])
+    self.assertEqual(failed[0].failed_workloads[0].failed_metrics,
+                     ['wafMax'])
+
+  def test_writes_not_accounted(self):
+    writer = _ArtifactWriter()
+    self.addCleanup(tv.config, writer=get_config().writer)
+    tv.config(writer=writer)
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/sim0', '--log_dir', log_dir, '--dry_run',
+         '--batch_steps', '2'])
+
+    def fake_fio(args, **_):
+      jobs = fiojob.read(args[-1])
+      with open(args[1][len('--output='):], 'w') as f:
+        json.dump({'jobs': [{'jobname': job.name, 'groupid': groupid}
+                            for groupid, job in enumerate(jobs)]}, f)
+      return ''
+
+    with patch.object(basic_io_diag.dryrun.SimulatedDUTOperations,
+                      'WriteCounters') as write_counters, \
+         patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.Run()
+    write_counters.assert_not_called()
+    self.assertTrue(all(step_result.endurance is None
+                        for step_result in io_diag._logs['/dev/sim0']))
+    messages = [
+        artifact['testStepArtifact']['log']['message']
+        for artifact in writer.artifacts
+        if 'log' in artifact.get('testStepArtifact', {})]
+    self.assertEqual(messages.count(
+        "Writes not accounted, the write counters can't tell apart the steps"
+        ' of a batch'), 2)
+
+  def test_dry_run_of_remote_duts(self):
+    with self.assertRaisesRegex(diag.TestError, 'local DUTs only'):
+      _create_diag(['--duts', 'host1:/dev/nvme0n1', '--dry_run=file'])
+
+  def test_precondition(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    args = ['--duts', '/dev/sim0 /dev/sim1', '--log_dir', log_dir,
+            '--dry_run']
+    playbook = json.dumps({
+        'precondition': {'fill_percent': 50, 'random': True},
+        'test_steps': ['iops_rand_rd_4kb_bs_256_qd.fio'],
+    })
+    fio_runs = []
+
+    def fake_fio(args, **_):
+      fio_runs.append(args)
+      output = args[1][len('--output='):]
+      with open(output, 'w') as f:
+        json.dump({'jobs': [
+            {'jobname': 'precondition_fill', 'write': {
+                'io_bytes': 1 << 29, 'bw': 1024}},
+            {'jobname': 'precondition_steady', 'write': {'io_bytes': 1},
+             'steadystate': {'attained': 1, 'data': {
+                 'bw_mean': 4096, 'iops_mean': 1000}}},
+        ]}, f)
+      return ''
+
+    io_diag, _ = _create_diag(args, playbook=playbook)
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.PreDiag()
+    self.assertEqual(len(fio_runs), 2)
+    for dut in ('sim0', 'sim1'):
+      with open(os.path.join(log_dir, dut, 'precondition.json')) as f:
+        record = json.load(f)
+      self.assertEqual(record['settings']['fill_percent'], 50)
+      self.assertEqual(record['bytes_written'], 1 << 29)
+      self.assertTrue(record['steady_state_attained'])
+      self.assertIn('rw=randwrite', record['config'])
+      self.assertIn('ioengine=null', record['config'])
+    # a resumed run doesn't precondition the DUTs again
+    io_diag, _ = _create_diag(args + ['--resume'], playbook=playbook)
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.PreDiag()
+    self.assertEqual(len(fio_runs), 2)
+
+  def test_precondition_bounded_by_parallel_duts(self):
+    log_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, log_dir)
+    playbook = json.dumps({
+        'precondition': {'fill_percent': 50, 'steady_state': None},
+        'test_steps': ['iops_rand_rd_4kb_bs_256_qd.fio'],
+    })
+    lock = threading.Lock()
+    running = []
+    most_running = [0]
+
+    def fake_fio(args, **_):
+      with lock:
+        running.append(args)
+        most_running[0] = max(most_running[0], len(running))
+      time.sleep(0.05)
+      with lock:
+        running.remove(args)
+      with open(args[1][len('--output='):], 'w') as f:
+        json.dump({'jobs': [{'jobname': 'precondition_fill',
+                             'write': {'io_bytes': 1, 'bw': 1}}]}, f)
+      return ''
+
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/sim0 /dev/sim1 /dev/sim2 /dev/sim3', '--log_dir',
+         log_dir, '--dry_run', '--parallel_duts', '2'], playbook=playbook)
+    with patch.object(basic_io_diag.commonlib, 'cmdexec',
+                      side_effect=fake_fio):
+      io_diag.PreDiag()
+    self.assertLessEqual(most_running[0], 2)
+    for dut in ('sim0', 'sim1', 'sim2', 'sim3'):
+      self.assertTrue(os.path.exists(
+          os.path.join(log_dir, dut, 'precondition.json')))
+
+  def test_malformed_playbook_step(self):
+    with self.assertRaisesRegex(diag.TestError,
+                                "invalid playbook: test step 1: .*conifg"):
+      _create_diag(['--duts', '/dev/nvme0n1'], playbook=(
+          '{"test_steps": ["iops_rand_rd_4kb_bs_256_qd.fio",'
+          ' {"conifg": "iops_rand_wr_4kb_bs_256_qd.fio"}]}'))
+
+  def test_preflight(self):
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1'],
+        playbook='{"test_steps": ["iops_rand_rd_4kb_bs_256_qd.fio"]}')
+    io_diag.Preflight()
+
+  def test_preflight_does_not_profile_verify(self):
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1', '--preflight_only'],
+        playbook=('{"verify": "fastest",'
+                  ' "test_steps": ["iops_rand_rd_4kb_bs_256_qd.fio"]}'))
+    with patch.object(basic_io_diag.verify, 'profile') as profile:
+      io_diag.Preflight()
+    profile.assert_not_called()
+
+  def test_preflight_does_not_probe_engines(self):
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1', '--preflight_only'],
+        playbook=('{"engine": "auto",'
+                  ' "test_steps": ["iops_rand_rd_4kb_bs_256_qd.fio"]}'))
+    with patch.object(basic_io_diag.engine, 'io_uring_supported') as probe:
+      io_diag.Preflight()
+    probe.assert_not_called()
+    # setUp checks the engines against the host
+    io_diag._config.engine = 'io_uring'
+    with patch.object(basic_io_diag.engine, 'io_uring_supported',
+                      return_value=False):
+      with self.assertRaisesRegex(diag.TestError, 'unsupported engines'):
+        io_diag._check_engines()
+
+  def test_preflight_invalid_targets(self):
+    # the mocked open returns the playbook for the target file too
+    io_diag, _ = _create_diag(
+        ['--duts', '/dev/nvme0n1'],
+        playbook=('{"test_steps": ["iops_rand_rd_4kb_bs_256_qd.fio"],'
+                  ' "benchmark_targets": "targets.json"}'))
+    with self.assertRaisesRegex(diag.TestError, 'invalid targets'):
+      io_diag.Preflight()
+    self.assertIsNone(io_diag._benchmark_evaluator)
+
+  def test_preflight_timeseries_targets_without_fio_logs(self):
+    playbook = ('{"test_steps": ["iops_rand_rd_4kb_bs_256_qd.fio"],'
+                ' "benchmark_targets": "targets.json"}')
+    targets = json.dumps({'basename': 'window', 'workloads': [{
+        'ioType': 'randread', 'workloadNum': 1,
+        'targets': {'bwMinWindowMbytesPerSec': '100'}}]})
+    real_open = open
+
+    def fake_open(path, *args, **kwargs):
+      name = os.path.basename(path)
+      if name == 'targets.json':
+        return mock_open(read_data=targets)()
+      if name == 'playbook.json':
+        return mock_open(read_data=playbook)()
+      return real_open(path, *args, **kwargs)
+
+    parser = argparser.create_parser()
+    for log_avg_msec, error in (('0', "aren't collected"), ('1000', None)):
+      with patch('builtins.open', side_effect=fake_open), \
+           patch.object(basic_io_diag.commonlib, 'cmdexec',
+                        return_value='host'):
+        io_diag = basic_io_diag.BasicIODiag(
+            parser.parse_args(['--duts', '/dev/nvme0n1', '--playbook',
+                               'playbook.json', '--log_avg_msec',
+                               log_avg_msec]),
+            driver=FakeDUTOperations)
+      if error:
+        with self.assertRaisesRegex(diag.TestError, error):
+          io_diag.Preflight()
+      else:
+        io_diag.Preflight()
 
 
 if __name__ == '__main__':
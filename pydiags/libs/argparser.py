@@ -6,6 +6,11 @@
 
 """This module provides a method to creats a parser for CLI args."""
 import argparse
+import os
+
+from . import dryrun
+from . import engine
+from . import remote
 
 
 def create_parser():
@@ -19,7 +24,8 @@ def create_parser():
   parser = argparse.ArgumentParser()
   parser.add_argument(
       '--duts',
-      help='Devices under tests, comma separated.'
+      help='Devices under tests, comma separated. host:/dev/nvme0n1 tests a'
+      + ' device of a host running fio --server.'
   )
   parser.add_argument(
       '--playbook',
@@ -27,4 +33,109 @@ def create_parser():
       + ' files that should be performed sequentially.',
       default='basic_io.json'
   )
+  parser.add_argument(
+      '--log_dir',
+      help='Directory keeping the fio output and NVMe logs of every DUT.'
+      + ' A new temporary directory by default.',
+      default=''
+  )
+  parser.add_argument(
+      '--resume',
+      help='Skip the steps a previous run with the same --log_dir and'
+      + ' playbook already finished.',
+      action='store_true'
+  )
+  parser.add_argument(
+      '--preflight_only',
+      help='Validate the playbook and estimate the time of its steps'
+      + ' without running them.',
+      action='store_true'
+  )
+  parser.add_argument(
+      '--parallel_duts',
+      help='Maximum number of DUTs running the playbook at the same time.'
+      + ' By default DUTs are tested one after another.',
+      type=int,
+      default=1
+  )
+  parser.add_argument(
+      '--parallel_per_host',
+      help='Maximum number of DUTs of a single host running the playbook at'
+      + ' the same time. No limit other than --parallel_duts by default.',
+      type=int,
+      default=0
+  )
+  parser.add_argument(
+      '--host_failure_policy',
+      help='What a DUT failing does to the other DUTs of its host: "continue"'
+      + ' tests them anyway, "skip_host" skips the ones not started yet.',
+      choices=remote.FAILURE_POLICIES,
+      default=remote.CONTINUE
+  )
+  parser.add_argument(
+      '--status_interval',
+      help='Report fio progress as OCP measurements every N seconds while'
+      + ' a step is running. Disabled by default.',
+      type=int,
+      default=0
+  )
+  parser.add_argument(
+      '--batch_steps',
+      help='Run up to N consecutive steps with a single fio invocation, one'
+      + ' after another, instead of a fio process per step. Swept steps and'
+      + ' steps comparing engines always run on their own.',
+      type=int,
+      default=1
+  )
+  parser.add_argument(
+      '--crctest_cache',
+      help='JSON file keeping the checksum throughput fio --crctest'
+      + ' measured on every host, used to pick the "fastest" verify.',
+      default=os.path.join(os.path.expanduser('~'), '.cache', 'pydiags',
+                           'crctest.json')
+  )
+  parser.add_argument(
+      '--log_avg_msec',
+      help='Collect fio bandwidth, IOPS and latency logs averaged over N'
+      + ' milliseconds for every step. Disabled by default.',
+      type=int,
+      default=0
+  )
+  parser.add_argument(
+      '--results_db',
+      help='SQLite database keeping the results of every run, e.g. to'
+      + ' compare drives and firmware revisions. Disabled by default.',
+      default=''
+  )
+  parser.add_argument(
+      '--smart_interval',
+      help='Sample the SMART temperature and throttle counters of every DUT'
+      + ' every N seconds while the playbook runs. Disabled by default.',
+      type=int,
+      default=0
+  )
+  parser.add_argument(
+      '--baseline',
+      help='JSON file with baseline latency histograms and bandwidths to'
+      + ' detect performance regressions. Use "results_db" to build the'
+      + ' baselines from --results_db for the same model and firmware.',
+      default=''
+  )
+  parser.add_argument(
+      '--dry_run',
+      help='Run the playbook without the DUTs: the driver is simulated and'
+      + ' every step runs for a second against the fio null engine ("null",'
+      + ' the default) or a sparse file in the DUT log dir ("file").',
+      nargs='?',
+      choices=dryrun.MODES,
+      const=dryrun.NULL,
+      default=''
+  )
+  parser.add_argument(
+      '--engine',
+      help='fio IO engine of every step, overrides the engine of the playbook'
+      + ' and the configs. "auto" picks io_uring if the host supports it.',
+      choices=engine.ENGINES + (engine.AUTO,),
+      default=''
+  )
   return parser
@@ -7,7 +7,7 @@
 
 import unittest
 
-import argparser
+from . import argparser
 
 
 class ArgParserTest(unittest.TestCase):
@@ -27,5 +27,10 @@ class ArgParserTest(unittest.TestCase):
     args = self.parser.parse_args(['--playbook', 'fio_steps.json'])
     self.assertEqual(args.playbook, 'fio_steps.json')
 
+  def testParseParallelDUTs(self):
+    self.assertEqual(self.parser.parse_args([]).parallel_duts, 1)
+    args = self.parser.parse_args(['--parallel_duts', '8'])
+    self.assertEqual(args.parallel_duts, 8)
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,176 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Consecutive steps run by a single fio invocation.
+
+The jobs of every step are resolved, so that the [global] options of a step
+don't leak into the next one, and written one step after another into a
+single job file. The first job of every step is a stonewall starting a new
+reporting group, fio numbers the groups in the order of the file, so the
+groups of a step are known from its jobs and the output is split back into
+the output of every step by group.
+"""
+import bisect
+import dataclasses
+import gzip
+import itertools
+import json
+from typing import Optional
+
+from . import commonlib
+from . import fiojob
+from . import jsonstream
+from . import results
+
+# options starting a new reporting group, clones of numjobs never do
+_GROUP_OPTIONS = ("stonewall", "wait_for_previous", "new_group")
+
+
+def batchable(scenario) -> bool:
+  """Tells whether a step can run in a batch, a single fio run only."""
+  return not scenario.sweep and not scenario.compare_engines
+
+
+def plan(scenarios, start, size) -> list[list[int]]:
+  """Groups consecutive steps into batches.
+
+  Args:
+    scenarios: the steps of the playbook.
+    start: index of the first step to run, e.g. when resuming.
+    size: the most steps in a batch.
+  Returns:
+    The indexes of the steps of every batch, in order. A step that can't be
+    batched is a batch of its own, a step resetting the DUT starts a batch.
+  """
+  batches = []
+  for index in range(start, len(scenarios)):
+    scenario = scenarios[index]
+    if (batches and batchable(scenario) and not scenario.reset and
+        batchable(scenarios[batches[-1][0]]) and len(batches[-1]) < size):
+      batches[-1].append(index)
+    else:
+      batches.append([index])
+  return batches
+
+
+def option_dict(fio_options) -> dict:
+  """Converts --name=value fio options to job options."""
+  options = {}
+  for option in fio_options:
+    key, sep, value = option[2:].partition("=")
+    options[key] = value if sep else None
+  return options
+
+
+def step_jobs(sections, options) -> list[fiojob.Section]:
+  """Returns the jobs of a step ready to follow the ones of another step.
+
+  Args:
+    sections: sections of the step config.
+    options: options to set in every job.
+  Returns:
+    The jobs with all their options, the first one waits for the jobs of
+    the previous step and reports in a group of its own.
+  """
+  jobs = fiojob.jobs(sections)
+  for job in jobs:
+    job.options.update(options)
+  if jobs:
+    jobs[0].options.update({"stonewall": None, "new_group": None})
+  return jobs
+
+
+def group_count(jobs) -> int:
+  """Returns the number of reporting groups fio makes of a step."""
+  return 1 + sum(
+      1 for job in jobs[1:]
+      if any(fiojob.is_set(job, key) for key in _GROUP_OPTIONS))
+
+
+@dataclasses.dataclass
+class StepOutput:
+  """The part of the output of a batch belonging to a step.
+
+  Attributes:
+    jobs: results of every fio job of the step.
+    raw_path: file the jobs of the step were written to, in the format of
+      results.spill.
+    duration_sec: how long the step ran, None if fio doesn't report it.
+  """
+  jobs: list[results.JobResult]
+  raw_path: str
+  duration_sec: Optional[float] = None
+
+
+@dataclasses.dataclass
+class BatchedStep:
+  """A step of a batch once the batch ran.
+
+  Attributes:
+    step_result: results of the step.
+    log_prefix: prefix of the fio logs of the step, empty if not collected.
+    start: when the step started, seconds since the epoch.
+    end: when the step ended.
+  """
+  step_result: results.StepResult
+  log_prefix: str
+  start: float
+  end: float
+
+
+def _elapsed_sec(job) -> Optional[float]:
+  if "elapsed" in job:
+    return float(job["elapsed"])
+  if "job_runtime" in job:
+    return job["job_runtime"] / 1000
+  return None
+
+
+def split(path, group_counts, raw_paths) -> list[StepOutput]:
+  """Splits the output of a batch into the output of every step.
+
+  The jobs are read one at a time and written to the file of their step as
+  they come, the whole output is never held in memory.
+
+  Args:
+    path: file fio wrote with --output and --output-format=json+.
+    group_counts: number of reporting groups of every step, in order.
+    raw_paths: file to write the jobs of every step to.
+  Returns:
+    The output of every step.
+  Raises:
+    ValueError: the file is not a valid fio output.
+  """
+  first_groups = [0] + list(itertools.accumulate(group_counts))[:-1]
+  outputs = [StepOutput([], raw_path) for raw_path in raw_paths]
+  # the longest job of every group, the groups of a step run in turn
+  group_elapsed = {}
+  files = [gzip.open(raw_path, "wt", compresslevel=commonlib.COMPRESS_LEVEL)
+           for raw_path in raw_paths]
+  try:
+    for f in files:
+      f.write('{"jobs": [')
+    for job in jsonstream.iter_jobs(path):
+      groupid = job.get("groupid", 0)
+      index = max(0, bisect.bisect_right(first_groups, groupid) - 1)
+      if outputs[index].jobs:
+        files[index].write(", ")
+      json.dump(job, files[index])
+      outputs[index].jobs.append(results.JobResult.from_fio(job))
+      elapsed = _elapsed_sec(job)
+      if elapsed is not None:
+        group_elapsed[groupid] = max(elapsed, group_elapsed.get(groupid, 0))
+    for f in files:
+      f.write("]}")
+  finally:
+    for f in files:
+      f.close()
+  for index, output in enumerate(outputs):
+    groups = range(first_groups[index],
+                   first_groups[index] + group_counts[index])
+    if output.jobs and all(group in group_elapsed for group in groups):
+      output.duration_sec = sum(group_elapsed[group] for group in groups)
+  return outputs
@@ -0,0 +1,90 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json
+import os
+import tempfile
+import unittest
+
+from . import batch
+from . import fiojob
+from . import playbook
+from . import results
+
+_CONFIG = """
+[global]
+ioengine=libaio
+time_based
+runtime=60
+
+[read]
+rw=randread
+
+[write]
+stonewall
+rw=randwrite
+numjobs=2
+"""
+
+
+class BatchTest(unittest.TestCase):
+
+  def test_plan(self):
+    scenarios = playbook.parse_steps([
+        "a.fio", "b.fio", "c.fio",
+        {"config": "d.fio", "reset": "discard"}, "e.fio",
+        {"config": "f.fio", "sweep": {"iodepth": [1, 2]}}, "g.fio",
+    ])
+    self.assertEqual(batch.plan(scenarios, 0, 2),
+                     [[0, 1], [2], [3, 4], [5], [6]])
+    self.assertEqual(batch.plan(scenarios, 1, 8),
+                     [[1, 2], [3, 4], [5], [6]])
+
+  def test_option_dict(self):
+    self.assertEqual(
+        batch.option_dict(["--steadystate=iops:2%", "--time_based"]),
+        {"steadystate": "iops:2%", "time_based": None})
+
+  def test_step_jobs(self):
+    jobs = batch.step_jobs(fiojob.parse(_CONFIG), {"ioengine": "io_uring"})
+    self.assertEqual([job.name for job in jobs], ["read", "write"])
+    self.assertNotIn(fiojob.GLOBAL, [job.name for job in jobs])
+    # the global options are resolved, they can't leak into the next step
+    self.assertEqual(jobs[0].get("runtime"), "60")
+    self.assertEqual(jobs[1].get("ioengine"), "io_uring")
+    self.assertTrue(fiojob.is_set(jobs[0], "stonewall"))
+    self.assertTrue(fiojob.is_set(jobs[0], "new_group"))
+    self.assertEqual(batch.group_count(jobs), 2)
+    self.assertEqual(batch.group_count(batch.step_jobs(
+        fiojob.parse("[a]\n[b]\n"), {})), 1)
+
+  def test_split(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    path = os.path.join(tmpdir.name, "batch.json")
+    with open(path, "w") as f:
+      json.dump({"fio version": "fio-3.36", "jobs": [
+          {"jobname": "read", "groupid": 0, "elapsed": 10},
+          {"jobname": "write", "groupid": 1, "elapsed": 20},
+          {"jobname": "write", "groupid": 1, "elapsed": 21},
+          {"jobname": "read", "groupid": 2, "elapsed": 5, "error": 5},
+      ]}, f)
+    raw_paths = [os.path.join(tmpdir.name, "%d.json.gz" % index)
+                 for index in range(2)]
+    outputs = batch.split(path, [2, 1], raw_paths)
+    self.assertEqual([job.name for job in outputs[0].jobs],
+                     ["read", "write", "write"])
+    self.assertEqual(outputs[0].duration_sec, 31)
+    self.assertEqual(outputs[1].jobs[0].error, 5)
+    self.assertEqual(outputs[1].duration_sec, 5)
+    step_result = results.StepResult.from_fio(
+        "b", results.load_raw(raw_paths[1]))
+    self.assertEqual(step_result.jobs[0].error, 5)
+    self.assertEqual(len(results.load_raw(raw_paths[0])["jobs"]), 3)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,151 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Durable record of the playbook steps finished on a DUT.
+
+A step is identified by its position in the playbook and a fingerprint of its
+fio config and options, so an edited config is never taken as finished. The
+data units the DUT has written are recorded with every step: when they haven't
+changed since, the data pattern written by the playbook is still intact and
+the steps verifying it can be skipped as well.
+"""
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from . import fiojob
+
+FILENAME = "checkpoint.json"
+_VERSION = 1
+
+
+@dataclass
+class FinishedStep:
+  index: int
+  name: str
+  fingerprint: str
+  raw_path: str
+  log_prefix: str = ""
+  # nvme smart-log data_units_written once the step finished, if known
+  data_units_written: Optional[int] = None
+  # number of device regions the jobs were split into
+  shards: int = 1
+  # the points of a swept step, see sweep_point
+  sweep: list = field(default_factory=list)
+  finished: float = 0
+  # the endurance.Endurance of the step, if accounted
+  endurance: Optional[dict] = None
+
+
+def fingerprint(config_path, settings) -> str:
+  """Identifies a step by its fio config content and playbook settings."""
+  digest = hashlib.sha256()
+  with open(config_path, "rb") as f:
+    digest.update(f.read())
+  digest.update(json.dumps(settings, sort_keys=True).encode())
+  return digest.hexdigest()
+
+
+def sweep_point(point) -> dict:
+  """Returns what is needed to restore a point of a swept step."""
+  return {
+      "iodepth": point.iodepth,
+      "numjobs": point.numjobs,
+      "rate_iops": point.rate_iops,
+      "raw_path": point.raw_path,
+  }
+
+
+def writes_pattern(config_path) -> bool:
+  """Tells whether a step writes data that later steps verify."""
+  for job in fiojob.jobs(fiojob.read(config_path)):
+    directions = fiojob.RW_DIRECTIONS.get(job.get("rw", "read"), ())
+    if "write" in directions and job.get("verify", "0") not in ("0", "none"):
+      return True
+  return False
+
+
+class Checkpoint:
+  """Steps finished on a DUT, saved after every step.
+
+  The file is replaced atomically, a crash leaves either the previous or the
+  new checkpoint behind.
+  """
+
+  def __init__(self, path, playbook, steps=None):
+    self._path = path
+    self._playbook = playbook
+    self._steps = list(steps or [])
+
+  @classmethod
+  def load(cls, path, playbook):
+    """Reads the checkpoint, empty if missing or of another playbook."""
+    try:
+      with open(path) as f:
+        saved = json.load(f)
+    except (IOError, ValueError) as _:
+      return cls(path, playbook)
+    if saved.get("version") != _VERSION or saved.get("playbook") != playbook:
+      return cls(path, playbook)
+    return cls(path, playbook,
+               [FinishedStep(**step) for step in saved["steps"]])
+
+  @property
+  def steps(self) -> list[FinishedStep]:
+    return self._steps
+
+  def resume_index(self, fingerprints, pattern_writers,
+                   data_units_written) -> int:
+    """Returns the index of the first step to run.
+
+    Args:
+      fingerprints: fingerprint of every step of the playbook.
+      pattern_writers: whether every step writes a verified data pattern.
+      data_units_written: data units the DUT has written so far, if known.
+    Returns:
+      The number of leading steps that don't need to run again.
+    """
+    index = 0
+    for step, expected in zip(self._steps, fingerprints):
+      if (step.index != index or step.fingerprint != expected or
+          not os.path.exists(step.raw_path)):
+        break
+      index += 1
+    if not index:
+      return 0
+    last = self._steps[index - 1]
+    if (data_units_written is not None and
+        data_units_written == last.data_units_written):
+      return index
+    # the DUT was written since, the pattern has to be written again
+    writers = [i for i in range(index) if pattern_writers[i]]
+    return writers[-1] if writers else index
+
+  def truncate(self, index):
+    """Forgets the steps from index on, they are about to run again."""
+    del self._steps[index:]
+    self.save()
+
+  def record(self, step: FinishedStep):
+    step.finished = step.finished or time.time()
+    self._steps.append(step)
+    self.save()
+
+  def save(self):
+    saved = {
+        "version": _VERSION,
+        "playbook": self._playbook,
+        "steps": [asdict(step) for step in self._steps],
+    }
+    tmp_path = self._path + ".tmp"
+    with open(tmp_path, "w") as f:
+      json.dump(saved, f, indent=2)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_path, self._path)
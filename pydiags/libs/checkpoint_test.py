@@ -0,0 +1,85 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import tempfile
+import unittest
+
+from . import checkpoint
+
+
+class CheckpointTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmpdir.cleanup)
+    self._path = os.path.join(self._tmpdir.name, checkpoint.FILENAME)
+    self._raw_path = os.path.join(self._tmpdir.name, "0_wr.json.gz")
+    with open(self._raw_path, "w") as f:
+      f.write("{}")
+
+  def _finished(self, index, data_units_written=100):
+    return checkpoint.FinishedStep(index, "step%d" % index, "fp%d" % index,
+                                   self._raw_path, "", data_units_written)
+
+  def _record(self, *steps):
+    state = checkpoint.Checkpoint(self._path, "basic_io.json")
+    for step in steps:
+      state.record(step)
+    return checkpoint.Checkpoint.load(self._path, "basic_io.json")
+
+  def test_save_and_load(self):
+    state = self._record(self._finished(0), self._finished(1))
+    self.assertEqual([step.name for step in state.steps], ["step0", "step1"])
+    self.assertGreater(state.steps[0].finished, 0)
+    self.assertEqual(
+        checkpoint.Checkpoint.load(self._path, "iops_rd.json").steps, [])
+    self.assertEqual(checkpoint.Checkpoint.load(
+        os.path.join(self._tmpdir.name, "missing"), "basic_io.json").steps, [])
+
+  def test_resume_after_finished_steps(self):
+    state = self._record(self._finished(0), self._finished(1))
+    fingerprints = ["fp0", "fp1", "fp2"]
+    self.assertEqual(
+        state.resume_index(fingerprints, [True, False, False], 100), 2)
+    # the second config changed since
+    self.assertEqual(state.resume_index(
+        ["fp0", "changed", "fp2"], [True, False, False], 100), 1)
+
+  def test_pattern_rewritten_when_dut_was_written(self):
+    state = self._record(self._finished(0), self._finished(1))
+    fingerprints = ["fp0", "fp1", "fp2"]
+    for data_units_written in (200, None):
+      self.assertEqual(state.resume_index(
+          fingerprints, [True, False, False], data_units_written), 0)
+    # no step writes a pattern to verify
+    self.assertEqual(
+        state.resume_index(fingerprints, [False, False, False], 200), 2)
+
+  def test_missing_output_runs_again(self):
+    state = self._record(self._finished(0))
+    os.remove(self._raw_path)
+    self.assertEqual(state.resume_index(["fp0"], [False], 100), 0)
+
+  def test_truncate(self):
+    state = self._record(self._finished(0), self._finished(1))
+    state.truncate(1)
+    self.assertEqual(len(checkpoint.Checkpoint.load(
+        self._path, "basic_io.json").steps), 1)
+
+  def test_writes_pattern(self):
+    configs = os.path.join(os.path.dirname(__file__), "..", "configs")
+    self.assertTrue(checkpoint.writes_pattern(os.path.join(
+        configs, "basic_io_logical_seq_wr_8kb_bs_1024_qd_known_pattern.fio")))
+    self.assertFalse(checkpoint.writes_pattern(os.path.join(
+        configs, "basic_io_logical_seq_rd_8kb_bs_1024_qd_known_pattern.fio")))
+    self.assertFalse(checkpoint.writes_pattern(
+        os.path.join(configs, "iops_rand_wr_4kb_bs_256_qd.fio")))
+
+
+if __name__ == "__main__":
+  unittest.main()
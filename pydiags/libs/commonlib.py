@@ -5,23 +5,111 @@
 # https://opensource.org/licenses/MIT.
 
 """A module is a collection of functions used across the tool."""
+import gzip
+import os
+import shutil
 import subprocess
+import threading
+from typing import Iterator, Optional
 
+# gzip level of the fio outputs and logs kept, shared by all the libs
+COMPRESS_LEVEL = 6
 
-def cmdexec(cmdline: list[str]) -> str:
+
+def cmdexec(cmdline: list[str], timeout: Optional[float] = None) -> str:
   """Executes the command line and returns stdout only.
 
   Args:
     cmdline: to be executed.
+    timeout: seconds after which the command is killed, no limit by default.
   Returns:
     The output on stdout emitted by the command executed.
   Raises:
     IOError: An error occurred executing this cmdline.
+    subprocess.TimeoutExpired: the command didn't finish in time.
   """
   try:
     result = subprocess.run(cmdline, stdout=subprocess.PIPE,
-                            text=True, check=True)
+                            text=True, check=True, timeout=timeout)
   except subprocess.CalledProcessError as e:
     print('Exception Running command "%s":%s', cmdline, e)
     raise
   return result.stdout
+
+
+def cmdstream(cmdline: list[str]) -> Iterator[str]:
+  """Executes the command line and yields stdout line by line as it comes.
+
+  Args:
+    cmdline: to be executed.
+  Yields:
+    The lines emitted on stdout by the command executed.
+  Raises:
+    IOError: An error occurred executing this cmdline.
+  """
+  with subprocess.Popen(cmdline, stdout=subprocess.PIPE, text=True) as proc:
+    try:
+      yield from proc.stdout
+    except GeneratorExit:
+      # the caller is no longer interested in the output
+      proc.kill()
+      raise
+  if proc.returncode:
+    e = subprocess.CalledProcessError(proc.returncode, cmdline)
+    print('Exception Running command "%s":%s' % (cmdline, e))
+    raise e
+
+
+def cmdexec_to_file(cmdline: list[str], path: str,
+                    timeout: Optional[float] = None) -> None:
+  """Executes the command line and streams stdout to a gzip file.
+
+  The output is never held in memory, so this suits large outputs.
+
+  Args:
+    cmdline: to be executed.
+    path: gzip file receiving the output.
+    timeout: seconds after which the command is killed, no limit by default.
+  Raises:
+    IOError: An error occurred executing this cmdline.
+    subprocess.TimeoutExpired: the command didn't finish in time.
+  """
+  timed_out = threading.Event()
+  with subprocess.Popen(cmdline, stdout=subprocess.PIPE) as proc:
+
+    def kill():
+      timed_out.set()
+      proc.kill()
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+      timer.start()
+    try:
+      with gzip.open(path, "wb", compresslevel=COMPRESS_LEVEL) as f:
+        shutil.copyfileobj(proc.stdout, f)
+    finally:
+      if timer:
+        timer.cancel()
+  if timed_out.is_set():
+    raise subprocess.TimeoutExpired(cmdline, timeout)
+  if proc.returncode:
+    e = subprocess.CalledProcessError(proc.returncode, cmdline)
+    print('Exception Running command "%s":%s' % (cmdline, e))
+    raise e
+
+
+def compress_file(path: str, compresslevel: int = COMPRESS_LEVEL) -> str:
+  """Compresses a file with gzip.
+
+  Args:
+    path: file to compress, removed once compressed.
+    compresslevel: gzip compression level.
+  Returns:
+    The path of the compressed file.
+  """
+  compressed_path = path + ".gz"
+  with open(path, "rb") as f, gzip.open(
+      compressed_path, "wb", compresslevel=compresslevel) as gz:
+    shutil.copyfileobj(f, gz)
+  os.remove(path)
+  return compressed_path
@@ -0,0 +1,122 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Dry runs of a playbook without any NVMe device.
+
+The DUTs are simulated: the driver returns canned identity and logs, and
+every step config runs against the fio null engine or a sparse file in the
+log dir of the DUT instead of the device. Every step is cut to a second, so
+playbooks, targets and the harness itself can be exercised on any Linux box.
+"""
+import dataclasses
+import gzip
+import json
+import os
+import time
+
+from . import endurance
+from . import generic
+from . import operations
+
+NULL = "null"
+FILE = "file"
+MODES = (NULL, FILE)
+# size of a simulated DUT, the sparse file of a DUT never takes more
+CAPACITY_BYTES = 1 << 30
+_RUNTIME_SEC = 1
+_BACKING_FILE = "dut.img"
+IDENTITY = {"serial": "DRYRUN", "model": "Simulated DUT", "firmware": "0.0"}
+# nvme-cli output of a healthy idle drive, temperatures in Kelvin
+_CANNED_LOGS = {
+    "smart-log": {
+        "critical_warning": 0,
+        "temperature": 308,
+        "avail_spare": 100,
+        "percent_used": 0,
+        "data_units_read": 0,
+        "data_units_written": 0,
+        "media_errors": 0,
+        "num_err_log_entries": 0,
+        "warning_temp_time": 0,
+        "critical_comp_time": 0,
+        "thm_temp1_trans_count": 0,
+        "thm_temp2_trans_count": 0,
+        "thm_temp1_total_time": 0,
+        "thm_temp2_total_time": 0,
+    },
+    "error-log": {"errors": []},
+    "persistent-event-log": {"persistent_event_log_events": []},
+}
+
+
+class SimulatedDUTOperations(generic.GenericDUTOperations):
+  """Driver of a simulated DUT, no nvme command is run."""
+
+  def IdentifyDUT(self) -> bool:
+    self._identity = dict(IDENTITY)
+    return True
+
+  def ResetDUT(self, method) -> bool:
+    """Empties the sparse file of the DUT, if any, for every method."""
+    path = os.path.join(self._logs_dir, _BACKING_FILE)
+    if os.path.exists(path):
+      os.truncate(path, 0)
+      os.truncate(path, CAPACITY_BYTES)
+    return True
+
+  def WriteCounters(self) -> endurance.Counters:
+    """A simulated DUT doesn't count its writes."""
+    return endurance.Counters()
+
+  def LogCollect(self) -> list[operations.CollectedLog]:
+    """Writes the canned logs of a healthy drive.
+
+    Returns:
+      The manifest of the logs, same as the generic driver.
+    """
+    manifest = []
+    for name, log in _CANNED_LOGS.items():
+      start = time.monotonic()
+      path = os.path.join(self._logs_dir, name + ".gz")
+      with gzip.open(path, "wt") as f:
+        json.dump(log, f)
+      manifest.append(operations.CollectedLog(
+          name, "dry run", path, os.path.getsize(path),
+          time.monotonic() - start))
+    with open(os.path.join(self._logs_dir, "manifest.json"), "w") as f:
+      json.dump([dataclasses.asdict(log) for log in manifest], f, indent=2)
+    return manifest
+
+
+def backing_file(logs_dir) -> str:
+  """Returns the sparse file standing for a DUT, created if missing."""
+  path = os.path.join(logs_dir, _BACKING_FILE)
+  if not os.path.exists(path):
+    with open(path, "wb") as f:
+      f.truncate(CAPACITY_BYTES)
+  return path
+
+
+def job_options(mode, logs_dir, step_options) -> dict:
+  """Returns the job options running a step config without the DUT.
+
+  Args:
+    mode: one of MODES.
+    logs_dir: log dir of the DUT, the sparse file of the file mode is in it.
+    step_options: options the step sets in its jobs, e.g. the engine. They
+      are overridden, except the size of a sharded step.
+  Returns:
+    The options to set in the jobs, see fiojob.write_with.
+  """
+  options = dict(step_options)
+  options.setdefault("size", str(CAPACITY_BYTES))
+  options.update({"runtime": str(_RUNTIME_SEC), "ramp_time": "0"})
+  if mode == NULL:
+    # nothing is stored, the verification can only be pretended
+    options.update({"ioengine": "null", "verify": "null"})
+  else:
+    options.update({"filename": backing_file(logs_dir), "direct": "0"})
+  return options
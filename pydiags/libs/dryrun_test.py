@@ -0,0 +1,67 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from . import dryrun
+from . import health
+
+
+class DryRunTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    logs_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(logs_dir.cleanup)
+    self.logs_dir = logs_dir.name
+
+  def test_simulated_driver(self):
+    driver = dryrun.SimulatedDUTOperations("/dev/sim0", self.logs_dir, None)
+    self.assertTrue(driver.IdentifyDUT())
+    self.assertEqual(driver.identity["serial"], "DRYRUN")
+    manifest = driver.LogCollect()
+    self.assertEqual([log.name for log in manifest],
+                     ["smart-log", "error-log", "persistent-event-log"])
+    with gzip.open(manifest[0].path, "rt") as f:
+      sample = health.parse_smart_log(json.load(f))
+    self.assertEqual(sample["temperature"], 35)
+    self.assertTrue(os.path.exists(
+        os.path.join(self.logs_dir, "manifest.json")))
+
+  def test_null_job_options(self):
+    options = dryrun.job_options(dryrun.NULL, self.logs_dir,
+                                 {"ioengine": "io_uring", "fixedbufs": None})
+    self.assertEqual(options["ioengine"], "null")
+    self.assertEqual(options["size"], str(dryrun.CAPACITY_BYTES))
+    self.assertIn("fixedbufs", options)
+    self.assertFalse(os.listdir(self.logs_dir))
+
+  def test_file_job_options(self):
+    options = dryrun.job_options(dryrun.FILE, self.logs_dir,
+                                 {"numjobs": "4", "size": "1048576"})
+    # a sharded step keeps the size of its regions
+    self.assertEqual(options["size"], "1048576")
+    stat = os.stat(options["filename"])
+    self.assertEqual(stat.st_size, dryrun.CAPACITY_BYTES)
+    self.assertLess(stat.st_blocks * 512, dryrun.CAPACITY_BYTES)
+
+  def test_reset_empties_backing_file(self):
+    path = dryrun.backing_file(self.logs_dir)
+    with open(path, "r+b") as f:
+      f.write(b"data")
+    driver = dryrun.SimulatedDUTOperations("/dev/sim0", self.logs_dir, None)
+    self.assertTrue(driver.ResetDUT("discard"))
+    with open(path, "rb") as f:
+      self.assertEqual(f.read(4), bytes(4))
+    self.assertEqual(os.path.getsize(path), dryrun.CAPACITY_BYTES)
+
+
+if __name__ == "__main__":
+  unittest.main()
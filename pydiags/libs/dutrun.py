@@ -0,0 +1,85 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""OCP test runs of the DUTs, kept whole while DUTs are tested at once.
+
+Every DUT reports in a test run of its own. While several DUTs are tested at
+the same time the artifacts of every DUT are spooled to a file in its log dir
+and written out once its worker is done, so that the runStart...runEnd block
+of a DUT never interleaves with the artifacts of another DUT.
+"""
+import contextlib
+import os
+import threading
+
+import ocptv.output as tv
+from ocptv.output.config import get_config
+
+SPOOL_FILENAME = "ocp_output.jsonl"
+# the spooled blocks are written out one at a time
+_write_lock = threading.Lock()
+
+
+class DUTWriter(tv.Writer):
+  """Writes the artifacts of a DUT, spooled while other DUTs are tested.
+
+  Attributes:
+    writer: writer the artifacts end up in, the one configured for ocptv.
+    spool_path: file holding the artifacts back.
+  """
+
+  def __init__(self, writer, spool_path):
+    self.writer = writer
+    self.spool_path = spool_path
+    self._lock = threading.Lock()
+    self._spool = None
+
+  @contextlib.contextmanager
+  def spooled(self):
+    """Holds the artifacts back until the end of the block."""
+    with self._lock:
+      self._spool = open(self.spool_path, "w+")
+    try:
+      yield
+    finally:
+      with self._lock:
+        spool, self._spool = self._spool, None
+      spool.seek(0)
+      with _write_lock:
+        for line in spool:
+          self.writer.write(line.rstrip("\n"))
+      spool.close()
+      os.remove(self.spool_path)
+
+  def write(self, buffer: str):
+    with self._lock:
+      if self._spool is not None:
+        # an artifact is a single line of JSON
+        self._spool.write(buffer + "\n")
+        return
+    with _write_lock:
+      self.writer.write(buffer)
+
+
+def create_run(name, version, logs_dir) -> tuple[tv.TestRun, DUTWriter]:
+  """Creates the test run of a DUT.
+
+  Args:
+    name: name of the diag.
+    version: version of the diag.
+    logs_dir: log dir of the DUT, where its artifacts are spooled.
+  Returns:
+    The test run and the writer of its artifacts.
+  """
+  config = get_config()
+  writer = DUTWriter(config.writer, os.path.join(logs_dir, SPOOL_FILENAME))
+  # a test run takes the writer configured when it's created
+  previous = config.writer
+  tv.config(writer=writer)
+  try:
+    return tv.TestRun(name=name, version=version), writer
+  finally:
+    tv.config(writer=previous)
@@ -0,0 +1,79 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json
+import os
+import tempfile
+import unittest
+
+import ocptv.output as tv
+from ocptv.output.config import get_config
+
+from . import dutrun
+
+
+class _ListWriter(tv.Writer):
+
+  def __init__(self):
+    self.buffers = []
+
+  def write(self, buffer):
+    self.buffers.append(buffer)
+
+
+class DUTWriterTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmpdir.cleanup)
+    self._output = _ListWriter()
+    self._writer = dutrun.DUTWriter(
+        self._output, os.path.join(self._tmpdir.name, dutrun.SPOOL_FILENAME))
+
+  def test_write_through(self):
+    self._writer.write('{"a": 1}')
+    self.assertEqual(self._output.buffers, ['{"a": 1}'])
+
+  def test_spooled(self):
+    with self._writer.spooled():
+      self._writer.write('{"a": 1}')
+      self._writer.write('{"b": 2}')
+      self.assertEqual(self._output.buffers, [])
+    self.assertEqual(self._output.buffers, ['{"a": 1}', '{"b": 2}'])
+    self.assertFalse(os.path.exists(self._writer.spool_path))
+    self._writer.write('{"c": 3}')
+    self.assertEqual(self._output.buffers[-1], '{"c": 3}')
+
+  def test_spooled_written_out_on_error(self):
+    with self.assertRaises(ValueError):
+      with self._writer.spooled():
+        self._writer.write('{"a": 1}')
+        raise ValueError()
+    self.assertEqual(self._output.buffers, ['{"a": 1}'])
+
+
+class CreateRunTest(unittest.TestCase):
+
+  def test_create_run(self):
+    output = _ListWriter()
+    self.addCleanup(tv.config, writer=get_config().writer)
+    tv.config(writer=output)
+    with tempfile.TemporaryDirectory() as tmpdir:
+      ocp_run, writer = dutrun.create_run("Diag", "1.0", tmpdir)
+      self.assertIs(get_config().writer, output)
+      self.assertIs(writer.writer, output)
+      with writer.spooled():
+        with ocp_run.scope(dut=tv.Dut(id="host", name="/dev/nvme0n1")):
+          pass
+        self.assertEqual(output.buffers, [])
+    artifacts = [json.loads(buffer) for buffer in output.buffers]
+    self.assertIn("schemaVersion", artifacts[0])
+    self.assertIn("testRunEnd", artifacts[-1]["testRunArtifact"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,116 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Write amplification of the steps, from the write counters of the DUT.
+
+The host bytes of a step are the bytes fio wrote. The DUT counts the host
+writes it received in nvme smart-log data_units_written and, if it exposes
+them, the bytes it wrote to NAND, e.g. in the Physical Media Units Written of
+the OCP SMART extended log. Both are read before and after the step, the
+write amplification factor (WAF) is the NAND bytes written per byte the DUT
+received over the step.
+"""
+import dataclasses
+import re
+from typing import Optional
+
+# a data unit of smart-log is a thousand 512-byte blocks
+DATA_UNIT_BYTES = 512 * 1000
+_PHYSICAL_MEDIA_UNITS_WRITTEN = "physical_media_units_written"
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+@dataclasses.dataclass
+class Counters:
+  """Lifetime write counters of a DUT, None if unknown."""
+  data_units_written: Optional[int] = None
+  nand_bytes_written: Optional[int] = None
+
+
+@dataclasses.dataclass
+class Endurance:
+  """What the writes of a step cost the DUT.
+
+  Attributes:
+    host_bytes: bytes fio wrote.
+    device_bytes: bytes the DUT received, None if unknown. Counted in data
+      units, so up to DATA_UNIT_BYTES off.
+    nand_bytes: bytes the DUT wrote to NAND, None if unknown.
+  """
+  host_bytes: int
+  device_bytes: Optional[int] = None
+  nand_bytes: Optional[int] = None
+
+  @property
+  def waf(self) -> Optional[float]:
+    """NAND bytes per byte received, None if unknown or nothing written.
+
+    The bytes fio wrote stand for the bytes received when the DUT doesn't
+    count them.
+    """
+    received = self.device_bytes
+    if received is None:
+      received = self.host_bytes
+    if self.nand_bytes is None or not received:
+      return None
+    return self.nand_bytes / received
+
+
+def _delta(before, after) -> Optional[int]:
+  if before is None or after is None:
+    return None
+  return after - before
+
+
+def step_endurance(step_result, before, after) -> Endurance:
+  """Accounts the writes of a step.
+
+  Args:
+    step_result: results of the step.
+    before: counters of the DUT before the step.
+    after: counters of the DUT after the step.
+  Returns:
+    The host, device and NAND bytes written during the step.
+  """
+  host_bytes = sum(
+      job.io_stats["write"].io_bytes for job in step_result.jobs
+      if "write" in job.io_stats)
+  data_units = _delta(before.data_units_written, after.data_units_written)
+  return Endurance(
+      host_bytes,
+      None if data_units is None else data_units * DATA_UNIT_BYTES,
+      _delta(before.nand_bytes_written, after.nand_bytes_written))
+
+
+def parse_ocp_smart_log(smart_log) -> Optional[int]:
+  """Returns the Physical Media Units Written of the OCP SMART extended log.
+
+  nvme-cli reports the 128-bit counter either whole or as its high and low
+  64 bits, under names that changed between versions.
+
+  Args:
+    smart_log: nvme ocp smart-add-log output parsed.
+  Returns:
+    The bytes written to NAND, None if the log doesn't have them.
+  """
+  if not isinstance(smart_log, dict):
+    return None
+  halves = {}
+  for key, value in smart_log.items():
+    name = _NON_ALNUM.sub("_", key.lower()).strip("_")
+    if not name.startswith(_PHYSICAL_MEDIA_UNITS_WRITTEN):
+      continue
+    part = name[len(_PHYSICAL_MEDIA_UNITS_WRITTEN):].strip("_")
+    if isinstance(value, dict):
+      halves.update((half, value[half]) for half in ("hi", "lo")
+                    if half in value)
+    elif part in ("hi", "lo"):
+      halves[part] = value
+    elif not part:
+      return int(value)
+  if "lo" not in halves:
+    return None
+  return (int(halves.get("hi", 0)) << 64) | int(halves["lo"])
@@ -0,0 +1,60 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import unittest
+
+from . import endurance
+from . import results
+
+
+def _step_result(write_bytes):
+  return results.StepResult.from_fio("step", {"jobs": [
+      {"jobname": "job", "read": {"io_bytes": 1 << 30},
+       "write": {"io_bytes": write_bytes}},
+      {"jobname": "reader", "read": {"io_bytes": 1 << 30}},
+  ]})
+
+
+class EnduranceTest(unittest.TestCase):
+
+  def test_step_endurance(self):
+    units = 2000
+    step_endurance = endurance.step_endurance(
+        _step_result(units * endurance.DATA_UNIT_BYTES),
+        endurance.Counters(1000, 5 << 40),
+        endurance.Counters(1000 + units,
+                           (5 << 40) + 3 * units * endurance.DATA_UNIT_BYTES))
+    self.assertEqual(step_endurance.host_bytes,
+                     units * endurance.DATA_UNIT_BYTES)
+    self.assertEqual(step_endurance.device_bytes,
+                     units * endurance.DATA_UNIT_BYTES)
+    self.assertAlmostEqual(step_endurance.waf, 3)
+
+  def test_waf_without_counters(self):
+    step_endurance = endurance.step_endurance(
+        _step_result(100), endurance.Counters(), endurance.Counters())
+    self.assertIsNone(step_endurance.device_bytes)
+    self.assertIsNone(step_endurance.waf)
+    # the bytes fio wrote stand for the bytes the DUT received
+    step_endurance.nand_bytes = 150
+    self.assertAlmostEqual(step_endurance.waf, 1.5)
+    step_endurance.host_bytes = 0
+    self.assertIsNone(step_endurance.waf)
+
+  def test_parse_ocp_smart_log(self):
+    self.assertEqual(endurance.parse_ocp_smart_log(
+        {"Physical media units written - hi": 1,
+         "Physical media units written - lo": 5}), (1 << 64) + 5)
+    self.assertEqual(endurance.parse_ocp_smart_log(
+        {"physical_media_units_written": {"hi": 0, "lo": 7}}), 7)
+    self.assertEqual(endurance.parse_ocp_smart_log(
+        {"Physical Media Units Written": 9}), 9)
+    self.assertIsNone(endurance.parse_ocp_smart_log({"Bad user NAND": 0}))
+    self.assertIsNone(endurance.parse_ocp_smart_log([]))
+
+
+if __name__ == "__main__":
+  unittest.main()
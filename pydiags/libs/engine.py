@@ -0,0 +1,82 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""fio IO engines the steps can run with, and io_uring detection."""
+import functools
+import subprocess
+
+LIBAIO = "libaio"
+IO_URING = "io_uring"
+IO_URING_SQPOLL = "io_uring_sqpoll"
+# io_uring if the host supports it, libaio otherwise
+AUTO = "auto"
+ENGINES = (LIBAIO, IO_URING, IO_URING_SQPOLL)
+# job options of every engine, io_uring registers the buffers and the files
+# once instead of mapping them for every IO
+_JOB_OPTIONS = {
+    LIBAIO: {"ioengine": "libaio"},
+    IO_URING: {"ioengine": "io_uring", "fixedbufs": None,
+               "registerfiles": None},
+    # a kernel thread polls the submission queue, at the cost of a CPU
+    IO_URING_SQPOLL: {"ioengine": "io_uring", "fixedbufs": None,
+                      "registerfiles": None, "sqthread_poll": "1"},
+}
+_IO_URING_DISABLED = "/proc/sys/kernel/io_uring_disabled"
+_ENGINE_HELP_TIMEOUT_SEC = 10
+
+
+@functools.lru_cache(maxsize=None)
+def io_uring_supported(fio_path) -> bool:
+  """Tells whether both the kernel and fio support io_uring.
+
+  Args:
+    fio_path: fio binary.
+  Returns:
+    True if io_uring can be used, checked once per fio binary.
+  """
+  try:
+    with open(_IO_URING_DISABLED) as f:
+      if int(f.read()) != 0:
+        return False
+  except (IOError, ValueError) as _:
+    # kernels without the switch don't restrict io_uring
+    pass
+  try:
+    engines = subprocess.run([fio_path, "--enghelp"], capture_output=True,
+                             text=True, check=True,
+                             timeout=_ENGINE_HELP_TIMEOUT_SEC).stdout
+  except (IOError, subprocess.SubprocessError) as _:
+    return False
+  return IO_URING in engines.split()
+
+
+def validate(name):
+  """Checks an engine name without asking fio what the host supports.
+
+  Raises:
+    ValueError: the engine is unknown.
+  """
+  if name != AUTO and name not in ENGINES:
+    raise ValueError("unsupported engine: %s" % name)
+
+
+def resolve(name, fio_path) -> str:
+  """Returns the engine to run, io_uring or libaio for auto.
+
+  Raises:
+    ValueError: the engine is unknown or io_uring is not supported here.
+  """
+  validate(name)
+  if name == AUTO:
+    return IO_URING if io_uring_supported(fio_path) else LIBAIO
+  if name != LIBAIO and not io_uring_supported(fio_path):
+    raise ValueError("%s is not supported on this host" % name)
+  return name
+
+
+def job_options(name) -> dict:
+  """Returns the job options selecting an engine, see fiojob.write_with."""
+  return dict(_JOB_OPTIONS[name])
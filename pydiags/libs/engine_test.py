@@ -0,0 +1,75 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import unittest
+from unittest import mock
+
+from . import engine
+
+
+def _enghelp(engines):
+  return mock.Mock(stdout="Available IO engines:\n\t%s\n" % "\n\t".join(
+      engines))
+
+
+class EngineTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    engine.io_uring_supported.cache_clear()
+    self.addCleanup(engine.io_uring_supported.cache_clear)
+
+  def test_io_uring_supported(self):
+    with mock.patch.object(engine.subprocess, "run",
+                           return_value=_enghelp(["libaio", "io_uring"])):
+      self.assertTrue(engine.io_uring_supported("fio"))
+    engine.io_uring_supported.cache_clear()
+    with mock.patch.object(engine.subprocess, "run",
+                           return_value=_enghelp(["libaio", "io_uring_cmd"])):
+      self.assertFalse(engine.io_uring_supported("fio"))
+    engine.io_uring_supported.cache_clear()
+    with mock.patch.object(engine.subprocess, "run",
+                           side_effect=FileNotFoundError("fio")):
+      self.assertFalse(engine.io_uring_supported("fio"))
+
+  def test_io_uring_disabled_by_kernel(self):
+    with mock.patch("builtins.open", mock.mock_open(read_data="2\n")), \
+         mock.patch.object(engine.subprocess, "run") as run:
+      self.assertFalse(engine.io_uring_supported("fio"))
+    run.assert_not_called()
+
+  def test_resolve(self):
+    with mock.patch.object(engine, "io_uring_supported", return_value=True):
+      self.assertEqual(engine.resolve(engine.AUTO, "fio"), engine.IO_URING)
+      self.assertEqual(engine.resolve(engine.IO_URING_SQPOLL, "fio"),
+                       engine.IO_URING_SQPOLL)
+    with mock.patch.object(engine, "io_uring_supported", return_value=False):
+      self.assertEqual(engine.resolve(engine.AUTO, "fio"), engine.LIBAIO)
+      self.assertEqual(engine.resolve(engine.LIBAIO, "fio"), engine.LIBAIO)
+      with self.assertRaisesRegex(ValueError, "not supported"):
+        engine.resolve(engine.IO_URING, "fio")
+    with self.assertRaisesRegex(ValueError, "unsupported engine"):
+      engine.resolve("sync", "fio")
+
+  def test_validate(self):
+    with mock.patch.object(engine, "io_uring_supported") as supported:
+      engine.validate(engine.AUTO)
+      engine.validate(engine.IO_URING_SQPOLL)
+      with self.assertRaisesRegex(ValueError, "unsupported engine"):
+        engine.validate("sync")
+    supported.assert_not_called()
+
+  def test_job_options(self):
+    options = engine.job_options(engine.IO_URING_SQPOLL)
+    self.assertEqual(options["ioengine"], "io_uring")
+    self.assertEqual(options["sqthread_poll"], "1")
+    options["ioengine"] = "libaio"
+    self.assertEqual(engine.job_options(engine.IO_URING_SQPOLL)["ioengine"],
+                     "io_uring")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,184 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Reading of fio job files, the subset of the format the configs use.
+
+Options of the [global] section apply to the jobs that follow it, options
+given on the fio command line apply to all the jobs unless a job overrides
+them.
+"""
+import re
+from typing import Optional
+
+GLOBAL = "global"
+_SECTION = re.compile(r"^\[(?P<name>[^\]]+)\]$")
+_SIZE = re.compile(r"^(?P<number>\d+(\.\d+)?)\s*(?P<unit>[kmgtp]?)i?b?$")
+_TIME = re.compile(r"^(?P<number>\d+(\.\d+)?)\s*(?P<unit>us|ms|s|m|h|d)?$")
+_SIZE_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30,
+               "t": 1 << 40, "p": 1 << 50}
+_TIME_UNITS = {"us": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600,
+               "d": 86400}
+# data directions of every rw mode
+RW_DIRECTIONS = {
+    "read": {"read"},
+    "randread": {"read"},
+    "write": {"write"},
+    "randwrite": {"write"},
+    "rw": {"read", "write"},
+    "readwrite": {"read", "write"},
+    "randrw": {"read", "write"},
+    "trim": {"trim"},
+    "randtrim": {"trim"},
+    "trimwrite": {"trim", "write"},
+    "randtrimwrite": {"trim", "write"},
+}
+
+
+class Section:
+  """A section of a job file, options keep the order of the file.
+
+  Options without a value, e.g. time_based, map to None.
+  """
+
+  def __init__(self, name, options=None):
+    self.name = name
+    self.options = dict(options or {})
+
+  def get(self, key, default=None):
+    return self.options.get(key, default)
+
+  def __eq__(self, other):
+    return (isinstance(other, Section) and self.name == other.name and
+            self.options == other.options)
+
+  def __repr__(self):
+    return "Section(%r, %r)" % (self.name, self.options)
+
+
+def parse(text) -> list[Section]:
+  """Parses a job file.
+
+  Args:
+    text: content of the job file.
+  Returns:
+    The sections of the file in order, including [global] ones.
+  Raises:
+    ValueError: an option is outside of any section.
+  """
+  sections = []
+  for number, line in enumerate(text.splitlines(), 1):
+    line = line.strip()
+    if not line or line[0] in "#;":
+      continue
+    match = _SECTION.match(line)
+    if match:
+      sections.append(Section(match.group("name").strip()))
+      continue
+    if not sections:
+      raise ValueError("line %d: option outside of a section: %s" % (
+          number, line))
+    key, sep, value = line.partition("=")
+    sections[-1].options[key.strip()] = value.strip() if sep else None
+  return sections
+
+
+def read(path) -> list[Section]:
+  with open(path) as f:
+    return parse(f.read())
+
+
+def dumps(sections) -> str:
+  """Writes sections back in the job file format."""
+  lines = []
+  for section in sections:
+    lines.append("[%s]" % section.name)
+    for key, value in section.options.items():
+      lines.append(key if value is None else "%s=%s" % (key, value))
+    lines.append("")
+  return "\n".join(lines)
+
+
+def write_with(config_path, path, options) -> str:
+  """Writes a copy of a job file with options set in every job.
+
+  Options given on the command line don't override the ones of the job file,
+  so the options that have to win are set in the job sections themselves.
+
+  Args:
+    config_path: job file to copy.
+    path: file to write the copy to.
+    options: options to set, None for options without a value.
+  Returns:
+    The path of the copy.
+  """
+  sections = read(config_path)
+  for section in sections:
+    if section.name != GLOBAL:
+      section.options.update(options)
+  with open(path, "w") as f:
+    f.write(dumps(sections))
+  return path
+
+
+def jobs(sections, defaults=None) -> list[Section]:
+  """Resolves the options of every job.
+
+  Args:
+    sections: sections of a job file.
+    defaults: options given on the command line.
+  Returns:
+    The jobs with the options inherited from the command line and the
+    preceding [global] sections.
+  """
+  inherited = dict(defaults or {})
+  resolved = []
+  for section in sections:
+    if section.name == GLOBAL:
+      inherited.update(section.options)
+      continue
+    resolved.append(Section(section.name, {**inherited, **section.options}))
+  return resolved
+
+
+def parse_size(value, capacity=None) -> Optional[int]:
+  """Converts a fio size, e.g. 4k, 10g or 50%, to bytes.
+
+  Args:
+    value: fio size option value.
+    capacity: size of the device, needed for percentages.
+  Returns:
+    The size in bytes, None for a percentage of an unknown capacity.
+  Raises:
+    ValueError: the value is not a size.
+  """
+  value = value.strip().lower()
+  if value.endswith("%"):
+    if capacity is None:
+      return None
+    return int(capacity * float(value[:-1]) / 100)
+  match = _SIZE.match(value)
+  if not match:
+    raise ValueError("invalid size: %s" % value)
+  return int(float(match.group("number")) * _SIZE_UNITS[match.group("unit")])
+
+
+def parse_time(value) -> float:
+  """Converts a fio time, seconds unless it has a unit, to seconds.
+
+  Raises:
+    ValueError: the value is not a time.
+  """
+  match = _TIME.match(value.strip().lower())
+  if not match:
+    raise ValueError("invalid time: %s" % value)
+  return float(match.group("number")) * _TIME_UNITS[match.group("unit") or "s"]
+
+
+def is_set(job, key) -> bool:
+  """Tells whether a boolean option, e.g. time_based, is on."""
+  if key not in job.options:
+    return False
+  return job.options[key] in (None, "1", "true")
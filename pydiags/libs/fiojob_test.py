@@ -0,0 +1,72 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import unittest
+
+from . import fiojob
+
+_JOB_FILE = """
+# comment
+[global]
+ioengine=libaio
+iodepth=32
+
+[seq_wr]
+rw=write
+time_based
+runtime=2m
+
+; another comment
+[rand_rd]
+rw=randread
+iodepth=256
+"""
+
+
+class FioJobTest(unittest.TestCase):
+
+  def test_parse_and_dumps(self):
+    sections = fiojob.parse(_JOB_FILE)
+    self.assertEqual([s.name for s in sections],
+                     ["global", "seq_wr", "rand_rd"])
+    self.assertIsNone(sections[1].get("time_based"))
+    self.assertIn("time_based", sections[1].options)
+    self.assertEqual(fiojob.parse(fiojob.dumps(sections)), sections)
+
+  def test_option_outside_section(self):
+    with self.assertRaises(ValueError):
+      fiojob.parse("rw=read\n[job]\n")
+
+  def test_jobs_inherit_global_and_defaults(self):
+    jobs = fiojob.jobs(fiojob.parse(_JOB_FILE), {"ioengine": "io_uring",
+                                                 "direct": "1"})
+    self.assertEqual([job.name for job in jobs], ["seq_wr", "rand_rd"])
+    self.assertEqual(jobs[0].get("ioengine"), "libaio")
+    self.assertEqual(jobs[0].get("direct"), "1")
+    self.assertEqual(jobs[0].get("iodepth"), "32")
+    self.assertEqual(jobs[1].get("iodepth"), "256")
+    self.assertTrue(fiojob.is_set(jobs[0], "time_based"))
+    self.assertFalse(fiojob.is_set(jobs[1], "time_based"))
+
+  def test_parse_size(self):
+    self.assertEqual(fiojob.parse_size("4k"), 4096)
+    self.assertEqual(fiojob.parse_size("10G"), 10 << 30)
+    self.assertEqual(fiojob.parse_size("1MiB"), 1 << 20)
+    self.assertEqual(fiojob.parse_size("50%", capacity=1000), 500)
+    self.assertIsNone(fiojob.parse_size("50%"))
+    with self.assertRaises(ValueError):
+      fiojob.parse_size("big")
+
+  def test_parse_time(self):
+    self.assertEqual(fiojob.parse_time("120"), 120)
+    self.assertEqual(fiojob.parse_time("2m"), 120)
+    self.assertEqual(fiojob.parse_time("500ms"), 0.5)
+    with self.assertRaises(ValueError):
+      fiojob.parse_time("soon")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -5,22 +5,55 @@
 # https://opensource.org/licenses/MIT.
 
 """Implementation of generic operations supported by any vendor."""
+import concurrent.futures
+import dataclasses
+import json
 import os
 import subprocess
+import threading
+import time
+from typing import Optional
 
 from . import commonlib
+from . import endurance
+from . import health
 from . import operations
 
 _NVME_SMART_LOG = "nvme smart-log -o json %s"
 _NVME_ERROR_LOG = "nvme error-log -o json %s"
 _NVME_PERSISTENT_LOG = "nvme persistent-event-log -o json %s -l 512"
 _NVME_TELEMETRY_LOG = "nvme telemetry-log %s  --output-file=%s"
+_NVME_ID_CTRL = "nvme id-ctrl -o json %s"
+# OCP SMART extended log (C0h) of the nvme-cli ocp plugin
+_NVME_OCP_SMART_LOG = "nvme ocp smart-add-log -o json %s"
+# nvme id-ctrl fields identifying the DUT
+_ID_CTRL_FIELDS = {"serial": "sn", "model": "mn", "firmware": "fr"}
 
 _NVME_CMDS = {
     "smart-log": _NVME_SMART_LOG,
     "error-log": _NVME_ERROR_LOG,
     "persistent-event-log": _NVME_PERSISTENT_LOG,
 }
+_TELEMETRY_LOG = "telemetry-log"
+_RESET_CMDS = {
+    operations.DISCARD: "blkdiscard %s",
+    operations.FORMAT: "nvme format %s --ses=0 --force",
+    operations.FORMAT_CRYPTO_ERASE: "nvme format %s --ses=2 --force",
+    operations.SANITIZE_CRYPTO_ERASE: "nvme sanitize %s --sanact=4",
+}
+_NVME_SANITIZE_LOG = "nvme sanitize-log -o json %s"
+# sanitize status, the lowest 3 bits of SSTAT
+_SANITIZE_STATUS_MASK = 0x7
+_SANITIZE_IN_PROGRESS = 2
+_SANITIZE_FAILED = 3
+_RESET_TIMEOUT_SEC = 3600
+_SANITIZE_POLL_SEC = 1
+# seconds before a log command of a hung drive is killed
+_LOG_TIMEOUT_SEC = 60
+_TELEMETRY_TIMEOUT_SEC = 300
+# log commands running at the same time across all the DUTs
+_MAX_LOG_COMMANDS = 16
+_log_slots = threading.BoundedSemaphore(_MAX_LOG_COMMANDS)
 
 
 class GenericDUTOperations(operations.DUTOperations):
@@ -34,6 +67,7 @@ class GenericDUTOperations(operations.DUTOperations):
     self._name = dev_name
     self._logs_dir = logs_dir
     self._ocp_dut = ocp_dut
+    self._identity = {}
 
   @property
   def name(self):
@@ -47,12 +81,30 @@ class GenericDUTOperations(operations.DUTOperations):
   def logs_dir(self):
     return self._logs_dir
 
+  @property
+  def identity(self):
+    """Serial, model and firmware of the DUT, empty if not identified."""
+    return self._identity
+
   def IdentifyDUT(self) -> bool:
     """Implement generic identification of DUT.
 
+    The DUT is identified with nvme id-ctrl, a device that doesn't support it
+    is still tested without its identity.
+
     Returns:
       True in case of success, False otherwise.
     """
+    cmd = _NVME_ID_CTRL % self._name
+    try:
+      id_ctrl = json.loads(commonlib.cmdexec(cmd.split()))
+    except (IOError, subprocess.CalledProcessError, ValueError) as _:
+      print("Non-critical error occured while running: %s" % cmd)
+      return True
+    self._identity = {
+        name: str(id_ctrl.get(field, "")).strip()
+        for name, field in _ID_CTRL_FIELDS.items()
+    }
     return True
 
   def VUIdentifyDUT(self) -> bool:
@@ -79,32 +131,132 @@ class GenericDUTOperations(operations.DUTOperations):
     """
     raise NotImplementedError()
 
-  def LogCollect(self) -> list[str]:
+  def ResetDUT(self, method) -> bool:
+    """Implement the generic reset of the DUT.
+
+    blkdiscard and nvme format return once done. A sanitize runs in the
+    background of the drive, its progress is polled in the sanitize log.
+
+    Args:
+      method: one of operations.RESET_METHODS.
+    Returns:
+      True once the reset completed, False otherwise.
+    """
+    cmd = _RESET_CMDS[method] % self._name
+    deadline = time.monotonic() + _RESET_TIMEOUT_SEC
+    try:
+      commonlib.cmdexec(cmd.split(), _RESET_TIMEOUT_SEC)
+      if method == operations.SANITIZE_CRYPTO_ERASE:
+        return self._wait_for_sanitize(deadline)
+    except (IOError, subprocess.SubprocessError) as _:
+      print("Error occured while running: %s" % cmd)
+      return False
+    return True
+
+  def _wait_for_sanitize(self, deadline) -> bool:
+    cmd = _NVME_SANITIZE_LOG % self._name
+    while True:
+      try:
+        sanitize_log = json.loads(commonlib.cmdexec(cmd.split(),
+                                                    _LOG_TIMEOUT_SEC))
+      except ValueError as _:
+        print("Error occured while parsing: %s" % cmd)
+        return False
+      # newer nvme-cli nests the log under the device name
+      if "sstat" not in sanitize_log:
+        sanitize_log = next(iter(sanitize_log.values()), {})
+      status = int(sanitize_log.get("sstat", 0)) & _SANITIZE_STATUS_MASK
+      if status != _SANITIZE_IN_PROGRESS:
+        return status != _SANITIZE_FAILED
+      if time.monotonic() > deadline:
+        print("Sanitize of %s did not complete in time" % self._name)
+        return False
+      time.sleep(_SANITIZE_POLL_SEC)
+
+  def WriteCounters(self) -> endurance.Counters:
+    """Implement the snapshot of the lifetime write counters of the DUT.
+
+    Returns:
+      The data units of nvme smart-log and the NAND bytes of
+      VUNandBytesWritten, None for the ones that can't be read.
+    """
+    return endurance.Counters(health.data_units_written(self._name),
+                              self.VUNandBytesWritten())
+
+  def VUNandBytesWritten(self) -> Optional[int]:
+    """Implement the vendor unique NAND write counter, overriden by vendor.
+
+    The generic counter is the Physical Media Units Written of the OCP SMART
+    extended log, drives without the log don't report their NAND writes.
+
+    Returns:
+      The bytes written to NAND in the life of the DUT, None if unknown.
+    """
+    cmd = _NVME_OCP_SMART_LOG % self._name
+    try:
+      smart_log = json.loads(commonlib.cmdexec(cmd.split(), _LOG_TIMEOUT_SEC))
+    except (IOError, subprocess.SubprocessError, ValueError) as _:
+      return None
+    return endurance.parse_ocp_smart_log(smart_log)
+
+  def LogCollect(self) -> list[operations.CollectedLog]:
     """Implement all generic logs collection when error occurs.
 
+    The nvme commands run concurrently, at most _MAX_LOG_COMMANDS of them
+    across all the DUTs, each of them is killed if it doesn't finish in time,
+    and their outputs are written to gzip files as they come.
+
     Returns:
-      A list of collected items.
+      The manifest of the collected logs, including the failed ones.
     """
-    collected_logs = []
-    for name, nvme_cmd in _NVME_CMDS.items():
-      cmd = nvme_cmd % self._name
-      print("Collecting output for %s ..." % cmd)
-      out = ""
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=len(_NVME_CMDS) + 1,
+        thread_name_prefix="LogCollect") as executor:
+      futures = [
+          executor.submit(self._collect_log, name, nvme_cmd % self._name)
+          for name, nvme_cmd in _NVME_CMDS.items()
+      ]
+      futures.append(executor.submit(self._collect_telemetry_log))
+      manifest = [future.result() for future in futures]
+    manifest_file = os.path.join(self._logs_dir, "manifest.json")
+    with open(manifest_file, "w") as f:
+      json.dump([dataclasses.asdict(log) for log in manifest], f, indent=2)
+    return manifest
+
+  def _collect_log(self, name, cmd) -> operations.CollectedLog:
+    print("Collecting output for %s ..." % cmd)
+    log = operations.CollectedLog(name, cmd)
+    output_file = os.path.join(self._logs_dir, name + ".gz")
+    with _log_slots:
+      start = time.monotonic()
       try:
-        out = commonlib.cmdexec(cmd.split())
-      except (IOError, subprocess.CalledProcessError) as _:
+        commonlib.cmdexec_to_file(cmd.split(), output_file, _LOG_TIMEOUT_SEC)
+      except (IOError, subprocess.SubprocessError) as e:
         print("Non-critical error occured while running: %s" % cmd)
-        continue
-      output_file = os.path.join(self._logs_dir, name)
-      with open(output_file, "w") as f:
-        f.write(out)
-      collected_logs.append(output_file)
-    # separately handle telemetry-log as it's already stored in the file
-    output_file = os.path.join(self._logs_dir, "telemetry-log")
+        log.error = str(e)
+      log.duration_sec = time.monotonic() - start
+    if not log.error:
+      log.path = output_file
+      log.size = os.path.getsize(output_file)
+    return log
+
+  def _collect_telemetry_log(self) -> operations.CollectedLog:
+    # telemetry-log writes the file itself
+    output_file = os.path.join(self._logs_dir, _TELEMETRY_LOG)
     cmd = _NVME_TELEMETRY_LOG % (self._name, output_file)
-    commonlib.cmdexec(cmd.split())
-    collected_logs.append(output_file)
-    return collected_logs
+    print("Collecting output for %s ..." % cmd)
+    log = operations.CollectedLog(_TELEMETRY_LOG, cmd)
+    with _log_slots:
+      start = time.monotonic()
+      try:
+        commonlib.cmdexec(cmd.split(), _TELEMETRY_TIMEOUT_SEC)
+        log.path = commonlib.compress_file(output_file)
+        log.size = os.path.getsize(log.path)
+      except (IOError, subprocess.SubprocessError) as e:
+        print("Non-critical error occured while running: %s" % cmd)
+        log.error = str(e)
+      log.duration_sec = time.monotonic() - start
+    return log
 
   def VULogCollect(self) -> int:
     """Implement vendor unique log collection, overriden by vendor.
@@ -0,0 +1,133 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from . import endurance
+from . import generic
+from . import operations
+
+
+class LogCollectTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmpdir.cleanup)
+    self._dut = generic.GenericDUTOperations(
+        "/dev/nvme0n1", self._tmpdir.name, None)
+
+  def test_logs_collected_concurrently_with_timeout(self):
+    cmds = {
+        "smart-log": "echo smart %s",
+        "error-log": "false %s",
+        "persistent-event-log": "yes %s",
+    }
+    start = time.monotonic()
+    with patch.object(generic, "_NVME_CMDS", cmds), \
+         patch.object(generic, "_LOG_TIMEOUT_SEC", 0.5), \
+         patch.object(generic, "_NVME_TELEMETRY_LOG",
+                      "touch --no-create %s %s"):
+      manifest = self._dut.LogCollect()
+    self.assertLess(time.monotonic() - start, 5)
+    logs = {log.name: log for log in manifest}
+    self.assertEqual(set(logs), {"smart-log", "error-log",
+                                 "persistent-event-log", "telemetry-log"})
+    with gzip.open(logs["smart-log"].path, "rt") as f:
+      self.assertEqual(f.read(), "smart /dev/nvme0n1\n")
+    self.assertGreater(logs["smart-log"].size, 0)
+    self.assertTrue(logs["error-log"].error)
+    self.assertIn("timed out", logs["persistent-event-log"].error)
+    self.assertEqual(logs["persistent-event-log"].path, "")
+    # touch --no-create doesn't write the telemetry file
+    self.assertTrue(logs["telemetry-log"].error)
+    with open(os.path.join(self._tmpdir.name, "manifest.json")) as f:
+      self.assertEqual(len(json.load(f)), 4)
+
+  def test_log_commands_bounded_across_duts(self):
+    # both commands run until they're killed
+    cmds = {"smart-log": "yes %s", "error-log": "yes %s"}
+    start = time.monotonic()
+    with patch.object(generic, "_NVME_CMDS", cmds), \
+         patch.object(generic, "_LOG_TIMEOUT_SEC", 0.2), \
+         patch.object(generic, "_log_slots", threading.BoundedSemaphore(1)), \
+         patch.object(generic, "_NVME_TELEMETRY_LOG", "true %s %s"):
+      manifest = self._dut.LogCollect()
+    # a single slot runs the commands one after another
+    self.assertGreaterEqual(time.monotonic() - start, 0.4)
+    self.assertEqual(len(manifest), 3)
+
+
+class ResetTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._dut = generic.GenericDUTOperations("/dev/nvme0n1", None, None)
+
+  def test_discard(self):
+    with patch.object(generic.commonlib, "cmdexec",
+                      return_value="") as cmdexec:
+      self.assertTrue(self._dut.ResetDUT(operations.DISCARD))
+    cmdexec.assert_called_once_with(["blkdiscard", "/dev/nvme0n1"],
+                                    generic._RESET_TIMEOUT_SEC)
+
+  def test_failed_format(self):
+    with patch.object(generic.commonlib, "cmdexec", side_effect=IOError):
+      self.assertFalse(self._dut.ResetDUT(operations.FORMAT_CRYPTO_ERASE))
+
+  def test_sanitize_polled_until_complete(self):
+    outputs = [
+        "",
+        json.dumps({"nvme0n1": {"sprog": 100, "sstat": 0x2}}),
+        json.dumps({"sprog": 65535, "sstat": 0x101}),
+    ]
+    with patch.object(generic.commonlib, "cmdexec",
+                      side_effect=outputs) as cmdexec, \
+         patch.object(generic.time, "sleep") as sleep:
+      self.assertTrue(self._dut.ResetDUT(operations.SANITIZE_CRYPTO_ERASE))
+    self.assertEqual(cmdexec.call_count, 3)
+    self.assertIn("--sanact=4", cmdexec.call_args_list[0][0][0])
+    sleep.assert_called_once()
+
+  def test_failed_sanitize(self):
+    outputs = ["", json.dumps({"sstat": 0x3})]
+    with patch.object(generic.commonlib, "cmdexec", side_effect=outputs):
+      self.assertFalse(self._dut.ResetDUT(operations.SANITIZE_CRYPTO_ERASE))
+
+
+class WriteCountersTest(unittest.TestCase):
+
+  def test_counters(self):
+    dut = generic.GenericDUTOperations("/dev/nvme0n1", None, None)
+    outputs = {
+        "smart-log": json.dumps({"data_units_written": 1234}),
+        "smart-add-log": json.dumps({
+            "Physical media units written - hi": 1,
+            "Physical media units written - lo": 2}),
+    }
+
+    def fake_nvme(args, *_, **__):
+      return outputs[args[2] if args[1] == "ocp" else args[1]]
+
+    with patch.object(generic.commonlib, "cmdexec", side_effect=fake_nvme):
+      counters = dut.WriteCounters()
+    self.assertEqual(counters, endurance.Counters(1234, (1 << 64) + 2))
+
+  def test_counters_unknown(self):
+    dut = generic.GenericDUTOperations("/dev/nvme0n1", None, None)
+    with patch.object(generic.commonlib, "cmdexec", side_effect=IOError):
+      self.assertEqual(dut.WriteCounters(), endurance.Counters())
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,191 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Background sampling of the NVMe SMART health of a DUT.
+
+Samples are kept in columns so that the throttling periods of a step can be
+lined up with the fio time series of the same step.
+"""
+import dataclasses
+import json
+import subprocess
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from . import commonlib
+
+_NVME_SMART_LOG = "nvme smart-log -o json %s"
+_KELVIN = 273
+# smart-log counters that grow while the drive is throttling
+THROTTLE_COUNTERS = ("warning_temp_time", "critical_comp_time",
+                     "thm_temp1_total_time", "thm_temp2_total_time")
+FIELDS = ("temperature", "media_errors") + THROTTLE_COUNTERS
+MSEC_IN_SEC = 1000
+
+
+@dataclasses.dataclass
+class ThrottleEvent:
+  """Period in which a throttle counter grew, relative to the step start."""
+  start_msec: int
+  end_msec: int
+  max_temperature_c: float
+
+
+def parse_smart_log(smart_log):
+  """Returns the sampled fields of nvme smart-log JSON output.
+
+  Args:
+    smart_log: nvme smart-log output parsed.
+  Returns:
+    The value of every field in FIELDS, temperature in Celsius.
+  """
+  sample = {field: float(smart_log.get(field, 0)) for field in FIELDS}
+  # nvme-cli reports the composite temperature in Kelvin
+  sample["temperature"] -= _KELVIN
+  return sample
+
+
+def read_smart_log(dev_name, timeout=None):
+  """Returns nvme smart-log of the DUT parsed, None if it can't be read."""
+  try:
+    return json.loads(commonlib.cmdexec((_NVME_SMART_LOG % dev_name).split(),
+                                        timeout=timeout))
+  except (IOError, subprocess.SubprocessError, ValueError) as _:
+    return None
+
+
+def data_units_written(dev_name) -> Optional[int]:
+  """Returns the data units the DUT has written in its life, if known."""
+  smart_log = read_smart_log(dev_name)
+  if not isinstance(smart_log, dict) or "data_units_written" not in smart_log:
+    return None
+  return int(smart_log["data_units_written"])
+
+
+class HealthSamples:
+  """SMART samples of a DUT, times are seconds since the epoch."""
+
+  def __init__(self, times, values):
+    self._times = np.asarray(times, dtype=np.float64)
+    self._values = np.asarray(values, dtype=np.float64).reshape(
+        -1, len(FIELDS))
+
+  def __len__(self):
+    return len(self._times)
+
+  @property
+  def times(self) -> np.ndarray:
+    return self._times
+
+  def field(self, name) -> np.ndarray:
+    return self._values[:, FIELDS.index(name)]
+
+  def between(self, start, end):
+    """Returns the samples taken from start to end, in seconds."""
+    selected = (self._times >= start) & (self._times <= end)
+    return HealthSamples(self._times[selected], self._values[selected])
+
+  def throttle_events(self, start):
+    """Finds the periods in which any throttle counter grew.
+
+    Args:
+      start: time the step started, in seconds.
+    Returns:
+      The throttle events in milliseconds since start, the same time base as
+      the fio logs of the step.
+    """
+    if len(self) < 2:
+      return []
+    counters = self._values[:, [FIELDS.index(c) for c in THROTTLE_COUNTERS]]
+    throttled = np.any(np.diff(counters, axis=0) > 0, axis=1)
+    # throttled[i] covers the interval from sample i to sample i + 1
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], throttled, [0]))))
+    temperatures = self.field("temperature")
+    offsets = ((self._times - start) * MSEC_IN_SEC).astype(np.int64)
+    return [
+        ThrottleEvent(int(offsets[first]), int(offsets[last]),
+                      float(temperatures[first:last + 1].max()))
+        for first, last in zip(edges[::2], edges[1::2])
+    ]
+
+
+class HealthSampler(threading.Thread):
+  """Polls nvme smart-log of a DUT until stopped.
+
+  Sampling failures are counted and skipped, a drive that doesn't answer in
+  time must not stop the test. Every sample is also handed to the listener
+  set with listen as soon as it's taken, e.g. to report it live.
+  """
+
+  def __init__(self, dev_name, interval_sec):
+    super().__init__(name="HealthSampler-%s" % dev_name, daemon=True)
+    self._dev_name = dev_name
+    self._interval_sec = interval_sec
+    self._stopped = threading.Event()
+    self._lock = threading.Lock()
+    self._times = []
+    self._values = []
+    # held while the listener runs, so that it isn't called once replaced
+    self._listener_lock = threading.Lock()
+    self._listener = None
+    self.errors = 0
+
+  def run(self):
+    while True:
+      self.sample()
+      if self._stopped.wait(self._interval_sec):
+        return
+
+  def sample(self):
+    smart_log = read_smart_log(self._dev_name, timeout=self._interval_sec)
+    if smart_log is None:
+      self.errors += 1
+      return
+    sample = parse_smart_log(smart_log)
+    timestamp = time.time()
+    with self._lock:
+      self._times.append(timestamp)
+      self._values.append([sample[field] for field in FIELDS])
+    with self._listener_lock:
+      if self._listener:
+        self._listener(timestamp, sample)
+
+  def listen(self, listener):
+    """Sets the function called with every new sample, None to stop.
+
+    Args:
+      listener: called with the time of the sample in seconds since the epoch
+        and the sample, see parse_smart_log. Runs in the sampler thread.
+    """
+    with self._listener_lock:
+      self._listener = listener
+
+  def stop(self):
+    self._stopped.set()
+    self.join()
+
+  def samples(self) -> HealthSamples:
+    with self._lock:
+      return HealthSamples(list(self._times), list(self._values))
+
+
+def drop_percent(event, series):
+  """Percent by which a rate is lower during a throttle event than overall.
+
+  Args:
+    event: throttle event of the step.
+    series: fio bandwidth or IOPS time series of the same step.
+  Returns:
+    The drop of the mean rate during the event, 0 without samples in it.
+  """
+  during = (series.times >= event.start_msec) & (series.times <= event.end_msec)
+  mean = series.values.mean() if series.values.size else 0
+  if not during.any() or not mean:
+    return 0.0
+  return float(100 * (1 - series.values[during].mean() / mean))
@@ -0,0 +1,96 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json
+import unittest
+from unittest.mock import patch
+
+from . import health
+from . import timeseries
+
+
+def _sample(temperature_c, thm_temp1_total_time=0):
+  sample = dict.fromkeys(health.FIELDS, 0)
+  sample["temperature"] = temperature_c
+  sample["thm_temp1_total_time"] = thm_temp1_total_time
+  return [sample[field] for field in health.FIELDS]
+
+
+class HealthSamplesTest(unittest.TestCase):
+
+  def test_parse_smart_log(self):
+    sample = health.parse_smart_log(
+        {"temperature": 350, "media_errors": 2, "warning_temp_time": 1})
+    self.assertEqual(sample["temperature"], 77)
+    self.assertEqual(sample["media_errors"], 2)
+    self.assertEqual(sample["thm_temp2_total_time"], 0)
+
+  def test_throttle_events(self):
+    samples = health.HealthSamples(
+        [100, 101, 102, 103, 104, 105, 106],
+        [_sample(60), _sample(70), _sample(80, 1), _sample(82, 2),
+         _sample(75, 2), _sample(81, 2), _sample(80, 3)])
+    events = samples.throttle_events(start=100)
+    self.assertEqual(events, [
+        health.ThrottleEvent(1000, 3000, 82),
+        health.ThrottleEvent(5000, 6000, 81),
+    ])
+    self.assertEqual(len(samples.between(101, 103)), 3)
+    self.assertEqual(samples.between(101, 103).throttle_events(100),
+                     [health.ThrottleEvent(1000, 3000, 82)])
+
+  def test_no_throttling(self):
+    samples = health.HealthSamples([0, 1], [_sample(60), _sample(61)])
+    self.assertEqual(samples.throttle_events(start=0), [])
+    self.assertEqual(health.HealthSamples([], []).throttle_events(0), [])
+
+  def test_drop_percent(self):
+    series = timeseries.TimeSeries([0, 1000, 2000, 3000], [100, 50, 50, 200])
+    event = health.ThrottleEvent(1000, 2000, 80)
+    self.assertAlmostEqual(health.drop_percent(event, series), 50)
+    event = health.ThrottleEvent(5000, 6000, 80)
+    self.assertEqual(health.drop_percent(event, series), 0)
+
+
+class HealthSamplerTest(unittest.TestCase):
+
+  def test_samples_until_stopped(self):
+    with patch.object(health.commonlib, "cmdexec",
+                      return_value=json.dumps({"temperature": 300})):
+      sampler = health.HealthSampler("/dev/nvme0n1", 0.01)
+      sampler.start()
+      while len(sampler.samples()) < 3:
+        pass
+      sampler.stop()
+    samples = sampler.samples()
+    self.assertGreaterEqual(len(samples), 3)
+    self.assertTrue((samples.field("temperature") == 27).all())
+    self.assertFalse(sampler.is_alive())
+
+  def test_listener(self):
+    sampler = health.HealthSampler("/dev/nvme0n1", 1)
+    heard = []
+    with patch.object(health.commonlib, "cmdexec",
+                      return_value=json.dumps({"temperature": 300})):
+      sampler.sample()
+      sampler.listen(lambda timestamp, sample: heard.append(sample))
+      sampler.sample()
+      sampler.listen(None)
+      sampler.sample()
+    self.assertEqual(len(heard), 1)
+    self.assertEqual(heard[0]["temperature"], 27)
+    self.assertEqual(len(sampler.samples()), 3)
+
+  def test_failed_sample_skipped(self):
+    sampler = health.HealthSampler("/dev/nvme0n1", 1)
+    with patch.object(health.commonlib, "cmdexec", return_value="not json"):
+      sampler.sample()
+    self.assertEqual(len(sampler.samples()), 0)
+    self.assertEqual(sampler.errors, 1)
+
+
+if __name__ == "__main__":
+  unittest.main()
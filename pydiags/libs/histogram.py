@@ -0,0 +1,125 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Latency distributions built from the bins of fio json+ output."""
+import numpy as np
+
+BINS = "bins"
+
+
+class LatencyHistogram:
+  """Latency histogram of a single fio latency section (clat, slat or lat).
+
+  fio json+ reports every non-empty bin as a latency value in nanoseconds and
+  the number of IOs that fell into it. Any percentile, CDF point or tail
+  fraction can be computed from them, not only the ones fio prints.
+  """
+
+  def __init__(self, values_ns, counts):
+    values_ns = np.asarray(values_ns, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    order = np.argsort(values_ns, kind="stable")
+    self._values = values_ns[order]
+    self._cumulative = np.cumsum(counts[order])
+
+  @classmethod
+  def from_fio(cls, latency_stats: dict):
+    """Builds the histogram from a fio json+ latency section.
+
+    Args:
+      latency_stats: fio latency section, e.g. job["read"]["clat_ns"].
+    Returns:
+      The histogram of the section.
+    Raises:
+      ValueError: the section doesn't have bins, fio wasn't run with json+.
+    """
+    bins = latency_stats.get(BINS)
+    if bins is None:
+      raise ValueError("latency bins are missing, fio json+ output is needed.")
+    values = np.fromiter(bins.keys(), dtype=np.int64, count=len(bins))
+    counts = np.fromiter(bins.values(), dtype=np.int64, count=len(bins))
+    return cls(values, counts)
+
+  @classmethod
+  def merge(cls, histograms):
+    """Merges histograms, e.g. of all the jobs of a group.
+
+    Args:
+      histograms: histograms to merge.
+    Returns:
+      The histogram of all the IOs of the histograms merged.
+    """
+    values = np.concatenate([h._values for h in histograms])
+    counts = np.concatenate([h.counts for h in histograms])
+    merged_values, indices = np.unique(values, return_inverse=True)
+    return cls(merged_values, np.bincount(indices, weights=counts))
+
+  @property
+  def values(self) -> np.ndarray:
+    """The latency of every bin in nanoseconds."""
+    return self._values
+
+  @property
+  def counts(self) -> np.ndarray:
+    """The number of IOs in every bin."""
+    return np.diff(self._cumulative, prepend=0)
+
+  def to_fio(self) -> dict:
+    """Returns the bins in the format of fio json+ output."""
+    counts = self.counts
+    present = np.flatnonzero(counts)
+    return {
+        str(value): int(count)
+        for value, count in zip(self._values[present], counts[present])
+    }
+
+  @property
+  def total(self) -> int:
+    """The number of IOs in the histogram."""
+    return int(self._cumulative[-1]) if self._cumulative.size else 0
+
+  def percentiles(self, percents) -> np.ndarray:
+    """Computes latency percentiles the same way fio does.
+
+    Args:
+      percents: percentiles to compute, e.g. [99.9, 99.999].
+    Returns:
+      The latency in nanoseconds for every percentile requested.
+    """
+    percents = np.asarray(percents, dtype=np.float64)
+    if not self.total:
+      return np.zeros(percents.shape, dtype=np.int64)
+    ranks = percents * self.total / 100
+    indices = np.searchsorted(self._cumulative, ranks, side="left")
+    return self._values[np.minimum(indices, self._values.size - 1)]
+
+  def cdf(self, latencies_ns) -> np.ndarray:
+    """Computes the fraction of IOs completed within the given latencies.
+
+    Args:
+      latencies_ns: latencies in nanoseconds.
+    Returns:
+      The fraction of IOs with latency not above every latency requested.
+    """
+    latencies_ns = np.asarray(latencies_ns)
+    if not self.total:
+      return np.zeros(latencies_ns.shape, dtype=np.float64)
+    indices = np.searchsorted(self._values, latencies_ns, side="right")
+    completed = np.where(
+        indices > 0, self._cumulative[np.maximum(indices - 1, 0)], 0)
+    return completed / self.total
+
+  def fraction_above(self, latencies_ns) -> np.ndarray:
+    """Computes the fraction of IOs slower than the given latencies.
+
+    Args:
+      latencies_ns: latencies in nanoseconds.
+    Returns:
+      The fraction of IOs with latency above every latency requested.
+    """
+    if not self.total:
+      return np.zeros(np.shape(latencies_ns), dtype=np.float64)
+    return 1 - self.cdf(latencies_ns)
@@ -0,0 +1,52 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import unittest
+
+import numpy as np
+
+from . import histogram
+
+# 1000 IOs: 900 at 1us, 90 at 2us, 9 at 5us and a single one at 100us
+_CLAT_NS = {
+    "N": 1000,
+    "bins": {"5000": 9, "1000": 900, "100000": 1, "2000": 90},
+}
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.histogram = histogram.LatencyHistogram.from_fio(_CLAT_NS)
+
+  def test_total(self):
+    self.assertEqual(self.histogram.total, 1000)
+
+  def test_percentiles(self):
+    np.testing.assert_array_equal(
+        self.histogram.percentiles([50, 90, 99, 99.9, 99.99, 100]),
+        [1000, 1000, 2000, 5000, 100000, 100000])
+
+  def test_cdf_and_fraction_above(self):
+    np.testing.assert_allclose(
+        self.histogram.cdf([500, 1000, 4999, 100000]), [0, 0.9, 0.99, 1])
+    np.testing.assert_allclose(
+        self.histogram.fraction_above([2000, 5000]), [0.01, 0.001])
+
+  def test_empty_histogram(self):
+    empty = histogram.LatencyHistogram.from_fio({"bins": {}})
+    self.assertEqual(empty.total, 0)
+    np.testing.assert_array_equal(empty.percentiles([99]), [0])
+    np.testing.assert_array_equal(empty.fraction_above([1]), [0])
+
+  def test_missing_bins(self):
+    with self.assertRaises(ValueError):
+      histogram.LatencyHistogram.from_fio({"N": 1000})
+
+
+if __name__ == "__main__":
+  unittest.main()
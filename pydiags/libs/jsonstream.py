@@ -0,0 +1,135 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Incremental parsing of fio output files.
+
+A json+ document can be very large, so it's never read as a whole. The top
+level values are decoded one by one and the jobs are handed out one at a time,
+only a single job is held in memory while it's being converted.
+"""
+import json
+from typing import Iterator
+
+from . import results
+
+_CHUNK_SIZE = 1 << 20
+_WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+  """Decodes JSON values one after another from a buffered text file."""
+
+  def __init__(self, f):
+    self._file = f
+    self._decoder = json.JSONDecoder()
+    self._buffer = ""
+    self._pos = 0
+    self._eof = False
+
+  def _fill(self, size=_CHUNK_SIZE):
+    """Reads more data dropping what has already been consumed."""
+    chunk = self._file.read(size)
+    self._eof = not chunk
+    self._buffer = self._buffer[self._pos:] + chunk
+    self._pos = 0
+    return bool(chunk)
+
+  def next_char(self):
+    """Consumes and returns the next non whitespace character."""
+    while True:
+      while (self._pos < len(self._buffer) and
+             self._buffer[self._pos] in _WHITESPACE):
+        self._pos += 1
+      if self._pos < len(self._buffer):
+        self._pos += 1
+        return self._buffer[self._pos - 1]
+      if not self._fill():
+        raise ValueError("unexpected end of fio output.")
+
+  def consume(self, char):
+    """Consumes the next non whitespace character if it's the one expected."""
+    if self.next_char() == char:
+      return True
+    self._pos -= 1
+    return False
+
+  def skip_preamble(self):
+    """Skips the messages fio may log before the document."""
+    while True:
+      start = (self._pos if self._buffer.startswith("{", self._pos)
+               else self._buffer.find("\n{", self._pos))
+      if start >= 0:
+        self._pos = start
+        return
+      self._pos = max(self._pos, len(self._buffer) - 1)
+      if not self._fill():
+        raise ValueError("fio output doesn't contain a JSON document.")
+
+  def decode(self):
+    """Decodes the next value, reading as much as the value needs."""
+    self.next_char()
+    self._pos -= 1
+    while True:
+      try:
+        value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        # a number cut by the end of the buffer still decodes
+        if end < len(self._buffer) or self._eof:
+          self._pos = end
+          return value
+      except json.JSONDecodeError:
+        if self._eof:
+          raise
+      # grow the buffer geometrically so a large value is decoded in O(n)
+      self._fill(max(_CHUNK_SIZE, len(self._buffer) - self._pos))
+
+
+def iter_jobs(path) -> Iterator[dict]:
+  """Yields the jobs of a fio output file one by one.
+
+  Args:
+    path: file fio wrote with --output and --output-format=json+.
+  Yields:
+    Every job of the fio output, of every server for a fio client.
+  Raises:
+    ValueError: the file is not a valid fio output.
+  """
+  with open(path) as f:
+    reader = _Reader(f)
+    reader.skip_preamble()
+    reader.next_char()
+    if reader.consume("}"):
+      return
+    separator = ","
+    while separator == ",":
+      key = reader.decode()
+      if reader.next_char() != ":":
+        raise ValueError("malformed fio output: %s" % path)
+      if key not in results.JOB_SECTIONS:
+        # the other top level values are small and not needed
+        reader.decode()
+      elif not reader.consume("["):
+        raise ValueError("malformed fio output: %s" % path)
+      elif not reader.consume("]"):
+        element_separator = ","
+        while element_separator == ",":
+          job = reader.decode()
+          if job.get("jobname") != results.ALL_CLIENTS:
+            yield job
+          element_separator = reader.next_char()
+      separator = reader.next_char()
+
+
+def load_step(name, path) -> results.StepResult:
+  """Builds the compact results of a step from a fio output file.
+
+  Args:
+    name: name of the test step.
+    path: file fio wrote with --output and --output-format=json+.
+  Returns:
+    The step results.
+  """
+  return results.StepResult(
+      name, [results.JobResult.from_fio(job) for job in iter_jobs(path)])
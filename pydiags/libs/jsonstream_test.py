@@ -0,0 +1,86 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from . import jsonstream
+
+_FIO_OUTPUT = {
+    "fio version": "fio-3.35",
+    "timestamp": 1700000000,
+    "global options": {"filename": "jobs"},
+    "jobs": [
+        {"jobname": "seq_wr", "error": 0,
+         "write": {"bw": 1024, "clat_ns": {"N": 10, "bins": {"1000": 10}}}},
+        {"jobname": "seq_rd", "error": 0, "read": {"bw": 2048}},
+    ],
+    "disk_util": [{"name": "nvme0n1", "util": 99.5}],
+}
+
+
+class JsonStreamTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.log_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(self.log_dir.cleanup)
+
+  def _write(self, content):
+    path = os.path.join(self.log_dir.name, "fio.json")
+    with open(path, "w") as f:
+      f.write(content)
+    return path
+
+  def test_iter_jobs(self):
+    path = self._write(
+        "note: both iodepth >= 1 and synchronous I/O engine are selected\n"
+        + json.dumps(_FIO_OUTPUT, indent=2))
+    self.assertEqual(list(jsonstream.iter_jobs(path)), _FIO_OUTPUT["jobs"])
+
+  def test_iter_jobs_in_small_chunks(self):
+    path = self._write(json.dumps(_FIO_OUTPUT, indent=2))
+    for chunk_size in (1, 7, 64):
+      with mock.patch.object(jsonstream, "_CHUNK_SIZE", chunk_size):
+        self.assertEqual(
+            list(jsonstream.iter_jobs(path)), _FIO_OUTPUT["jobs"])
+
+  def test_iter_jobs_of_fio_client(self):
+    client_output = {
+        "fio version": "fio-3.35",
+        "client_stats": [
+            dict(_FIO_OUTPUT["jobs"][0], hostname="host1"),
+            dict(_FIO_OUTPUT["jobs"][1], hostname="host2"),
+            {"jobname": "All clients", "error": 0, "read": {"bw": 2048}},
+        ],
+    }
+    path = self._write(json.dumps(client_output, indent=2))
+    self.assertEqual([job["hostname"] for job in jsonstream.iter_jobs(path)],
+                     ["host1", "host2"])
+
+  def test_iter_jobs_without_jobs(self):
+    path = self._write(json.dumps({"fio version": "fio-3.35", "jobs": []}))
+    self.assertEqual(list(jsonstream.iter_jobs(path)), [])
+
+  def test_iter_jobs_truncated_output(self):
+    path = self._write(json.dumps(_FIO_OUTPUT)[:-40])
+    with self.assertRaises(ValueError):
+      list(jsonstream.iter_jobs(path))
+
+  def test_load_step(self):
+    path = self._write(json.dumps(_FIO_OUTPUT))
+    step_result = jsonstream.load_step("seq.fio", path)
+    self.assertEqual(step_result.name, "seq.fio")
+    self.assertEqual([job.name for job in step_result.jobs],
+                     ["seq_wr", "seq_rd"])
+    self.assertEqual(step_result.jobs[1].io_stats["read"].bw, 2048)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -6,6 +6,27 @@
 
 """Base class providing interface for supported operations."""
 import abc
+import dataclasses
+
+# ways to reset a DUT to a known state between steps: deallocate every block,
+# NVMe format with no secure erase or with a crypto erase, and sanitize with a
+# crypto erase
+DISCARD = "discard"
+FORMAT = "format"
+FORMAT_CRYPTO_ERASE = "format_crypto_erase"
+SANITIZE_CRYPTO_ERASE = "sanitize_crypto_erase"
+RESET_METHODS = (DISCARD, FORMAT, FORMAT_CRYPTO_ERASE, SANITIZE_CRYPTO_ERASE)
+
+
+@dataclasses.dataclass
+class CollectedLog:
+  """Manifest entry of a log collected from the DUT."""
+  name: str
+  command: str
+  path: str = ""
+  size: int = 0
+  duration_sec: float = 0
+  error: str = ""
 
 
 class DUTOperations(abc.ABC):
@@ -48,11 +69,40 @@ class DUTOperations(abc.ABC):
     pass
 
   @abc.abstractmethod
-  def LogCollect(self) -> int:
+  def ResetDUT(self, method) -> bool:
+    """Interface for resetting the DUT to a known state, e.g. before a step.
+
+    Args:
+      method: one of RESET_METHODS.
+    Returns:
+      True once the reset completed, False otherwise.
+    """
+    pass
+
+  @abc.abstractmethod
+  def WriteCounters(self):
+    """Interface for reading the lifetime write counters of the DUT.
+
+    Returns:
+      The endurance.Counters of the DUT, None for the ones it doesn't have.
+    """
+    pass
+
+  @abc.abstractmethod
+  def VUNandBytesWritten(self):
+    """Interface for the vendor unique counter of bytes written to NAND.
+
+    Returns:
+      The bytes written to NAND in the life of the DUT, None if unknown.
+    """
+    pass
+
+  @abc.abstractmethod
+  def LogCollect(self) -> list[CollectedLog]:
     """Implement all generic logs collection when error occurs.
 
     Returns:
-      Number of collected items.
+      The manifest of the collected logs, including the failed ones.
     """
     pass
 
@@ -4,8 +4,16 @@
 # license that can be found in the LICENSE file or at
 # https://opensource.org/licenses/MIT.
 
+import collections
+import re
 from dataclasses import dataclass
 
+import numpy as np
+
+from . import results
+from . import sweep
+from . import timeseries
+
 _BANDWIDTH = "bwMbytesPerSec"
 _FIO_BANDWIDTH = "bw"
 _SUPPORTED_IO_TYPES = ("read", "write", "trim")
@@ -22,17 +30,49 @@ _JSON_TO_FIO_MAPPING = {
   _BANDWIDTH: _FIO_BANDWIDTH,
 }
 _FIO_TO_JSON_MAPPING = {v: k for k,v in _JSON_TO_FIO_MAPPING.items()}
+# targets on top of the ones above, computed from json+ latency bins, e.g.
+# lat99999thUsec, slatMaxUsec, totalLatFracAboveUsec
+_LATENCY_TARGET = re.compile(
+    r"^(?P<section>lat|slat|totalLat)(?P<kind>\d+th|Max|Mean|FracAbove)Usec$")
+_LATENCY_SECTIONS = {"lat": "clat_ns", "slat": "slat_ns", "totalLat": "lat_ns"}
+_LATENCY_STATS = {"Max": "max", "Mean": "mean"}
+_FRACTION_ABOVE = "FracAbove"
+_THRESHOLD_USEC = "thresholdUsec"
+_MAX_FRACTION = "maxFraction"
+# targets evaluated on the fio logs of the step: name -> (log, metric, is_min)
+TIMESERIES_TARGETS = {
+  "bwMinWindowMbytesPerSec": ("bw", "min_windowed", True),
+  "bwCovPercent": ("bw", "cov_percent", False),
+  "bwMaxDropPercent": ("bw", "max_drop_percent", False),
+  "iopsMinWindow": ("iops", "min_windowed", True),
+  "iopsCovPercent": ("iops", "cov_percent", False),
+  "iopsMaxDropPercent": ("iops", "max_drop_percent", False),
+}
+# targets on the points of a swept step, e.g. "iopsAtLat999thUsec":
+# {"maxLatencyUsec": 500, "minIops": 100000} asks for 100000 IOPS or more at a
+# 99.9th completion latency percentile of 500us or less
+_SWEEP_TARGET = re.compile(r"^iopsAtLat(?P<digits>\d+)thUsec$")
+_MAX_LATENCY_USEC = "maxLatencyUsec"
+_MIN_IOPS = "minIops"
+# target on the write amplification of the step, NAND bytes written per byte
+# the DUT received
+_WAF_MAX = "wafMax"
+
+# a benchmark without a step applies to the first step of the playbook
+_FIRST_STEP = None
 
 @dataclass
 class FailedWorkload:
   io_type: str
   workload_id: int
   failed_metrics: list
+  job_name: str = ""
 
 @dataclass
 class FailedBenchmark:
   name: str
   failed_workloads: list[FailedWorkload]
+  step: str = ""
 
 def _to_kilobytes(num_megabytes):
   return num_megabytes * KB_IN_MB
@@ -40,22 +80,144 @@ def _to_kilobytes(num_megabytes):
 def _to_nanosec(usecs):
   return usecs * NS_IN_US
 
+def _to_percentile(digits):
+  """Returns the percentile a target names, e.g. 99999 -> 99.999.
+
+  The first two digits are the integer part, the others the decimals.
+
+  Raises:
+    ValueError: the digits don't name a percentile within (0, 100), e.g. 5
+      or 100, which would read as 10.0.
+  """
+  if len(digits) < 2 or (len(digits) > 2 and digits.endswith("0")):
+    raise ValueError("malformed percentile %s: two digits then the decimals,"
+                     " e.g. 50, 999 or 9999" % digits)
+  percentile = float(digits[:2] + "." + digits[2:])
+  if not 0 < percentile < 100:
+    raise ValueError("percentile %s is not within (0, 100)" % digits)
+  return percentile
+
+
+def aggregate_jobs(jobs, job_logs=None):
+  """Merges fio jobs into a single one the way fio group reporting does.
+
+  Bandwidth, IOPS and IO counters are summed up, latency histograms merged and
+  the percentiles fio reported recomputed from the merged histogram.
+
+  Args:
+    jobs: job results.
+    job_logs: time series of the jobs, if collected.
+  Returns:
+    The merged job and its time series.
+  """
+  merged_logs = None
+  if job_logs:
+    merged_logs = collections.defaultdict(dict)
+    for log_type in {log_type for logs in job_logs for log_type in logs}:
+      for io_type in _SUPPORTED_IO_TYPES:
+        series = [logs[log_type][io_type] for logs in job_logs
+                  if io_type in logs.get(log_type, {})]
+        if series:
+          merged_logs[log_type][io_type] = timeseries.combine(series)
+  return results.JobResult.merge(jobs), merged_logs
+
+
 class Benchmark:
   def __init__(self, descriptor):
     self._basename = descriptor["basename"]
     self._workloads = [
         Workload(workload) for workload in descriptor["workloads"]
     ]
+    # the step config and the job name the benchmark applies to, all the jobs
+    # are evaluated separately unless they should be aggregated as a group
+    self._step = descriptor.get("step", _FIRST_STEP)
+    self._job_name = descriptor.get("jobName")
+    self._aggregate = descriptor.get("aggregate", False)
+
+  @property
+  def basename(self):
+    return self._basename
+
+  @property
+  def step(self):
+    return self._step
+
+  def _select_jobs(self, step_result):
+    job_logs = step_result.job_logs
+    logs = job_logs or [None] * len(step_result.jobs)
+    selected = [
+        (job, job_log) for job, job_log in zip(step_result.jobs, logs)
+        if self._job_name is None or job.name == self._job_name
+    ]
+    if not self._aggregate or not selected:
+      return selected
+    return [aggregate_jobs(
+        [job for job, _ in selected],
+        job_logs and [job_log for _, job_log in selected])]
 
-  def evaluate(self, fio_output):
+  def evaluate(self, step_result, job_logs=None):
+    if not isinstance(step_result, results.StepResult):
+      step_result = results.StepResult.from_fio("", step_result, job_logs)
     failed_targets = []
+    for job, job_log in self._select_jobs(step_result):
+      for workload in self._workloads:
+        result = workload.evaluate_job(job, job_log)
+        if result != None:
+          failed_targets.append(result)
     for workload in self._workloads:
-      result = workload.evaluate(fio_output)
-      if result != None:
+      result = workload.evaluate_sweep(step_result.sweep)
+      if result is not None:
+        failed_targets.append(result)
+      result = workload.evaluate_endurance(step_result.endurance)
+      if result is not None:
         failed_targets.append(result)
     return FailedBenchmark(self._basename, failed_targets)
 
 
+class BenchmarkSuite:
+  """All the benchmarks of a target file indexed by the step they apply to.
+
+  A target file holds either a single benchmark or a list of them under
+  "benchmarks", every benchmark may name the step config it applies to.
+  """
+
+  def __init__(self, descriptor):
+    self._benchmarks = collections.defaultdict(list)
+    for benchmark_descriptor in descriptor.get("benchmarks", [descriptor]):
+      benchmark = Benchmark(benchmark_descriptor)
+      self._benchmarks[benchmark.step].append(benchmark)
+
+  def evaluate(self, steps):
+    """Evaluates the benchmarks of every step of a single DUT.
+
+    Args:
+      steps: results of every step in the playbook order.
+    Returns:
+      The benchmarks that failed.
+    """
+    failed_benchmarks = []
+    for index, step_result in enumerate(steps):
+      benchmarks = self._benchmarks.get(step_result.name, [])
+      if index == 0:
+        benchmarks = self._benchmarks.get(_FIRST_STEP, []) + benchmarks
+      for benchmark in benchmarks:
+        result = benchmark.evaluate(step_result)
+        if result.failed_workloads:
+          result.step = step_result.name
+          failed_benchmarks.append(result)
+    return failed_benchmarks
+
+  def evaluate_all(self, results):
+    """Evaluates the benchmarks of every DUT, one DUT after another.
+
+    Args:
+      results: the steps of every DUT, see evaluate.
+    Returns:
+      The failed benchmarks of every DUT.
+    """
+    return {dut: self.evaluate(steps) for dut, steps in results.items()}
+
+
 class Workload:
   def __init__(self, workload):
     self._io_type = ''
@@ -64,9 +226,41 @@ class Workload:
         self._io_type = io_type
         break
 
-    self._targets = {
-        _JSON_TO_FIO_MAPPING[k]: int(v)
-        for k,v in workload["targets"].items()}
+    self._targets = {}
+    self._timeseries_targets = []
+    self._sweep_targets = []
+    self._waf_max = None
+    latency_targets = collections.defaultdict(list)
+    for k, v in workload["targets"].items():
+      if k == _WAF_MAX:
+        self._waf_max = float(v)
+        continue
+      if k in _JSON_TO_FIO_MAPPING:
+        self._targets[_JSON_TO_FIO_MAPPING[k]] = int(v)
+        continue
+      if k in TIMESERIES_TARGETS:
+        log_type, metric, is_min = TIMESERIES_TARGETS[k]
+        expected_value = float(v)
+        if k == "bwMinWindowMbytesPerSec":
+          expected_value = _to_kilobytes(expected_value)
+        self._timeseries_targets.append(
+            (k, log_type, metric, is_min, expected_value))
+        continue
+      match = _SWEEP_TARGET.match(k)
+      if match:
+        self._sweep_targets.append(
+            (k, _to_percentile(match.group("digits")),
+             float(v[_MAX_LATENCY_USEC]), float(v[_MIN_IOPS])))
+        continue
+      match = _LATENCY_TARGET.match(k)
+      if not match:
+        raise KeyError("unsupported target: %s" % k)
+      section = _LATENCY_SECTIONS[match.group("section")]
+      latency_targets[section].append((k, match.group("kind"), v))
+    self._latency_targets = [
+        _LatencyTargets(section, targets)
+        for section, targets in latency_targets.items()
+    ]
     for metric, usec in self._targets.items():
       if metric == _FIO_BANDWIDTH:
         # it's a bandwidth, skipping
@@ -76,24 +270,159 @@ class Workload:
     self._targets[_FIO_BANDWIDTH] = _to_kilobytes(self._targets.get(_FIO_BANDWIDTH, 0))
     self._workload_num = workload["workloadNum"]
 
-  def evaluate(self, fio_output):
-    actual_numbers = fio_output["jobs"][0][self._io_type]["clat_ns"]["percentile"]
+  def evaluate(self, fio_output, job_logs=None):
+    return self.evaluate_job(
+        results.JobResult.from_fio(fio_output["jobs"][0]),
+        job_logs[0] if job_logs else None)
+
+  def evaluate_job(self, job, job_log=None):
+    io_stats = job.io_stats[self._io_type]
+    clat_stats = io_stats.latencies["clat_ns"]
+    actual_numbers = clat_stats.percentiles
     failed_metrics = []
     for metric, expected_value in self._targets.items():
       if metric == _FIO_BANDWIDTH:
         # let's handle bandwidth separately
         continue
-      if expected_value < actual_numbers[metric]:
+      if metric in actual_numbers:
+        actual_value = actual_numbers[metric]
+      elif metric in _LATENCY_STATS.values():
+        # max and mean are not percentiles
+        actual_value = getattr(clat_stats, metric)
+      else:
+        # fio was asked for a different percentile list
+        actual_value = clat_stats.get_histogram().percentiles(
+            [float(metric)])[0]
+      if expected_value < actual_value:
         failed_metrics.append(_FIO_TO_JSON_MAPPING[metric])
-    actual_bandwidth = fio_output["jobs"][0][self._io_type][_FIO_BANDWIDTH]
+    actual_bandwidth = io_stats.bw
+    if self._is_single_io_type(job) and job.steady_state_bw:
+      # the steady state window represents the drive better than the ramp up
+      actual_bandwidth = job.steady_state_bw
     if (_FIO_BANDWIDTH in self._targets and
         self._targets[_FIO_BANDWIDTH] > actual_bandwidth):
       failed_metrics.append(_FIO_TO_JSON_MAPPING[_FIO_BANDWIDTH])
+    for latency_targets in self._latency_targets:
+      failed_metrics.extend(latency_targets.evaluate(io_stats))
+    if self._timeseries_targets:
+      failed_metrics.extend(self._evaluate_timeseries(job_log))
 
     if failed_metrics:
       return FailedWorkload(
           self._io_type,
           self._workload_num,
-          failed_metrics
+          failed_metrics,
+          job.name
       )
     return None
+
+  def evaluate_sweep(self, points):
+    """Evaluates the targets on the knee of a swept step.
+
+    Args:
+      points: the points of the step, None if it wasn't swept.
+    Returns:
+      The failed targets, None if all of them passed.
+    """
+    failed_metrics = []
+    for name, percentile, max_latency_usec, min_iops in self._sweep_targets:
+      knee = sweep.knee(points or [], percentile, max_latency_usec,
+                        self._io_type)
+      if knee is None or knee.iops(self._io_type) < min_iops:
+        failed_metrics.append(name)
+    if failed_metrics:
+      return FailedWorkload(self._io_type, self._workload_num, failed_metrics)
+    return None
+
+  def evaluate_endurance(self, step_endurance):
+    """Evaluates the write amplification target on the writes of the step.
+
+    Args:
+      step_endurance: the endurance.Endurance of the step, None if its writes
+        weren't accounted.
+    Returns:
+      The failed target, None if it passed or there's none. An unknown write
+      amplification fails the target.
+    """
+    if self._waf_max is None:
+      return None
+    waf = step_endurance.waf if step_endurance else None
+    if waf is None or waf > self._waf_max:
+      return FailedWorkload(self._io_type, self._workload_num, [_WAF_MAX])
+    return None
+
+  def _is_single_io_type(self, job):
+    # fio measures the steady state over all the IO types of a job
+    return not any(
+        stats.io_bytes for io_type, stats in job.io_stats.items()
+        if io_type != self._io_type)
+
+  def _evaluate_timeseries(self, job_log):
+    """Returns the time series targets the fio logs of the job don't meet.
+
+    A job without fio logs, e.g. run without --log_avg_msec, fails all of them
+    since they can't be measured.
+    """
+    if not job_log:
+      return [target[0] for target in self._timeseries_targets]
+    failed_metrics = []
+    for name, log_type, metric, is_min, expected_value in (
+        self._timeseries_targets):
+      series = job_log.get(log_type, {}).get(self._io_type)
+      if series is None:
+        failed_metrics.append(name)
+        continue
+      actual_value = getattr(series, metric)()
+      if (actual_value < expected_value if is_min
+          else actual_value > expected_value):
+        failed_metrics.append(name)
+    return failed_metrics
+
+
+class _LatencyTargets:
+  """Targets of a single fio latency section evaluated on its histogram.
+
+  Percentiles and tail fractions are computed for all the targets of the
+  section at once.
+  """
+
+  def __init__(self, section, targets):
+    self._section = section
+    self._stats = []
+    percentiles = []
+    fractions = []
+    for name, kind, value in targets:
+      if kind in _LATENCY_STATS:
+        self._stats.append(
+            (name, _LATENCY_STATS[kind], _to_nanosec(int(value))))
+      elif kind == _FRACTION_ABOVE:
+        fractions.append((name, _to_nanosec(int(value[_THRESHOLD_USEC])),
+                          float(value[_MAX_FRACTION])))
+      else:
+        percentiles.append(
+            (name, _to_percentile(kind[:-len("th")]), _to_nanosec(int(value))))
+    self._percentile_names = np.array([t[0] for t in percentiles], dtype=object)
+    self._percentiles = np.array([t[1] for t in percentiles], dtype=np.float64)
+    self._percentile_limits = np.array([t[2] for t in percentiles])
+    self._fraction_names = np.array([t[0] for t in fractions], dtype=object)
+    self._thresholds = np.array([t[1] for t in fractions])
+    self._max_fractions = np.array([t[2] for t in fractions], dtype=np.float64)
+
+  def evaluate(self, io_stats):
+    """Returns the names of the targets the io stats don't meet."""
+    latency_stats = io_stats.latencies[self._section]
+    failed_metrics = [
+        name for name, stat, limit in self._stats
+        if getattr(latency_stats, stat) > limit
+    ]
+    if not self._percentiles.size and not self._thresholds.size:
+      return failed_metrics
+    latency_histogram = latency_stats.get_histogram()
+    if self._percentiles.size:
+      actual = latency_histogram.percentiles(self._percentiles)
+      failed_metrics.extend(
+          self._percentile_names[actual > self._percentile_limits])
+    if self._thresholds.size:
+      actual = latency_histogram.fraction_above(self._thresholds)
+      failed_metrics.extend(self._fraction_names[actual > self._max_fractions])
+    return failed_metrics
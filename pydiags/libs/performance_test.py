@@ -6,7 +6,12 @@
 
 import unittest
 
-import performance
+from . import endurance
+from . import performance
+from . import playbook
+from . import results
+from . import sweep
+from . import timeseries
 
 
 _TARGET_NUMBERS =  {
@@ -212,6 +217,24 @@ _FIO_JSON_OUTPUT = {
 }]}
 
 
+_FIO_JSON_PLUS_OUTPUT = {
+    'jobs': [{
+        'jobname': 'iops_rand_rdwr_4kb_bs_256_qd',
+        'read': {
+            'bw': 1000,
+            'clat_ns': {'max': 100000,
+                        'mean': 1500,
+                        'percentile': {'99.000000': 2000},
+                        'bins': {'1000': 900, '2000': 90, '5000': 9,
+                                 '100000': 1}},
+            'slat_ns': {'max': 3000, 'mean': 500},
+            'lat_ns': {'max': 103000,
+                       'mean': 2000,
+                       'bins': {'2000': 990, '8000': 10}},
+        },
+    }]
+}
+
 
 class WorkloadTest(unittest.TestCase):
 
@@ -233,6 +256,88 @@ class WorkloadTest(unittest.TestCase):
     self.assertIsNotNone(result)
     self.assertEqual(sorted(failed_metrics), sorted(result.failed_metrics))
 
+  def test_Workload_evaluate_json_plus_targets(self):
+    workload = performance.Workload({
+        'ioType': 'randread',
+        'targets': {
+            'lat9999thUsec': '100',
+            'lat99999thUsec': '50',
+            'latMaxUsec': '150',
+            'latFracAboveUsec': {'thresholdUsec': '4', 'maxFraction': '0.001'},
+            'slatMaxUsec': '2',
+            'totalLat999thUsec': '10',
+            'totalLatFracAboveUsec': {'thresholdUsec': '5',
+                                      'maxFraction': '0.001'},
+        },
+        'workloadNum': 1
+    })
+    result = workload.evaluate(_FIO_JSON_PLUS_OUTPUT)
+    self.assertIsNotNone(result)
+    self.assertEqual(
+        sorted(['lat99999thUsec', 'latFracAboveUsec', 'slatMaxUsec',
+                'totalLatFracAboveUsec']),
+        sorted(result.failed_metrics))
+
+  def test_Workload_unsupported_target(self):
+    with self.assertRaises(KeyError):
+      performance.Workload({
+          'ioType': 'randread',
+          'targets': {'lat99thMsec': '1'},
+          'workloadNum': 1
+      })
+
+  def test_Workload_malformed_percentile(self):
+    for target in ('lat100thUsec', 'lat5thUsec', 'lat00thUsec',
+                   'slat9990thUsec', 'iopsAtLat100thUsec'):
+      with self.assertRaisesRegex(ValueError, 'percentile'):
+        performance.Workload({
+            'ioType': 'randread',
+            'targets': {target: {'maxLatencyUsec': 500, 'minIops': 1}
+                        if target.startswith('iops') else '1'},
+            'workloadNum': 1
+        })
+    self.assertEqual(performance._to_percentile('905'), 90.5)
+    self.assertEqual(performance._to_percentile('01'), 1)
+
+  def test_Workload_evaluate_timeseries_targets(self):
+    workload = performance.Workload({
+        'ioType': 'randread',
+        'targets': {
+            'bwMinWindowMbytesPerSec': '1',
+            'bwMaxDropPercent': '30',
+            'iopsCovPercent': '10',
+        },
+        'workloadNum': 1
+    })
+    bw = timeseries.TimeSeries(
+        [1000, 6000, 11000], [2048, 1024, 1024])
+    job_logs = [{'bw': {'read': bw}}]
+    result = workload.evaluate(_FIO_JSON_PLUS_OUTPUT, job_logs)
+    self.assertEqual(
+        sorted(['bwMaxDropPercent', 'iopsCovPercent']),
+        sorted(result.failed_metrics))
+    # the targets can't be measured without fio logs
+    result = workload.evaluate(_FIO_JSON_PLUS_OUTPUT)
+    self.assertEqual(
+        sorted(['bwMaxDropPercent', 'bwMinWindowMbytesPerSec',
+                'iopsCovPercent']),
+        sorted(result.failed_metrics))
+
+  def test_Workload_evaluate_steady_state_bandwidth(self):
+    workload = performance.Workload({
+        'ioType': 'randread',
+        'targets': {'bwMbytesPerSec': '2'},
+        'workloadNum': 1
+    })
+    # 1000 KiB/s over the whole run, 3 MiB/s once the drive settled
+    fio_output = {'jobs': [dict(_FIO_JSON_PLUS_OUTPUT['jobs'][0])]}
+    fio_output['jobs'][0]['read'] = dict(
+        fio_output['jobs'][0]['read'], io_bytes=1024)
+    self.assertIsNotNone(workload.evaluate(fio_output))
+    fio_output['jobs'][0]['steadystate'] = {
+        'attained': 1, 'data': {'bw_mean': 3 * 1024 * 1024}}
+    self.assertIsNone(workload.evaluate(fio_output))
+
 class BenchmarkTest(unittest.TestCase):
 
   def test_benchmark_evaluate_multiple_reachable_perf_targets(self):
@@ -250,5 +355,179 @@ class BenchmarkTest(unittest.TestCase):
     for failed_workload in result.failed_workloads:
       self.assertEqual(sorted(failed_metrics), sorted(failed_workload.failed_metrics))
 
+def _job(name, bw, bins):
+  return {
+      'jobname': name,
+      'error': 0,
+      'read': {
+          'bw': bw,
+          'io_bytes': bw * 1024,
+          'runtime': 1000,
+          'clat_ns': {'N': sum(bins.values()),
+                      'min': 1000,
+                      'max': 5000,
+                      'mean': 2000,
+                      'percentile': {'99.000000': 0},
+                      'bins': bins},
+      },
+  }
+
+_MULTI_JOB_OUTPUT = {
+    'jobs': [
+        _job('rand_rd', 1024, {'1000': 99, '5000': 1}),
+        _job('rand_rd', 2048, {'1000': 100}),
+        _job('other', 10, {'1000': 100}),
+    ]
+}
+
+_MULTI_STEP_TARGETS = {
+    'benchmarks': [{
+        'basename': 'Group',
+        'step': 'rand_rd.fio',
+        'jobName': 'rand_rd',
+        'aggregate': True,
+        'workloads': [{
+            'ioType': 'randread',
+            'targets': {'bwMbytesPerSec': '3', 'lat99thUsec': '2'},
+            'workloadNum': 1
+        }]
+    }, {
+        'basename': 'EveryJob',
+        'step': 'rand_rd.fio',
+        'workloads': [{
+            'ioType': 'randread',
+            'targets': {'bwMbytesPerSec': '1'},
+            'workloadNum': 2
+        }]
+    }]
+}
+
+
+def _step(name, fio_output):
+  return results.StepResult.from_fio(name, fio_output)
+
+
+def _jobs(fio_output):
+  return _step('', fio_output).jobs
+
+
+class AggregateJobsTest(unittest.TestCase):
+
+  def test_aggregate_jobs(self):
+    merged, merged_logs = performance.aggregate_jobs(
+        _jobs(_MULTI_JOB_OUTPUT)[:2])
+    self.assertIsNone(merged_logs)
+    self.assertEqual(merged.io_stats['read'].bw, 3072)
+    clat = merged.io_stats['read'].latencies['clat_ns']
+    self.assertEqual(clat.count, 200)
+    self.assertEqual(clat.histogram.to_fio(), {'1000': 199, '5000': 1})
+    self.assertEqual(clat.percentiles, {'99.000000': 1000})
+
+  def test_aggregate_job_logs(self):
+    job_logs = [
+        {'bw': {'read': timeseries.TimeSeries([0, 5000], [10, 20])}},
+        {'bw': {'read': timeseries.TimeSeries([1000, 6000], [30, 30])}},
+    ]
+    _, merged_logs = performance.aggregate_jobs(
+        _jobs(_MULTI_JOB_OUTPUT)[:2], job_logs)
+    self.assertEqual(list(merged_logs['bw']['read'].values), [40, 50])
+
+
+class BenchmarkSuiteTest(unittest.TestCase):
+
+  def test_legacy_target_file_applies_to_first_step(self):
+    suite = performance.BenchmarkSuite(
+        _UNREACHABLE_TARGET_NUMBERS['layers'][0]['microbenchmarks'][0])
+    failed = suite.evaluate([_step('first.fio', _FIO_JSON_OUTPUT),
+                             _step('second.fio', _FIO_JSON_OUTPUT)])
+    self.assertEqual(len(failed), 1)
+    self.assertEqual(failed[0].step, 'first.fio')
+
+  def test_benchmarks_mapped_to_steps_and_jobs(self):
+    suite = performance.BenchmarkSuite(_MULTI_STEP_TARGETS)
+    failed_results = suite.evaluate_all({
+        'nvme0n1': [_step('seq_wr.fio', _FIO_JSON_OUTPUT),
+                    _step('rand_rd.fio', _MULTI_JOB_OUTPUT)],
+        'nvme1n1': [_step('seq_wr.fio', _FIO_JSON_OUTPUT)],
+    })
+    self.assertEqual(failed_results['nvme1n1'], [])
+    failed = {result.name: result for result in failed_results['nvme0n1']}
+    self.assertEqual(sorted(failed), ['EveryJob'])
+    self.assertEqual(failed['EveryJob'].step, 'rand_rd.fio')
+    self.assertEqual(
+        [workload.job_name
+         for workload in failed['EveryJob'].failed_workloads], ['other'])
+
+  def test_sweep_targets_evaluated_on_knee(self):
+    benchmark = performance.Benchmark({
+        'basename': 'Sweep',
+        'workloads': [{
+            'ioType': 'randread',
+            'targets': {'iopsAtLat999thUsec': {'maxLatencyUsec': 500,
+                                               'minIops': 50000}},
+            'workloadNum': 1,
+        }],
+    })
+    points = []
+    for iodepth, iops, p999_usec in ((1, 20000, 100), (32, 60000, 400),
+                                     (256, 150000, 3000)):
+      point = sweep.SweepPoint(iodepth, 1)
+      point.jobs = _jobs({'jobs': [{
+          'jobname': 'rand_rd',
+          'read': {'iops': iops, 'io_bytes': 1024,
+                   'clat_ns': {'N': 1000, 'bins': {
+                       '10000': 990, str(p999_usec * 1000): 10}}},
+      }]})
+      points.append(point)
+    step_result = sweep.step_result(
+        'rand_rd.fio', playbook.Sweep(iodepth=[1, 32, 256]), points)
+    self.assertEqual(benchmark.evaluate(step_result).failed_workloads, [])
+    step_result.sweep = points[::2]
+    self.assertEqual(
+        benchmark.evaluate(step_result).failed_workloads[0].failed_metrics,
+        ['iopsAtLat999thUsec'])
+    # the step wasn't swept
+    step_result.sweep = None
+    self.assertEqual(len(benchmark.evaluate(step_result).failed_workloads), 1)
+
+  def test_timeseries_target_without_fio_logs(self):
+    suite = performance.BenchmarkSuite({
+        'basename': 'Window',
+        'workloads': [{
+            'ioType': 'randread',
+            'targets': {'bwMinWindowMbytesPerSec': '1'},
+            'workloadNum': 1,
+        }],
+    })
+    # e.g. a step run without --log_avg_msec
+    step_result = results.StepResult.from_fio(
+        'iops_rand_rd.fio', _FIO_JSON_PLUS_OUTPUT)
+    failed = suite.evaluate([step_result])
+    self.assertEqual(failed[0].failed_workloads[0].failed_metrics,
+                     ['bwMinWindowMbytesPerSec'])
+
+  def test_waf_target(self):
+    benchmark = performance.Benchmark({
+        'basename': 'Endurance',
+        'workloads': [{
+            'ioType': 'randwrite',
+            'targets': {'wafMax': 2.5},
+            'workloadNum': 1,
+        }],
+    })
+    step_result = results.StepResult.from_fio('mixed.fio', {'jobs': [{
+        'jobname': 'mixed', 'write': {'io_bytes': 1 << 20,
+                                      'clat_ns': {'N': 0}}}]})
+    step_result.endurance = endurance.Endurance(1 << 20, 1 << 20, 2 << 20)
+    self.assertEqual(benchmark.evaluate(step_result).failed_workloads, [])
+    step_result.endurance.nand_bytes = 3 << 20
+    self.assertEqual(
+        benchmark.evaluate(step_result).failed_workloads[0].failed_metrics,
+        ['wafMax'])
+    # the NAND writes of the DUT are unknown
+    step_result.endurance.nand_bytes = None
+    self.assertEqual(len(benchmark.evaluate(step_result).failed_workloads), 1)
+
+
 if __name__ == '__main__':
   unittest.main()
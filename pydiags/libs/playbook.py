@@ -0,0 +1,258 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Parsing of the test steps declared in a playbook."""
+import re
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from . import engine as engine_lib
+from . import operations
+from . import verify as verify_lib
+
+_CONFIG = "config"
+_STEADY_STATE = "steady_state"
+_SHARDS = "shards"
+_SWEEP = "sweep"
+_ENGINE = "engine"
+_COMPARE_ENGINES = "compare_engines"
+_RESET = "reset"
+_VERIFY = "verify"
+_STEP_SETTINGS = (_CONFIG, _STEADY_STATE, _SHARDS, _SWEEP, _ENGINE,
+                  _COMPARE_ENGINES, _RESET, _VERIFY)
+AUTO_SHARDS = "auto"
+_STEADY_STATE_METRICS = ("iops", "bw", "iops_slope", "bw_slope")
+_PATTERNS = ("random", "zeros")
+_HEX_PATTERN = re.compile(r"^0x[0-9a-fA-F]+$")
+# what a step or a precondition of the wrong shape raises: a missing config,
+# an unknown setting or a value of the wrong type
+_MALFORMED = (KeyError, TypeError, ValueError, AttributeError)
+
+
+@dataclass
+class SteadyState:
+  """fio steady state detection ending a step once performance settles.
+
+  The step ends as soon as the metric stays within the tolerance for the whole
+  duration, runtime of the fio config is the upper bound.
+  """
+  metric: str = "iops"
+  tolerance: str = "2%"
+  duration: str = "60s"
+  ramp_time: str = "0s"
+
+  def __post_init__(self):
+    if self.metric not in _STEADY_STATE_METRICS:
+      raise ValueError("unsupported steady state metric: %s" % self.metric)
+
+  def fio_options(self) -> list[str]:
+    return [
+        "--steadystate=%s:%s" % (self.metric, self.tolerance),
+        "--steadystate_duration=%s" % self.duration,
+        "--steadystate_ramp_time=%s" % self.ramp_time,
+    ]
+
+
+@dataclass
+class Sweep:
+  """Grid of fio runs mapping the latency-throughput curve of a step.
+
+  Every combination of iodepth, numjobs and, if given, rate_iops is a fio run
+  of its own. rate_iops is per job and makes the run open-loop with poisson
+  arrivals. The knee of the curve is the highest IOPS at which the
+  sla_percentile of the completion latency stays within sla_latency_usec.
+  """
+  iodepth: list[int] = field(default_factory=lambda: [1])
+  numjobs: list[int] = field(default_factory=lambda: [1])
+  rate_iops: list[int] = field(default_factory=list)
+  sla_percentile: float = 99.9
+  sla_latency_usec: Optional[float] = None
+
+  def __post_init__(self):
+    for name in ("iodepth", "numjobs", "rate_iops"):
+      values = getattr(self, name)
+      if not isinstance(values, list) or any(
+          not isinstance(value, int) or value < 1 for value in values):
+        raise ValueError("sweep %s must be a list of positive numbers: %s" % (
+            name, values))
+    if not self.iodepth or not self.numjobs:
+      raise ValueError("sweep needs at least one iodepth and numjobs")
+    if not 0 < self.sla_percentile < 100:
+      raise ValueError("invalid sweep SLA percentile: %s" % self.sla_percentile)
+
+
+@dataclass
+class Precondition:
+  """Filling of every DUT to a target fullness before the first step.
+
+  fill_percent of the device is written once, sequentially or in random order
+  with random must be set, by shards jobs each filling its own region. The
+  data is random (incompressible), zeros or a hex pattern such as 0xdeadbeef.
+  Random 4k writes over the filled part then run until steady_state is
+  reached, max_runtime at most, unless it is null.
+  """
+  fill_percent: int = 100
+  pattern: str = "random"
+  random: bool = False
+  block_size: str = "128k"
+  iodepth: int = 32
+  shards: Union[int, str] = AUTO_SHARDS
+  steady_state: Optional[SteadyState] = field(default_factory=SteadyState)
+  max_runtime: str = "2h"
+
+  def __post_init__(self):
+    if not isinstance(self.fill_percent, int) or not (
+        0 < self.fill_percent <= 100):
+      raise ValueError("precondition fill_percent must be within 1-100: %s" %
+                       self.fill_percent)
+    if self.pattern not in _PATTERNS and not _HEX_PATTERN.match(self.pattern):
+      raise ValueError("unsupported precondition pattern: %s" % self.pattern)
+    if not isinstance(self.iodepth, int) or self.iodepth < 1:
+      raise ValueError("precondition iodepth must be positive: %s" %
+                       self.iodepth)
+    if self.shards != AUTO_SHARDS and (
+        not isinstance(self.shards, int) or self.shards < 1):
+      raise ValueError("shards must be a positive number or %s: %s" % (
+          AUTO_SHARDS, self.shards))
+
+
+@dataclass
+class Step:
+  """A single test step, a fio config and the way to run it.
+
+  With shards set every job of the config is split into that many regions of
+  the device, each written by its own job, "auto" picks the number of regions
+  from the CPU count and the DUT size.
+
+  With sweep set the step is run once for every point of the sweep grid.
+
+  engine replaces the ioengine of the config, compare_engines runs the config
+  once with every engine listed instead.
+
+  reset brings the DUT to a known state through its driver before the step,
+  one of operations.RESET_METHODS.
+
+  verify replaces the verify method of the jobs verifying data, "fastest"
+  picks the fastest integrity-grade checksum of the host.
+  """
+  config: str
+  steady_state: Optional[SteadyState] = None
+  shards: Optional[Union[int, str]] = None
+  sweep: Optional[Sweep] = None
+  engine: Optional[str] = None
+  compare_engines: list[str] = field(default_factory=list)
+  reset: Optional[str] = None
+  verify: Optional[str] = None
+
+  def __post_init__(self):
+    if self.sweep and self.shards is not None:
+      raise ValueError("a step can't be both sharded and swept: %s" %
+                       self.config)
+    if self.sweep and self.compare_engines:
+      raise ValueError("a step can't both sweep and compare engines: %s" %
+                       self.config)
+    if self.engine is not None and self.engine not in (
+        engine_lib.ENGINES + (engine_lib.AUTO,)):
+      raise ValueError("unsupported engine: %s" % self.engine)
+    if self.compare_engines and (
+        len(set(self.compare_engines)) < 2 or
+        not set(self.compare_engines) <= set(engine_lib.ENGINES)):
+      raise ValueError("compare_engines needs at least two of %s: %s" % (
+          ", ".join(engine_lib.ENGINES), self.compare_engines))
+    if self.reset is not None and self.reset not in operations.RESET_METHODS:
+      raise ValueError("unsupported reset: %s" % self.reset)
+    if self.verify is not None:
+      validate_verify(self.verify)
+    if self.shards is None or self.shards == AUTO_SHARDS:
+      return
+    if not isinstance(self.shards, int) or self.shards < 1:
+      raise ValueError("shards must be a positive number or %s: %s" % (
+          AUTO_SHARDS, self.shards))
+
+  @property
+  def name(self) -> str:
+    return self.config
+
+  def fio_options(self) -> list[str]:
+    """Returns fio options implementing the step declaration."""
+    options = []
+    if self.steady_state:
+      options.extend(self.steady_state.fio_options())
+    return options
+
+
+def parse_step(descriptor) -> Step:
+  """Parses a test step.
+
+  Args:
+    descriptor: either the fio config name or an object with the "config" and
+    optional step settings such as "steady_state", "shards", "sweep",
+    "engine", "compare_engines", "reset" and "verify".
+  Returns:
+    The parsed step.
+  Raises:
+    KeyError: the step has no config.
+    ValueError: a setting is unknown, e.g. misspelled, or invalid.
+  """
+  if isinstance(descriptor, str):
+    return Step(descriptor)
+  unknown = set(descriptor) - set(_STEP_SETTINGS)
+  if unknown:
+    raise ValueError("unknown step settings: %s" % ", ".join(sorted(unknown)))
+  steady_state = descriptor.get(_STEADY_STATE)
+  sweep = descriptor.get(_SWEEP)
+  return Step(
+      descriptor[_CONFIG],
+      steady_state=(
+          SteadyState(**steady_state) if steady_state is not None else None),
+      shards=descriptor.get(_SHARDS),
+      sweep=Sweep(**sweep) if sweep is not None else None,
+      engine=descriptor.get(_ENGINE),
+      compare_engines=list(descriptor.get(_COMPARE_ENGINES, [])),
+      reset=descriptor.get(_RESET),
+      verify=descriptor.get(_VERIFY))
+
+
+def validate_verify(method):
+  """Checks the verify method of a step or of the playbook.
+
+  Raises:
+    ValueError: the method is neither a fio verify method nor "fastest".
+  """
+  if method not in verify_lib.METHODS + (verify_lib.FASTEST,):
+    raise ValueError("unsupported verify: %s" % method)
+
+
+def parse_steps(descriptors) -> list[Step]:
+  """Parses the "test_steps" of a playbook.
+
+  Raises:
+    ValueError: a step is malformed, named by its index in the playbook.
+  """
+  steps = []
+  for index, descriptor in enumerate(descriptors):
+    try:
+      steps.append(parse_step(descriptor))
+    except _MALFORMED as e:
+      raise ValueError("test step %d: %r" % (index, e)) from e
+  return steps
+
+
+def parse_precondition(descriptor) -> Optional[Precondition]:
+  """Parses the "precondition" of a playbook, None if it has none.
+
+  Raises:
+    ValueError: the precondition is malformed.
+  """
+  if descriptor is None:
+    return None
+  try:
+    settings = dict(descriptor)
+    if settings.get(_STEADY_STATE) is not None:
+      settings[_STEADY_STATE] = SteadyState(**settings[_STEADY_STATE])
+    return Precondition(**settings)
+  except _MALFORMED as e:
+    raise ValueError("precondition: %r" % e) from e
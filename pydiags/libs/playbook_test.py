@@ -0,0 +1,120 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import unittest
+
+from . import playbook
+
+
+class PlaybookTest(unittest.TestCase):
+
+  def test_parse_plain_step(self):
+    step = playbook.parse_step("iops_rand_rd_4kb_bs_256_qd.fio")
+    self.assertEqual(step.name, "iops_rand_rd_4kb_bs_256_qd.fio")
+    self.assertIsNone(step.steady_state)
+    self.assertEqual(step.fio_options(), [])
+
+  def test_parse_steady_state_step(self):
+    steps = playbook.parse_steps([
+        "bandwidth_logical_writes-seq_wr_128kbs.fio",
+        {
+            "config": "iops_rand_rd_4kb_bs_256_qd.fio",
+            "steady_state": {"tolerance": "5%", "duration": "30s"},
+        },
+    ])
+    self.assertEqual(len(steps), 2)
+    self.assertEqual(steps[1].config, "iops_rand_rd_4kb_bs_256_qd.fio")
+    self.assertEqual(steps[1].fio_options(), [
+        "--steadystate=iops:5%",
+        "--steadystate_duration=30s",
+        "--steadystate_ramp_time=0s",
+    ])
+
+  def test_parse_unsupported_steady_state_metric(self):
+    with self.assertRaises(ValueError):
+      playbook.parse_step({"config": "a.fio", "steady_state": {"metric": "x"}})
+
+  def test_parse_sharded_step(self):
+    steps = playbook.parse_steps([
+        {"config": "a.fio", "shards": 8},
+        {"config": "b.fio", "shards": "auto"},
+    ])
+    self.assertEqual(steps[0].shards, 8)
+    self.assertEqual(steps[1].shards, playbook.AUTO_SHARDS)
+    self.assertEqual(steps[0].fio_options(), [])
+    for shards in (0, "many"):
+      with self.assertRaises(ValueError):
+        playbook.parse_step({"config": "a.fio", "shards": shards})
+
+  def test_parse_sweep_step(self):
+    step = playbook.parse_step({
+        "config": "iops_rand_rd_4kb_bs_256_qd.fio",
+        "sweep": {"iodepth": [1, 32, 256], "numjobs": [1, 4],
+                  "sla_latency_usec": 500},
+    })
+    self.assertEqual(step.sweep.iodepth, [1, 32, 256])
+    self.assertEqual(step.sweep.rate_iops, [])
+    self.assertEqual(step.sweep.sla_percentile, 99.9)
+    for sweep in ({"iodepth": []}, {"numjobs": [0]}, {"iodepth": 32},
+                  {"sla_percentile": 100}):
+      with self.assertRaises(ValueError):
+        playbook.parse_step({"config": "a.fio", "sweep": sweep})
+    with self.assertRaises(ValueError):
+      playbook.parse_step({"config": "a.fio", "sweep": {}, "shards": 2})
+
+  def test_parse_engine_step(self):
+    steps = playbook.parse_steps([
+        {"config": "a.fio", "engine": "io_uring"},
+        {"config": "b.fio", "compare_engines": ["libaio", "io_uring_sqpoll"]},
+    ])
+    self.assertEqual(steps[0].engine, "io_uring")
+    self.assertEqual(steps[1].compare_engines, ["libaio", "io_uring_sqpoll"])
+    for step in ({"engine": "sync"}, {"compare_engines": ["libaio"]},
+                 {"compare_engines": ["libaio", "auto"]},
+                 {"compare_engines": ["libaio", "io_uring"],
+                  "sweep": {"iodepth": [1]}}):
+      with self.assertRaises(ValueError):
+        playbook.parse_step({"config": "a.fio", **step})
+
+  def test_parse_reset_step(self):
+    step = playbook.parse_step({"config": "a.fio", "reset": "discard"})
+    self.assertEqual(step.reset, "discard")
+    self.assertIsNone(playbook.parse_step("a.fio").reset)
+    with self.assertRaises(ValueError):
+      playbook.parse_step({"config": "a.fio", "reset": "trim"})
+
+  def test_parse_verify_step(self):
+    step = playbook.parse_step({"config": "a.fio", "verify": "fastest"})
+    self.assertEqual(step.verify, "fastest")
+    playbook.validate_verify("crc32c")
+    with self.assertRaises(ValueError):
+      playbook.parse_step({"config": "a.fio", "verify": "crc33"})
+
+  def test_parse_precondition(self):
+    self.assertIsNone(playbook.parse_precondition(None))
+    settings = playbook.parse_precondition({
+        "fill_percent": 50, "pattern": "0xdeadbeef", "random": True,
+        "steady_state": {"metric": "iops_slope", "tolerance": "0.3%"}})
+    self.assertEqual(settings.fill_percent, 50)
+    self.assertEqual(settings.steady_state.metric, "iops_slope")
+    self.assertEqual(settings.shards, playbook.AUTO_SHARDS)
+    self.assertIsNone(playbook.parse_precondition(
+        {"steady_state": None}).steady_state)
+    for descriptor in ({"fill_percent": 0}, {"fill_percent": 101},
+                       {"pattern": "ones"}, {"iodepth": 0}, {"shards": 0}):
+      with self.assertRaises(ValueError):
+        playbook.parse_precondition(descriptor)
+    with self.assertRaisesRegex(ValueError, "precondition: .*fill"):
+      playbook.parse_precondition({"fill": 50})
+
+  def test_parse_malformed_steps(self):
+    for descriptor in ({"steady_state": {}}, {"config": "a.fio", "shard": 2},
+                       {"config": "a.fio", "sweep": [1, 2]}, 7):
+      with self.assertRaisesRegex(ValueError, "^test step 1: "):
+        playbook.parse_steps(["a.fio", descriptor])
+
+if __name__ == "__main__":
+  unittest.main()
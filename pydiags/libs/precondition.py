@@ -0,0 +1,146 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Preconditioning of a DUT to a target fullness before the measured steps.
+
+The fill is a single fio job cloned into regions of the device, like a
+sharded step, so a fast drive is filled at full speed. A stonewalled job of
+random writes over the filled part then runs until fio detects steady state.
+What was done is recorded in the log dir of the DUT, results of runs are only
+comparable if their preconditioning records match.
+"""
+import dataclasses
+import json
+import os
+import time
+from typing import Optional
+
+from . import fiojob
+from . import performance
+from . import shard
+
+FILENAME = "precondition.json"
+CONFIG = "precondition.fio"
+FILL_JOB = "precondition_fill"
+STEADY_JOB = "precondition_steady"
+_STEADY_BLOCK_SIZE = "4k"
+
+
+def step_name(settings) -> str:
+  """Returns the name the preconditioning is reported and stored under."""
+  return "precondition_%dpct_%s_%s" % (
+      settings.fill_percent, settings.pattern,
+      "rand" if settings.random else "seq")
+
+
+def _pattern_options(pattern) -> dict:
+  if pattern == "random":
+    # fresh random data for every write, nothing the drive can compress
+    return {"refill_buffers": None}
+  if pattern == "zeros":
+    return {"zero_buffers": None}
+  return {"buffer_pattern": pattern}
+
+
+def sections(settings, capacity, shards) -> list[fiojob.Section]:
+  """Returns the fio job file preconditioning a DUT.
+
+  Args:
+    settings: preconditioning of the playbook.
+    capacity: DUT size in bytes, None if unknown.
+    shards: number of regions filled at once, a single one when the
+      capacity is unknown.
+  Returns:
+    The fill job and, if the steady state is confirmed, the random write job
+    following it.
+  """
+  common = {"ioengine": "libaio", "direct": "1",
+            "iodepth": str(settings.iodepth)}
+  common.update(_pattern_options(settings.pattern))
+  if capacity is None:
+    # fio sizes the job from the device itself
+    fill_size = "%d%%" % settings.fill_percent
+    region_options = {"size": fill_size}
+  else:
+    fill_size = str(fill_bytes(settings, capacity))
+    region_options = shard.job_options(
+        shards, shard.shard_size(int(fill_size), shards))
+  fill = fiojob.Section(FILL_JOB, dict(
+      common, rw="randwrite" if settings.random else "write",
+      bs=settings.block_size, **region_options))
+  job_sections = [fill]
+  if settings.steady_state is not None:
+    steady_state = settings.steady_state
+    job_sections.append(fiojob.Section(STEADY_JOB, dict(
+        common, stonewall=None, new_group=None, rw="randwrite",
+        bs=_STEADY_BLOCK_SIZE, size=fill_size, time_based=None,
+        runtime=settings.max_runtime,
+        steadystate="%s:%s" % (steady_state.metric, steady_state.tolerance),
+        steadystate_duration=steady_state.duration,
+        steadystate_ramp_time=steady_state.ramp_time)))
+  return job_sections
+
+
+def fill_bytes(settings, capacity) -> int:
+  """Returns the bytes to fill, in whole MiB."""
+  return capacity * settings.fill_percent // 100 // shard.ALIGN_BYTES * (
+      shard.ALIGN_BYTES)
+
+
+@dataclasses.dataclass
+class Record:
+  """What was done to precondition a DUT.
+
+  Attributes:
+    settings: preconditioning of the playbook.
+    config: the fio job file run.
+    capacity: DUT size in bytes, None if unknown.
+    shards: number of regions filled at once.
+    started: when the preconditioning started, seconds since the epoch.
+    duration_sec: how long it took.
+    bytes_written: bytes written by the fill.
+    fill_bw: bandwidth of the fill in KiB/s.
+    steady_state_attained: whether the random writes reached steady state,
+      None if it wasn't confirmed.
+    steady_state_iops: IOPS of the steady state window.
+  """
+  settings: dict
+  config: str
+  capacity: Optional[int]
+  shards: int
+  started: float = 0
+  duration_sec: float = 0
+  bytes_written: int = 0
+  fill_bw: float = 0
+  steady_state_attained: Optional[bool] = None
+  steady_state_iops: Optional[float] = None
+
+  def summarize(self, step_result):
+    """Fills in the results of the preconditioning fio run."""
+    self.duration_sec = time.time() - self.started
+    fill = [job for job in step_result.jobs if job.name == FILL_JOB]
+    if fill:
+      job, _ = performance.aggregate_jobs(fill)
+      write = job.io_stats.get("write")
+      if write:
+        self.bytes_written = write.io_bytes
+        self.fill_bw = write.bw
+    steady = [job for job in step_result.jobs if job.name == STEADY_JOB]
+    if steady:
+      self.steady_state_attained = bool(steady[0].steady_state_attained)
+      self.steady_state_iops = steady[0].steady_state_iops
+
+  def save(self, path):
+    with open(path, "w") as f:
+      json.dump(dataclasses.asdict(self), f, indent=2)
+
+  @classmethod
+  def load(cls, path) -> Optional["Record"]:
+    """Reads a record back, None if there's none."""
+    if not os.path.exists(path):
+      return None
+    with open(path) as f:
+      return cls(**json.load(f))
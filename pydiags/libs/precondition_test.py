@@ -0,0 +1,81 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import tempfile
+import unittest
+
+from . import fiojob
+from . import playbook
+from . import precondition
+from . import results
+
+_GIB = 1 << 30
+
+
+class PreconditionTest(unittest.TestCase):
+
+  def test_sections(self):
+    settings = playbook.Precondition(fill_percent=50, random=True)
+    fill, steady = precondition.sections(settings, 1000 * _GIB, 4)
+    self.assertEqual(fill.name, precondition.FILL_JOB)
+    self.assertEqual(fill.get("rw"), "randwrite")
+    self.assertEqual(fill.get("numjobs"), "4")
+    region = int(fill.get("size"))
+    self.assertEqual(region, int(fill.get("offset_increment")))
+    self.assertLessEqual(4 * region, 500 * _GIB)
+    self.assertGreater(4 * region, 499 * _GIB)
+    self.assertTrue(fiojob.is_set(fill, "refill_buffers"))
+    self.assertTrue(fiojob.is_set(steady, "stonewall"))
+    self.assertEqual(steady.get("size"), str(500 * _GIB))
+    self.assertEqual(steady.get("steadystate"), "iops:2%")
+    self.assertEqual(steady.get("runtime"), "2h")
+
+  def test_sections_of_unknown_capacity(self):
+    settings = playbook.Precondition(fill_percent=75, pattern="0xdeadbeef",
+                                     steady_state=None)
+    job_sections = precondition.sections(settings, None, 1)
+    self.assertEqual(len(job_sections), 1)
+    self.assertEqual(job_sections[0].get("size"), "75%")
+    self.assertEqual(job_sections[0].get("rw"), "write")
+    self.assertEqual(job_sections[0].get("buffer_pattern"), "0xdeadbeef")
+    # the job file is valid
+    self.assertEqual(
+        fiojob.parse(fiojob.dumps(job_sections))[0].options,
+        job_sections[0].options)
+
+  def test_record(self):
+    settings = playbook.Precondition(fill_percent=25, pattern="zeros")
+    record = precondition.Record(
+        {"fill_percent": 25}, "[precondition_fill]\n", 4 * _GIB, 2,
+        started=1)
+    record.summarize(results.StepResult.from_fio(
+        precondition.step_name(settings), {"jobs": [
+            {"jobname": precondition.FILL_JOB, "write": {
+                "io_bytes": _GIB / 2, "bw": 1000}},
+            {"jobname": precondition.FILL_JOB, "write": {
+                "io_bytes": _GIB / 2, "bw": 1000}},
+            {"jobname": precondition.STEADY_JOB, "write": {"io_bytes": 1},
+             "steadystate": {"attained": 1, "data": {
+                 "bw_mean": 4096, "iops_mean": 1000}}},
+        ]}))
+    self.assertEqual(record.bytes_written, _GIB)
+    self.assertEqual(record.fill_bw, 2000)
+    self.assertTrue(record.steady_state_attained)
+    self.assertEqual(record.steady_state_iops, 1000)
+    with tempfile.TemporaryDirectory() as log_dir:
+      path = os.path.join(log_dir, precondition.FILENAME)
+      self.assertIsNone(precondition.Record.load(path))
+      record.save(path)
+      self.assertEqual(precondition.Record.load(path), record)
+
+  def test_step_name(self):
+    self.assertEqual(precondition.step_name(playbook.Precondition(
+        fill_percent=50, random=True)), "precondition_50pct_random_rand")
+
+
+if __name__ == "__main__":
+  unittest.main()
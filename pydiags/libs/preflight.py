@@ -0,0 +1,252 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Validation of a playbook and planning of its steps before any DUT IO.
+
+fio parses every step config, the benchmark targets are parsed and checked
+against the data directions the jobs of their step use, and the wall-clock
+time of every step is estimated from the job options and the DUT capacity.
+"""
+import concurrent.futures
+import os
+import subprocess
+from dataclasses import dataclass
+from typing import Optional
+
+from . import fiojob
+from . import performance
+from . import sweep
+
+_PARSE_TIMEOUT_SEC = 10
+_SECTOR_BYTES = 512
+_SYS_BLOCK_SIZE = "/sys/class/block/%s/size"
+# bandwidth assumed for jobs bounded by size rather than by runtime
+ASSUMED_BW_BYTES_PER_SEC = 1 << 30
+# job options ending the current group of jobs running at the same time
+_SERIALIZING = ("stonewall", "wait_for_previous")
+_DEFAULT_RW = "read"
+
+
+@dataclass
+class StepPlan:
+  """Estimated wall-clock time of a step, None if it can't be estimated."""
+  name: str
+  estimate_sec: Optional[float]
+
+
+@dataclass
+class Plan:
+  steps: list[StepPlan]
+  errors: list[str]
+
+  @property
+  def total_sec(self) -> Optional[float]:
+    estimates = [step.estimate_sec for step in self.steps]
+    if None in estimates:
+      return None
+    return sum(estimates)
+
+
+def device_capacity(dev_name) -> Optional[int]:
+  """Returns the DUT size in bytes from sysfs, None if unknown."""
+  try:
+    with open(_SYS_BLOCK_SIZE % os.path.basename(dev_name)) as f:
+      return int(f.read()) * _SECTOR_BYTES
+  except (IOError, ValueError) as _:
+    return None
+
+
+def _parse_only(fio_path, path) -> Optional[str]:
+  try:
+    subprocess.run([fio_path, "--parse-only", path], capture_output=True,
+                   text=True, check=True, timeout=_PARSE_TIMEOUT_SEC)
+  except FileNotFoundError as _:
+    # fio is not installed here, the configs are still read below
+    return None
+  except subprocess.CalledProcessError as e:
+    return "%s: fio can't parse it: %s" % (path, e.stderr.strip())
+  except subprocess.TimeoutExpired as _:
+    return "%s: fio --parse-only timed out" % path
+  return None
+
+
+def fio_parse_only(fio_path, paths) -> list[str]:
+  """Has fio parse all the configs concurrently.
+
+  Args:
+    fio_path: fio binary.
+    paths: job files to parse.
+  Returns:
+    The errors reported by fio.
+  """
+  with concurrent.futures.ThreadPoolExecutor() as executor:
+    errors = executor.map(lambda path: _parse_only(fio_path, path), paths)
+  return [error for error in errors if error]
+
+
+def _job_bytes(job, capacity):
+  """Returns the bytes a size bounded job transfers, None if unknown."""
+  if "io_size" in job.options:
+    size = fiojob.parse_size(job.get("io_size"), capacity)
+  elif "size" in job.options:
+    size = fiojob.parse_size(job.get("size"), capacity)
+  else:
+    size = capacity
+  if size is None:
+    return None
+  passes = int(job.get("loops", "1"))
+  directions = fiojob.RW_DIRECTIONS.get(job.get("rw", _DEFAULT_RW), ())
+  verify = job.get("verify", "0") not in ("0", "none")
+  if verify and "write" in directions and job.get("do_verify", "1") != "0":
+    # the written data is read back once the writes are done
+    passes *= 2
+  return size * passes * int(job.get("numjobs", "1"))
+
+
+def estimate_step(jobs, capacity=None,
+                  bandwidth=ASSUMED_BW_BYTES_PER_SEC) -> Optional[float]:
+  """Estimates the wall-clock time of the jobs of a step.
+
+  Jobs run at the same time unless separated by stonewall. Time based jobs
+  last their runtime, the others share the bandwidth for the bytes they
+  transfer, up to their runtime.
+
+  Args:
+    jobs: resolved jobs of the step config.
+    capacity: DUT size in bytes, the default size of a job.
+    bandwidth: bandwidth in bytes per second of size bounded jobs.
+  Returns:
+    The estimate in seconds, None if a job size is unknown.
+  Raises:
+    ValueError: a job option has an invalid value.
+  """
+  groups = []
+  for job in jobs:
+    if not groups or any(fiojob.is_set(job, key) for key in _SERIALIZING):
+      groups.append([])
+    groups[-1].append(job)
+  total = 0.0
+  for group in groups:
+    timed, sized = [0.0], 0.0
+    for job in group:
+      ramp_time = fiojob.parse_time(job.get("ramp_time", "0"))
+      runtime = (fiojob.parse_time(job.get("runtime"))
+                 if job.get("runtime") else None)
+      if fiojob.is_set(job, "time_based"):
+        if runtime is None:
+          raise ValueError("%s is time_based without runtime" % job.name)
+        timed.append(runtime + ramp_time)
+        continue
+      transferred = _job_bytes(job, capacity)
+      if transferred is None:
+        return None
+      duration = transferred / bandwidth
+      if runtime is not None:
+        duration = min(duration, runtime)
+      sized += duration + ramp_time
+    total += max(max(timed), sized)
+  return total
+
+
+def check_targets(descriptor, step_jobs, first_step,
+                  logged_steps=None) -> list[str]:
+  """Validates a target file against the jobs of the steps.
+
+  Args:
+    descriptor: benchmark target file parsed.
+    step_jobs: resolved jobs of every step config, None for the configs that
+      couldn't be read.
+    first_step: the step benchmarks without "step" apply to.
+    logged_steps: the steps fio logs are collected for, time series targets
+      on the other steps can't be measured. None if not known.
+  Returns:
+    The problems found in the target file.
+  """
+  if not isinstance(descriptor, dict):
+    return ["benchmark targets: expected an object"]
+  errors = []
+  for index, benchmark in enumerate(descriptor.get("benchmarks", [descriptor])):
+    name = "benchmark %d" % index
+    try:
+      name = benchmark["basename"]
+      performance.Benchmark(benchmark)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+      errors.append("%s: invalid targets: %r" % (name, e))
+      continue
+    step = benchmark.get("step", first_step)
+    if step not in step_jobs:
+      errors.append("%s: step %s is not in the playbook" % (name, step))
+      continue
+    if logged_steps is not None and step not in logged_steps:
+      unlogged = sorted(
+          target for workload in benchmark["workloads"]
+          for target in workload["targets"]
+          if target in performance.TIMESERIES_TARGETS)
+      if unlogged:
+        errors.append("%s: %s need the fio logs of %s, which aren't collected"
+                      % (name, ", ".join(unlogged), step))
+    jobs = step_jobs[step]
+    if jobs is None:
+      continue
+    job_name = benchmark.get("jobName")
+    if job_name is not None:
+      jobs = [job for job in jobs if job.name == job_name]
+      if not jobs:
+        errors.append("%s: %s has no job %s" % (name, step, job_name))
+        continue
+    for workload in benchmark["workloads"]:
+      io_type = workload["ioType"]
+      rw_modes = [job.get("rw", _DEFAULT_RW) for job in jobs]
+      matching = [rw for rw in rw_modes
+                  if any(io_type.endswith(direction)
+                         for direction in fiojob.RW_DIRECTIONS.get(rw, ()))]
+      if io_type.startswith("rand"):
+        matching = [rw for rw in matching if rw.startswith("rand")]
+      if not matching:
+        errors.append("%s: %s targets but the jobs of %s use rw=%s" % (
+            name, io_type, step, ",".join(rw_modes)))
+  return errors
+
+
+def plan(steps, configs_path, targets=None, fio_path=None, capacity=None,
+         defaults=None, logged_steps=None) -> Plan:
+  """Validates a playbook and estimates the time of its steps.
+
+  Args:
+    steps: parsed playbook steps.
+    configs_path: directory of the step configs.
+    targets: benchmark target file parsed, if any.
+    fio_path: fio binary, the configs are not parsed by fio without it.
+    capacity: DUT size in bytes, if known.
+    defaults: fio options given on the command line of every step.
+    logged_steps: the steps fio logs are collected for, see check_targets.
+  Returns:
+    The plan of the playbook and every problem found in it.
+  """
+  paths = {step.name: os.path.join(configs_path, step.config)
+           for step in steps}
+  errors = fio_parse_only(fio_path, list(paths.values())) if fio_path else []
+  step_jobs = {}
+  step_plans = []
+  for step in steps:
+    estimate = None
+    step_jobs[step.name] = None
+    try:
+      step_jobs[step.name] = fiojob.jobs(
+          fiojob.read(paths[step.name]), defaults)
+      estimate = estimate_step(step_jobs[step.name], capacity)
+      if estimate is not None and step.sweep:
+        # every point of the sweep runs the whole config
+        estimate *= len(sweep.grid(step.sweep))
+      elif estimate is not None and step.compare_engines:
+        estimate *= len(step.compare_engines)
+    except (IOError, ValueError) as e:
+      errors.append("%s: %s" % (step.name, e))
+    step_plans.append(StepPlan(step.name, estimate))
+  if targets is not None and steps:
+    errors.extend(check_targets(targets, step_jobs, steps[0].name,
+                                logged_steps))
+  return Plan(step_plans, errors)
@@ -0,0 +1,171 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import tempfile
+import time
+import unittest
+
+from . import fiojob
+from . import playbook
+from . import preflight
+
+_GIB = 1 << 30
+_RAND_RD = """
+[rand_rd]
+rw=randread
+time_based
+runtime=120
+"""
+_SEQ_WR = """
+[global]
+rw=write
+size=10g
+verify=meta
+
+[seq_wr]
+numjobs=2
+
+[verify]
+stonewall
+rw=read
+size=1g
+"""
+
+
+def _jobs(text):
+  return fiojob.jobs(fiojob.parse(text))
+
+
+def _workload(io_type, targets):
+  return {"ioType": io_type, "workloadNum": 1, "targets": targets}
+
+
+class EstimateStepTest(unittest.TestCase):
+
+  def test_time_based(self):
+    self.assertEqual(preflight.estimate_step(_jobs(_RAND_RD)), 120)
+
+  def test_size_based_groups(self):
+    # 2 jobs writing and verifying 10 GiB, then 1 GiB read
+    self.assertEqual(
+        preflight.estimate_step(_jobs(_SEQ_WR), bandwidth=_GIB), 41)
+
+  def test_device_capacity(self):
+    jobs = _jobs("[job]\nrw=read\nruntime=60\n")
+    self.assertIsNone(preflight.estimate_step(jobs))
+    self.assertEqual(preflight.estimate_step(
+        jobs, capacity=10 * _GIB, bandwidth=_GIB), 10)
+    self.assertEqual(preflight.estimate_step(
+        jobs, capacity=100 * _GIB, bandwidth=_GIB), 60)
+
+  def test_time_based_without_runtime(self):
+    with self.assertRaises(ValueError):
+      preflight.estimate_step(_jobs("[job]\ntime_based\n"))
+
+
+class CheckTargetsTest(unittest.TestCase):
+
+  def _check(self, benchmark):
+    step_jobs = {"rd.fio": _jobs(_RAND_RD), "wr.fio": _jobs(_SEQ_WR)}
+    return preflight.check_targets(benchmark, step_jobs, "rd.fio")
+
+  def test_valid_targets(self):
+    self.assertEqual(self._check({"benchmarks": [
+        {"basename": "rd", "workloads": [
+            _workload("randread", {"lat999thUsec": "7000"})]},
+        {"basename": "wr", "step": "wr.fio", "jobName": "seq_wr",
+         "workloads": [_workload("write", {"bwMbytesPerSec": "70"})]},
+    ]}), [])
+
+  def test_unknown_target(self):
+    errors = self._check({"basename": "rd", "workloads": [
+        _workload("randread", {"lat999Usec": "7000"})]})
+    self.assertEqual(len(errors), 1)
+    self.assertIn("lat999Usec", errors[0])
+
+  def test_io_type_not_used_by_jobs(self):
+    errors = self._check({"basename": "rd", "workloads": [
+        _workload("randwrite", {"bwMbytesPerSec": "70"})]})
+    self.assertEqual(errors, [
+        "rd: randwrite targets but the jobs of rd.fio use rw=randread"])
+
+  def test_unknown_step_and_job(self):
+    self.assertEqual(len(self._check({"benchmarks": [
+        {"basename": "a", "step": "missing.fio", "workloads": []},
+        {"basename": "b", "jobName": "missing", "workloads": []},
+    ]})), 2)
+
+  def test_timeseries_targets_need_fio_logs(self):
+    step_jobs = {"rd.fio": _jobs(_RAND_RD)}
+    benchmark = {"basename": "rd", "workloads": [
+        _workload("randread", {"bwMinWindowMbytesPerSec": "70",
+                               "iopsCovPercent": "10"})]}
+    self.assertEqual(preflight.check_targets(
+        benchmark, step_jobs, "rd.fio", logged_steps=set()), [
+            "rd: bwMinWindowMbytesPerSec, iopsCovPercent need the fio logs"
+            " of rd.fio, which aren't collected"])
+    self.assertEqual(preflight.check_targets(
+        benchmark, step_jobs, "rd.fio", logged_steps={"rd.fio"}), [])
+
+
+class PlanTest(unittest.TestCase):
+
+  def test_plan(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      for name, text in (("rd.fio", _RAND_RD), ("bad.fio", "rw=read\n")):
+        with open(os.path.join(tmpdir, name), "w") as f:
+          f.write(text)
+      steps = playbook.parse_steps(["rd.fio", "rd.fio", "bad.fio"])
+      start = time.monotonic()
+      plan = preflight.plan(steps, tmpdir, targets={"basename": "rd",
+                                                    "workloads": []})
+      self.assertLess(time.monotonic() - start, 1)
+    self.assertEqual([step.estimate_sec for step in plan.steps],
+                     [120, 120, None])
+    self.assertIsNone(plan.total_sec)
+    self.assertEqual(len(plan.errors), 1)
+    self.assertIn("bad.fio", plan.errors[0])
+
+  def test_large_playbook(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      configs = []
+      for index in range(100):
+        configs.append("step%d.fio" % index)
+        with open(os.path.join(tmpdir, configs[-1]), "w") as f:
+          f.write(_SEQ_WR if index % 2 else _RAND_RD)
+      steps = playbook.parse_steps(
+          [{"config": config, "sweep": {"iodepth": [1, 32]}}
+           for config in configs] * 20)
+      targets = {"benchmarks": [
+          {"basename": "rd%d" % index, "step": configs[index],
+           "workloads": [_workload("randread", {"lat999thUsec": "7000"})]}
+          for index in range(0, 100, 2)]}
+      start = time.monotonic()
+      plan = preflight.plan(steps, tmpdir, targets=targets, capacity=_GIB)
+      self.assertLess(time.monotonic() - start, 2)
+    self.assertEqual(plan.errors, [])
+    self.assertEqual(len(plan.steps), 2000)
+
+  def test_shipped_playbooks(self):
+    configs_path = os.path.join(os.path.dirname(__file__), "..", "configs")
+    steps = playbook.parse_steps(["iops_rand_rd_4kb_bs_256_qd.fio",
+                                  "mixed_workload_rdwr.fio"])
+    plan = preflight.plan(steps, configs_path, capacity=_GIB)
+    self.assertEqual(plan.errors, [])
+    self.assertEqual(plan.total_sec, 122)
+
+  def test_sweep_runs_the_config_for_every_point(self):
+    configs_path = os.path.join(os.path.dirname(__file__), "..", "configs")
+    steps = playbook.parse_steps([{
+        "config": "iops_rand_rd_4kb_bs_256_qd.fio",
+        "sweep": {"iodepth": [1, 32, 256], "numjobs": [1, 4]},
+    }])
+    self.assertEqual(preflight.plan(steps, configs_path).total_sec, 720)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,214 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Statistical comparison of step results with historical baselines.
+
+Latency is compared with a one-sided two-sample Kolmogorov-Smirnov test on the
+json+ histograms, bandwidth with the distribution of the baseline bandwidths.
+With millions of IOs per step any difference is significant, so a regression
+also needs an effect size that matters.
+"""
+import json
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from . import histogram
+
+_CLAT = "clat_ns"
+ALPHA = 0.01
+# the largest gap between the latency CDFs, in fraction of IOs
+MIN_KS_DISTANCE = 0.05
+# bandwidth drop relative to the baseline mean
+MIN_BW_DROP = 0.05
+# what tells DUTs with comparable performance apart
+IDENTITY_KEYS = ("model", "firmware")
+
+
+@dataclass
+class Comparison:
+  step: str
+  job: str
+  io_type: str
+  metric: str
+  effect_size: float
+  p_value: float
+  regressed: bool
+
+
+class Baseline:
+  """Reference latency and bandwidth of a step for a DUT model/firmware."""
+
+  def __init__(self, step, io_type, latency_histogram=None, bandwidths=(),
+               model=None, firmware=None):
+    self.step = step
+    self.io_type = io_type
+    self.histogram = latency_histogram
+    self.bandwidths = np.asarray(bandwidths, dtype=np.float64)
+    self.model = model
+    self.firmware = firmware
+
+  @classmethod
+  def from_dict(cls, descriptor):
+    latency_histogram = None
+    if histogram.BINS in descriptor:
+      latency_histogram = histogram.LatencyHistogram.from_fio(descriptor)
+    return cls(descriptor["step"], descriptor["ioType"], latency_histogram,
+               descriptor.get("bwKbytesPerSec", ()), descriptor.get("model"),
+               descriptor.get("firmware"))
+
+  def to_dict(self):
+    descriptor = {
+        "step": self.step,
+        "ioType": self.io_type,
+        "bwKbytesPerSec": self.bandwidths.tolist(),
+    }
+    if self.histogram is not None:
+      descriptor[histogram.BINS] = self.histogram.to_fio()
+    for key, value in (("model", self.model), ("firmware", self.firmware)):
+      if value is not None:
+        descriptor[key] = value
+    return descriptor
+
+  def matches(self, identity):
+    return all(
+        expected is None or identity.get(key) == expected
+        for key, expected in (("model", self.model),
+                              ("firmware", self.firmware)))
+
+
+def identified(identity) -> bool:
+  """Tells whether the model and firmware of a DUT are known."""
+  return all(identity.get(key) for key in IDENTITY_KEYS)
+
+
+class FileBaselines:
+  """Baselines read from a JSON file, e.g. for offline comparison."""
+  # a baseline of the file without model/firmware applies to every DUT
+  requires_identity = False
+
+  def __init__(self, path):
+    with open(path) as f:
+      self._baselines = [
+          Baseline.from_dict(descriptor)
+          for descriptor in json.load(f)["baselines"]
+      ]
+
+  def find(self, step, io_type, identity) -> Optional[Baseline]:
+    for baseline in self._baselines:
+      if (baseline.step == step and baseline.io_type == io_type and
+          baseline.matches(identity)):
+        return baseline
+    return None
+
+
+class StoreBaselines:
+  """Baselines built from the results store for the same model/firmware.
+
+  A DUT whose model or firmware is unknown has no baseline, the results of
+  other models and firmwares don't tell whether it regressed.
+  """
+  requires_identity = True
+
+  def __init__(self, store):
+    self._store = store
+    self._cache = {}
+
+  def find(self, step, io_type, identity) -> Optional[Baseline]:
+    if not identified(identity):
+      return None
+    model, firmware = identity.get("model"), identity.get("firmware")
+    key = (step, io_type, model, firmware)
+    if key not in self._cache:
+      histograms = self._store.query_histograms(
+          _CLAT, step, io_type, model=model, firmware=firmware)
+      bandwidths = self._store.query_metric(
+          "bw", step, io_type, model=model, firmware=firmware)
+      self._cache[key] = None
+      if histograms or bandwidths.size:
+        merged = None
+        if histograms:
+          merged = histogram.LatencyHistogram.merge(histograms)
+        self._cache[key] = Baseline(step, io_type, merged, bandwidths, model,
+                                    firmware)
+    return self._cache[key]
+
+
+def compare_latency(baseline, current):
+  """One-sided KS test whether the current latency is higher.
+
+  Args:
+    baseline: latency histogram of the baseline.
+    current: latency histogram of the step.
+  Returns:
+    The largest amount by which the current CDF falls below the baseline CDF
+    and its asymptotic p-value.
+  """
+  if not baseline.total or not current.total:
+    return 0.0, 1.0
+  latencies = np.union1d(baseline.values, current.values)
+  distance = float(
+      np.max(baseline.cdf(latencies) - current.cdf(latencies), initial=0))
+  effective_count = baseline.total * current.total / (
+      baseline.total + current.total)
+  return distance, math.exp(-2 * effective_count * distance ** 2)
+
+
+def compare_bandwidth(bandwidths, current):
+  """Tests whether the current bandwidth is below the baseline distribution.
+
+  Args:
+    bandwidths: bandwidths of the baseline.
+    current: bandwidth of the step.
+  Returns:
+    The relative drop from the baseline mean and the one-sided p-value of the
+    current bandwidth under a normal fit of the baseline.
+  """
+  if bandwidths.size < 2 or not bandwidths.mean():
+    return 0.0, 1.0
+  mean = bandwidths.mean()
+  deviation = bandwidths.std(ddof=1)
+  drop = float((mean - current) / mean)
+  if not deviation:
+    return drop, 0.0 if current < mean else 1.0
+  z_score = (current - mean) / deviation
+  return drop, 0.5 * math.erfc(-z_score / math.sqrt(2))
+
+
+def compare(baselines, step_result, identity, alpha=ALPHA):
+  """Compares every job of a step with its baseline.
+
+  Args:
+    baselines: FileBaselines or StoreBaselines.
+    step_result: results of the step.
+    identity: serial, model and firmware of the DUT.
+    alpha: significance level of the tests.
+  Returns:
+    A comparison for every job, data direction and metric with a baseline.
+  """
+  comparisons = []
+  for job in step_result.jobs:
+    for io_type, io_stats in job.io_stats.items():
+      if not io_stats.io_bytes:
+        continue
+      baseline = baselines.find(step_result.name, io_type, identity)
+      if baseline is None:
+        continue
+      clat = io_stats.latencies.get(_CLAT)
+      if (baseline.histogram is not None and clat is not None and
+          clat.histogram is not None):
+        distance, p_value = compare_latency(baseline.histogram, clat.histogram)
+        comparisons.append(Comparison(
+            step_result.name, job.name, io_type, "clatKsDistance", distance,
+            p_value, p_value < alpha and distance > MIN_KS_DISTANCE))
+      if baseline.bandwidths.size:
+        drop, p_value = compare_bandwidth(baseline.bandwidths, io_stats.bw)
+        comparisons.append(Comparison(
+            step_result.name, job.name, io_type, "bwDrop", drop, p_value,
+            p_value < alpha and drop > MIN_BW_DROP))
+  return comparisons
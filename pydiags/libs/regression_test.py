@@ -0,0 +1,111 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json
+import os
+import tempfile
+import unittest
+
+from . import histogram
+from . import regression
+from . import results
+from . import resultsdb
+
+_STEP = "iops_rand_rd.fio"
+_IDENTITY = {"serial": "S1", "model": "M", "firmware": "A"}
+
+
+def _step_result(bins, bw=1000):
+  return results.StepResult.from_fio(_STEP, {
+      "jobs": [{
+          "jobname": "rand_rd",
+          "read": {
+              "bw": bw,
+              "io_bytes": 1048576,
+              "clat_ns": {"N": sum(bins.values()), "bins": bins},
+          },
+          "write": {"io_bytes": 0},
+      }]
+  })
+
+
+_FAST = {"1000": 9000, "2000": 1000}
+_SLOW = {"1000": 5000, "2000": 5000}
+
+
+class CompareTest(unittest.TestCase):
+
+  def test_latency_shift_to_higher_values(self):
+    fast = histogram.LatencyHistogram.from_fio({"bins": _FAST})
+    slow = histogram.LatencyHistogram.from_fio({"bins": _SLOW})
+    distance, p_value = regression.compare_latency(fast, slow)
+    self.assertAlmostEqual(distance, 0.4)
+    self.assertLess(p_value, 1e-100)
+    distance, p_value = regression.compare_latency(slow, fast)
+    self.assertEqual(distance, 0)
+    self.assertEqual(p_value, 1)
+
+  def test_bandwidth(self):
+    baseline = regression.Baseline(_STEP, "read",
+                                   bandwidths=[990, 1000, 1010]).bandwidths
+    drop, p_value = regression.compare_bandwidth(baseline, 800)
+    self.assertAlmostEqual(drop, 0.2)
+    self.assertLess(p_value, 0.01)
+    drop, p_value = regression.compare_bandwidth(baseline, 1005)
+    self.assertGreater(p_value, 0.5)
+
+  def test_compare_with_file_baselines(self):
+    baseline = regression.Baseline(
+        _STEP, "read", histogram.LatencyHistogram.from_fio({"bins": _FAST}),
+        [990, 1000, 1010], model="M")
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, "baseline.json")
+      with open(path, "w") as f:
+        json.dump({"baselines": [baseline.to_dict()]}, f)
+      baselines = regression.FileBaselines(path)
+    comparisons = regression.compare(
+        baselines, _step_result(_SLOW, bw=800), _IDENTITY)
+    self.assertEqual([(c.metric, c.regressed) for c in comparisons],
+                     [("clatKsDistance", True), ("bwDrop", True)])
+    comparisons = regression.compare(
+        baselines, _step_result(_FAST), _IDENTITY)
+    self.assertFalse(any(c.regressed for c in comparisons))
+    self.assertEqual(regression.compare(
+        baselines, _step_result(_SLOW), dict(_IDENTITY, model="N")), [])
+
+  def test_compare_with_store_baselines(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      store = resultsdb.ResultsStore(os.path.join(tmpdir, "results.db"))
+      for bw in (990, 1000, 1010):
+        store.add_step("host", _IDENTITY, "/dev/nvme0n1", "basic_io.json",
+                       _step_result(_FAST, bw))
+      store.flush()
+      baselines = regression.StoreBaselines(store)
+      comparisons = regression.compare(
+          baselines, _step_result(_SLOW, bw=800), _IDENTITY)
+      store.close()
+    self.assertTrue(all(c.regressed for c in comparisons))
+    self.assertEqual(len(comparisons), 2)
+
+  def test_store_baselines_need_identity(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      store = resultsdb.ResultsStore(os.path.join(tmpdir, "results.db"))
+      for bw in (990, 1000, 1010):
+        store.add_step("host", _IDENTITY, "/dev/nvme0n1", "basic_io.json",
+                       _step_result(_FAST, bw))
+      store.flush()
+      baselines = regression.StoreBaselines(store)
+      # the results of every firmware of the model aren't a baseline
+      comparisons = regression.compare(
+          baselines, _step_result(_SLOW, bw=800), {"model": "M"})
+      store.close()
+    self.assertEqual(comparisons, [])
+    self.assertTrue(baselines.requires_identity)
+    self.assertFalse(regression.identified({"model": "M", "firmware": ""}))
+
+
+if __name__ == "__main__":
+  unittest.main()
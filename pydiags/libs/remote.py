@@ -0,0 +1,144 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""DUTs on other hosts, driven through fio client/server.
+
+A DUT named host:/dev/nvme0n1 is tested on a host running fio --server. The
+fio client sends the step config to the server and gets the results back over
+the same connection, nothing is copied to or from the host. The host is
+anything fio --client accepts, e.g. rack1-host3 or 10.0.0.7,8765 for a server
+listening on another port.
+"""
+import collections
+import contextlib
+import itertools
+import threading
+from typing import Optional
+
+_HOST_SEPARATOR = ":"
+LOCAL = "localhost"
+# a DUT failing on a host doesn't stop the other DUTs of the host
+CONTINUE = "continue"
+# the DUTs of a host not started yet are skipped once one of them failed
+SKIP_HOST = "skip_host"
+FAILURE_POLICIES = (CONTINUE, SKIP_HOST)
+
+
+class HostSkipped(IOError):
+  """A DUT wasn't tested because another DUT of its host failed."""
+
+
+def split_dut(name) -> tuple[Optional[str], str]:
+  """Returns the host and the device of a DUT.
+
+  Args:
+    name: the DUT as passed to --duts, /dev/nvme0n1 or host:/dev/nvme0n1.
+  Returns:
+    The host, None for a local DUT, and the device on it.
+  Raises:
+    ValueError: the DUT is neither a device path nor host:device.
+  """
+  if name.startswith("/"):
+    return None, name
+  host, separator, device = name.partition(_HOST_SEPARATOR)
+  if not separator or not host or not device.startswith("/"):
+    raise ValueError("DUT must be /path/to/device or host:/path/to/device: %s"
+                     % name)
+  return host, device
+
+
+def is_remote(name) -> bool:
+  return split_dut(name)[0] is not None
+
+
+def log_dir_name(name) -> str:
+  """Returns the log dir of a DUT, unique across hosts."""
+  host, device = split_dut(name)
+  device = device.split("/")[-1]
+  if host is None:
+    return device
+  return "%s_%s" % (host.replace(",", "_"), device)
+
+
+def fio_options(name) -> list[str]:
+  """Returns the fio options running a step on a DUT.
+
+  Args:
+    name: the DUT.
+  Returns:
+    The options selecting the DUT, preceded by the server to send the step to
+    for a remote DUT. The options of the fio client itself, e.g. the output
+    format, must come before them.
+  """
+  host, device = split_dut(name)
+  options = ["--filename=%s" % device]
+  if host is not None:
+    options.insert(0, "--client=%s" % host)
+  return options
+
+
+def interleave(names) -> list[str]:
+  """Orders DUTs host by host, so that a pool of workers spreads over hosts.
+
+  Args:
+    names: the DUTs.
+  Returns:
+    The first DUT of every host, then the second one of every host and so on.
+  """
+  by_host = collections.defaultdict(list)
+  for name in names:
+    by_host[split_dut(name)[0] or LOCAL].append(name)
+  return [
+      name for names in itertools.zip_longest(*by_host.values())
+      for name in names if name is not None
+  ]
+
+
+class HostGate:
+  """Bounds the DUTs tested at once on every host and applies failure policy.
+
+  Attributes:
+    per_host: the most DUTs of a host tested at once, no limit if 0.
+    policy: one of FAILURE_POLICIES.
+  """
+
+  def __init__(self, per_host=0, policy=CONTINUE):
+    self.per_host = per_host
+    self.policy = policy
+    self._lock = threading.Lock()
+    self._slots = {}
+    self._failed_hosts = set()
+
+  def _slot(self, host):
+    with self._lock:
+      if host not in self._slots:
+        self._slots[host] = (threading.BoundedSemaphore(self.per_host)
+                             if self.per_host else None)
+      return self._slots[host]
+
+  @contextlib.contextmanager
+  def run(self, name):
+    """Tests a DUT once its host has a free slot.
+
+    Args:
+      name: the DUT.
+    Raises:
+      HostSkipped: another DUT of the host failed and policy is SKIP_HOST.
+    """
+    host = split_dut(name)[0] or LOCAL
+    slot = self._slot(host)
+    with slot or contextlib.nullcontext():
+      with self._lock:
+        if host in self._failed_hosts:
+          raise HostSkipped("%s skipped, another DUT of %s failed." % (
+              name, host))
+      try:
+        yield
+      except Exception:
+        if self.policy == SKIP_HOST:
+          with self._lock:
+            self._failed_hosts.add(host)
+        raise
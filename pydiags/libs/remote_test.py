@@ -0,0 +1,84 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import concurrent.futures
+import threading
+import time
+import unittest
+
+from . import remote
+
+
+class RemoteTest(unittest.TestCase):
+
+  def test_split_dut(self):
+    self.assertEqual(remote.split_dut("/dev/nvme0n1"), (None, "/dev/nvme0n1"))
+    self.assertEqual(remote.split_dut("10.0.0.7,8765:/dev/nvme1n1"),
+                     ("10.0.0.7,8765", "/dev/nvme1n1"))
+    for name in ("nvme0n1", "host:", ":/dev/nvme0n1", "host:nvme0n1"):
+      with self.assertRaises(ValueError):
+        remote.split_dut(name)
+
+  def test_log_dir_name(self):
+    self.assertEqual(remote.log_dir_name("/dev/nvme0n1"), "nvme0n1")
+    self.assertEqual(remote.log_dir_name("host1,8765:/dev/nvme0n1"),
+                     "host1_8765_nvme0n1")
+
+  def test_fio_options(self):
+    self.assertEqual(remote.fio_options("/dev/nvme0n1"),
+                     ["--filename=/dev/nvme0n1"])
+    self.assertEqual(remote.fio_options("host1:/dev/nvme0n1"),
+                     ["--client=host1", "--filename=/dev/nvme0n1"])
+
+  def test_interleave(self):
+    self.assertEqual(
+        remote.interleave(["a:/dev/0", "a:/dev/1", "a:/dev/2", "b:/dev/0",
+                           "/dev/0"]),
+        ["a:/dev/0", "b:/dev/0", "/dev/0", "a:/dev/1", "a:/dev/2"])
+
+  def test_gate_bounds_duts_per_host(self):
+    gate = remote.HostGate(per_host=2)
+    lock = threading.Lock()
+    running = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+
+    def test_dut(name):
+      host = name.split(":")[0]
+      with gate.run(name):
+        with lock:
+          running[host] += 1
+          peak[host] = max(peak[host], running[host])
+        time.sleep(0.01)
+        with lock:
+          running[host] -= 1
+
+    names = ["%s:/dev/%d" % (host, i) for host in "ab" for i in range(5)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+      list(executor.map(test_dut, names))
+    self.assertEqual(peak, {"a": 2, "b": 2})
+
+  def test_gate_skips_host_after_failure(self):
+    gate = remote.HostGate(policy=remote.SKIP_HOST)
+    with self.assertRaises(IOError):
+      with gate.run("a:/dev/0"):
+        raise IOError("fio failed")
+    with self.assertRaises(remote.HostSkipped):
+      with gate.run("a:/dev/1"):
+        pass
+    with gate.run("b:/dev/0"):
+      pass
+
+  def test_gate_continues_after_failure(self):
+    gate = remote.HostGate()
+    with self.assertRaises(IOError):
+      with gate.run("a:/dev/0"):
+        raise IOError("fio failed")
+    with gate.run("a:/dev/1"):
+      pass
+
+
+if __name__ == "__main__":
+  unittest.main()
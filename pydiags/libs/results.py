@@ -0,0 +1,260 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Compact in-memory representation of fio results.
+
+A json+ document holds thousands of latency bins per job and direction. The
+classes below keep only what the evaluation and reporting need, latency bins
+are kept in arrays, and the document itself is spilled to a compressed file.
+"""
+import gzip
+import json
+
+from . import commonlib
+from . import histogram
+
+IO_TYPES = ("read", "write", "trim")
+LATENCY_SECTIONS = ("clat_ns", "slat_ns", "lat_ns")
+BYTES_IN_KB = 1024
+# fio in client mode reports the jobs of every server under client_stats, with
+# an extra entry summing up all of them when there are several servers
+JOB_SECTIONS = ("jobs", "client_stats")
+ALL_CLIENTS = "All clients"
+
+
+def fio_jobs(fio_output):
+  """Returns the jobs of fio output, the ones of a fio client included."""
+  return [
+      job for section in JOB_SECTIONS for job in fio_output.get(section, [])
+      if job.get("jobname") != ALL_CLIENTS
+  ]
+
+
+def steady_state_bandwidth(job):
+  """Returns the mean bandwidth of the steady state window in KiB/s.
+
+  Args:
+    job: a job of fio output.
+  Returns:
+    The bandwidth or None if the job didn't reach the steady state.
+  """
+  steady_state = job.get("steadystate", {})
+  if not steady_state.get("attained"):
+    return None
+  # fio tracks the steady state bandwidth in bytes per second
+  return steady_state["data"]["bw_mean"] / BYTES_IN_KB
+
+
+class LatencyStats:
+  """A latency section of fio output, e.g. clat_ns."""
+  __slots__ = ("count", "min", "max", "mean", "percentiles", "histogram")
+
+  def __init__(self, count=0, minimum=0, maximum=0, mean=0, percentiles=None,
+               latency_histogram=None):
+    self.count = count
+    self.min = minimum
+    self.max = maximum
+    self.mean = mean
+    # the percentiles fio reported, e.g. {"99.000000": 2000}
+    self.percentiles = percentiles or {}
+    self.histogram = latency_histogram
+
+  @classmethod
+  def from_fio(cls, section):
+    latency_histogram = None
+    if histogram.BINS in section:
+      latency_histogram = histogram.LatencyHistogram.from_fio(section)
+    return cls(section.get("N", 0), section.get("min", 0),
+               section.get("max", 0), section.get("mean", 0),
+               dict(section.get("percentile", {})), latency_histogram)
+
+  @classmethod
+  def merge(cls, sections):
+    """Merges latency sections, percentiles are recomputed from the bins."""
+    count = sum(section.count for section in sections)
+    merged = cls(
+        count,
+        min(section.min for section in sections),
+        max(section.max for section in sections),
+        (sum(section.mean * section.count for section in sections) / count
+         if count else 0))
+    if all(section.histogram is not None for section in sections):
+      merged.histogram = histogram.LatencyHistogram.merge(
+          [section.histogram for section in sections])
+      percentiles = list(sections[0].percentiles)
+      merged.percentiles = dict(zip(percentiles, (
+          int(value) for value in merged.histogram.percentiles(
+              [float(percentile) for percentile in percentiles]))))
+    return merged
+
+  def get_histogram(self):
+    """Returns the latency histogram.
+
+    Raises:
+      ValueError: fio json+ output wasn't available.
+    """
+    if self.histogram is None:
+      raise ValueError("latency bins are missing, fio json+ output is needed.")
+    return self.histogram
+
+
+class IOStats:
+  """Statistics of a single data direction of a job."""
+  __slots__ = ("bw", "iops", "io_bytes", "total_ios", "runtime", "latencies")
+
+  def __init__(self, bw=0, iops=0, io_bytes=0, total_ios=0, runtime=0,
+               latencies=None):
+    self.bw = bw
+    self.iops = iops
+    self.io_bytes = io_bytes
+    self.total_ios = total_ios
+    self.runtime = runtime
+    self.latencies = latencies or {}
+
+  @classmethod
+  def from_fio(cls, stats):
+    return cls(
+        stats.get("bw", 0), stats.get("iops", 0), stats.get("io_bytes", 0),
+        stats.get("total_ios", 0), stats.get("runtime", 0), {
+            section: LatencyStats.from_fio(stats[section])
+            for section in LATENCY_SECTIONS if section in stats
+        })
+
+  @classmethod
+  def merge(cls, io_stats):
+    """Merges the statistics of several jobs the way group reporting does."""
+    latencies = {}
+    for section in LATENCY_SECTIONS:
+      sections = [
+          stats.latencies[section] for stats in io_stats
+          if section in stats.latencies
+      ]
+      if sections:
+        latencies[section] = LatencyStats.merge(sections)
+    return cls(
+        sum(stats.bw for stats in io_stats),
+        sum(stats.iops for stats in io_stats),
+        sum(stats.io_bytes for stats in io_stats),
+        sum(stats.total_ios for stats in io_stats),
+        max(stats.runtime for stats in io_stats),
+        latencies)
+
+
+class JobResult:
+  """Results of a single fio job."""
+  __slots__ = ("name", "error", "io_stats", "steady_state_attained",
+               "steady_state_bw", "steady_state_iops", "usr_cpu", "sys_cpu")
+
+  def __init__(self, name="", error=0, io_stats=None,
+               steady_state_attained=None, steady_state_bw=None,
+               steady_state_iops=None, usr_cpu=0, sys_cpu=0):
+    self.name = name
+    self.error = error
+    self.io_stats = io_stats or {}
+    # None unless the job ran with steady state detection
+    self.steady_state_attained = steady_state_attained
+    # mean bandwidth in KiB/s and IOPS of the steady state window
+    self.steady_state_bw = steady_state_bw
+    self.steady_state_iops = steady_state_iops
+    # host CPU used by the job in user and system mode, in percent of a CPU
+    self.usr_cpu = usr_cpu
+    self.sys_cpu = sys_cpu
+
+  @classmethod
+  def from_fio(cls, job):
+    steady_state = job.get("steadystate")
+    attained = bool(steady_state.get("attained")) if steady_state else None
+    return cls(
+        job.get("jobname", ""), job.get("error", 0), {
+            io_type: IOStats.from_fio(job[io_type])
+            for io_type in IO_TYPES if io_type in job
+        }, attained, steady_state_bandwidth(job),
+        steady_state["data"].get("iops_mean") if attained else None,
+        job.get("usr_cpu", 0), job.get("sys_cpu", 0))
+
+  @classmethod
+  def merge(cls, jobs):
+    """Merges jobs into a single one as a job group."""
+    io_stats = {}
+    for io_type in IO_TYPES:
+      stats = [job.io_stats[io_type] for job in jobs if io_type in job.io_stats]
+      if stats:
+        io_stats[io_type] = IOStats.merge(stats)
+    return cls(jobs[0].name, max(job.error for job in jobs), io_stats,
+               usr_cpu=sum(job.usr_cpu for job in jobs),
+               sys_cpu=sum(job.sys_cpu for job in jobs))
+
+
+class StepResult:
+  """Results of a single test step on a single DUT.
+
+  Attributes:
+    name: name of the test step.
+    jobs: results of every fio job.
+    job_logs: time series of every fio job, if collected.
+    raw_path: the file the whole fio output was spilled to.
+    throttle_events: thermal throttling of the DUT during the step, if its
+      SMART health was sampled.
+    sweep: every point of a swept step, the jobs are the ones of its knee.
+    endurance: what the writes of the step cost the DUT, if accounted.
+  """
+  __slots__ = ("name", "jobs", "job_logs", "raw_path", "throttle_events",
+               "sweep", "endurance")
+
+  def __init__(self, name, jobs, job_logs=None, raw_path=""):
+    self.name = name
+    self.jobs = jobs
+    self.job_logs = job_logs
+    self.raw_path = raw_path
+    self.throttle_events = None
+    self.sweep = None
+    self.endurance = None
+
+  @classmethod
+  def from_fio(cls, name, fio_output, job_logs=None, raw_path=""):
+    return cls(
+        name, [JobResult.from_fio(job) for job in fio_jobs(fio_output)],
+        job_logs, raw_path)
+
+  def load_raw(self):
+    """Reads back the whole fio output."""
+    return load_raw(self.raw_path)
+
+
+def spill(fio_output, path):
+  """Writes fio output to a compressed file.
+
+  Args:
+    fio_output: fio output parsed.
+    path: file to write, usually in the DUT log dir.
+  Returns:
+    The path of the file written.
+  """
+  with gzip.open(path, "wt", compresslevel=commonlib.COMPRESS_LEVEL) as f:
+    json.dump(fio_output, f)
+  return path
+
+
+def compress(path):
+  """Compresses a fio output file written by fio itself.
+
+  Args:
+    path: fio output file, removed once compressed.
+  Returns:
+    The path of the compressed file, same as written by spill.
+  """
+  return commonlib.compress_file(path)
+
+
+def load_raw(path):
+  """Reads fio output written by spill or compressed by compress.
+
+  A fio client logs messages around the document, they're skipped.
+  """
+  with gzip.open(path, "rt") as f:
+    text = f.read()
+  start = 0 if text.startswith("{") else text.find("\n{") + 1
+  return json.JSONDecoder().raw_decode(text, start)[0]
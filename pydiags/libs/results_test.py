@@ -0,0 +1,73 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from . import results
+
+_FIO_OUTPUT = {
+    "jobs": [{
+        "jobname": "seq_wr",
+        "error": 0,
+        "usr_cpu": 1.5,
+        "sys_cpu": 12.25,
+        "job options": {"rw": "write"},
+        "write": {
+            "bw": 1024,
+            "iops": 128.5,
+            "io_bytes": 1048576,
+            "total_ios": 128,
+            "runtime": 1000,
+            "clat_ns": {"N": 128, "min": 1000, "max": 9000, "mean": 2000,
+                        "percentile": {"99.000000": 9000},
+                        "bins": {"1000": 100, "2000": 27, "9000": 1}},
+            "slat_ns": {"N": 128, "min": 10, "max": 90, "mean": 20},
+        },
+        "steadystate": {"attained": 1, "data": {"bw_mean": 2 * 1024 * 1024}},
+    }]
+}
+
+
+class StepResultTest(unittest.TestCase):
+
+  def test_from_fio(self):
+    step_result = results.StepResult.from_fio("seq_wr.fio", _FIO_OUTPUT)
+    self.assertEqual(step_result.name, "seq_wr.fio")
+    job = step_result.jobs[0]
+    self.assertEqual(job.name, "seq_wr")
+    self.assertEqual(job.steady_state_bw, 2048)
+    self.assertEqual((job.usr_cpu, job.sys_cpu), (1.5, 12.25))
+    self.assertEqual(list(job.io_stats), ["write"])
+    write = job.io_stats["write"]
+    self.assertEqual(write.bw, 1024)
+    self.assertEqual(sorted(write.latencies), ["clat_ns", "slat_ns"])
+    self.assertEqual(write.latencies["clat_ns"].max, 9000)
+    np.testing.assert_array_equal(
+        write.latencies["clat_ns"].histogram.percentiles([50, 100]),
+        [1000, 9000])
+    with self.assertRaises(ValueError):
+      write.latencies["slat_ns"].get_histogram()
+
+  def test_compact_objects_have_no_dict(self):
+    job = results.StepResult.from_fio("", _FIO_OUTPUT).jobs[0]
+    for obj in (job, job.io_stats["write"],
+                job.io_stats["write"].latencies["clat_ns"]):
+      self.assertFalse(hasattr(obj, "__dict__"))
+
+  def test_spill_and_load_raw(self):
+    with tempfile.TemporaryDirectory() as log_dir:
+      path = results.spill(_FIO_OUTPUT, os.path.join(log_dir, "0.json.gz"))
+      step_result = results.StepResult.from_fio(
+          "seq_wr.fio", _FIO_OUTPUT, raw_path=path)
+      self.assertEqual(step_result.load_raw(), _FIO_OUTPUT)
+
+
+if __name__ == "__main__":
+  unittest.main()
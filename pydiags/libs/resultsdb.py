@@ -0,0 +1,207 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Local SQLite store keeping the results of every run."""
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from . import histogram
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS duts (
+  id INTEGER PRIMARY KEY,
+  serial TEXT NOT NULL,
+  model TEXT NOT NULL,
+  firmware TEXT NOT NULL,
+  UNIQUE (serial, model, firmware)
+);
+CREATE TABLE IF NOT EXISTS steps (
+  id INTEGER PRIMARY KEY,
+  host TEXT NOT NULL,
+  dut_id INTEGER NOT NULL REFERENCES duts (id),
+  device TEXT NOT NULL,
+  playbook TEXT NOT NULL,
+  step TEXT NOT NULL,
+  timestamp REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+  step_id INTEGER NOT NULL REFERENCES steps (id),
+  job TEXT NOT NULL,
+  io_type TEXT NOT NULL,
+  name TEXT NOT NULL,
+  value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS histograms (
+  step_id INTEGER NOT NULL REFERENCES steps (id),
+  job TEXT NOT NULL,
+  io_type TEXT NOT NULL,
+  section TEXT NOT NULL,
+  bin_values BLOB NOT NULL,
+  bin_counts BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS duts_model_firmware ON duts (model, firmware);
+CREATE INDEX IF NOT EXISTS steps_dut ON steps (dut_id, step, timestamp);
+CREATE INDEX IF NOT EXISTS steps_step ON steps (step, timestamp);
+CREATE INDEX IF NOT EXISTS metrics_name ON metrics (name, io_type, step_id);
+CREATE INDEX IF NOT EXISTS histograms_step ON histograms (step_id, section);
+"""
+_BIN_DTYPE = "<i8"
+# percentiles are stored as e.g. clat_ns.99.900000, other stats as clat_ns.max
+_LATENCY_STATS = ("mean", "max")
+
+
+class ResultsStore:
+  """Results of every step of every run, indexed by DUT and step.
+
+  Steps are buffered as they complete and written in bulk by flush, so storing
+  the results doesn't hold the diag back. The methods are threadsafe.
+  """
+
+  def __init__(self, path):
+    self._connection = sqlite3.connect(path, check_same_thread=False)
+    self._connection.execute("PRAGMA journal_mode=WAL")
+    self._connection.execute("PRAGMA synchronous=NORMAL")
+    self._connection.executescript(_SCHEMA)
+    self._lock = threading.Lock()
+    self._pending = []
+
+  def close(self):
+    self.flush()
+    self._connection.close()
+
+  def add_step(self, host, identity, device, playbook, step_result,
+               timestamp=None):
+    """Buffers the results of a step until the next flush.
+
+    Args:
+      host: name of the host running the diag.
+      identity: serial, model and firmware of the DUT.
+      device: device path of the DUT.
+      playbook: name of the playbook.
+      step_result: results of the step.
+      timestamp: when the step completed, now by default.
+    """
+    metrics = []
+    histograms = []
+    for job in step_result.jobs:
+      for io_type, io_stats in job.io_stats.items():
+        if not io_stats.io_bytes:
+          continue
+        metrics.extend((job.name, io_type, name, value) for name, value in (
+            ("bw", io_stats.bw), ("iops", io_stats.iops),
+            ("io_bytes", io_stats.io_bytes), ("runtime", io_stats.runtime)))
+        for section, latency in io_stats.latencies.items():
+          metrics.extend(
+              (job.name, io_type, "%s.%s" % (section, stat),
+               getattr(latency, stat)) for stat in _LATENCY_STATS)
+          metrics.extend(
+              (job.name, io_type, "%s.%s" % (section, percentile), value)
+              for percentile, value in latency.percentiles.items())
+          if latency.histogram is not None:
+            histograms.append((
+                job.name, io_type, section,
+                latency.histogram.values.astype(_BIN_DTYPE).tobytes(),
+                latency.histogram.counts.astype(_BIN_DTYPE).tobytes()))
+    step = (host, identity.get("serial", ""), identity.get("model", ""),
+            identity.get("firmware", ""), device, playbook, step_result.name,
+            timestamp if timestamp is not None else time.time())
+    with self._lock:
+      self._pending.append((step, metrics, histograms))
+
+  def flush(self):
+    """Writes all the buffered steps in a single transaction."""
+    with self._lock:
+      pending, self._pending = self._pending, []
+    if not pending:
+      return
+    with self._connection:
+      cursor = self._connection.cursor()
+      cursor.executemany(
+          "INSERT OR IGNORE INTO duts (serial, model, firmware) "
+          "VALUES (?, ?, ?)", {step[1:4] for step, _, _ in pending})
+      metrics = []
+      histograms = []
+      for step, step_metrics, step_histograms in pending:
+        cursor.execute(
+            "INSERT INTO steps (host, dut_id, device, playbook, step, "
+            "timestamp) SELECT ?, id, ?, ?, ?, ? FROM duts "
+            "WHERE serial = ? AND model = ? AND firmware = ?",
+            step[:1] + step[4:] + step[1:4])
+        step_id = cursor.lastrowid
+        metrics.extend((step_id,) + metric for metric in step_metrics)
+        histograms.extend(
+            (step_id,) + step_histogram for step_histogram in step_histograms)
+      cursor.executemany(
+          "INSERT INTO metrics (step_id, job, io_type, name, value) "
+          "VALUES (?, ?, ?, ?, ?)", metrics)
+      cursor.executemany(
+          "INSERT INTO histograms (step_id, job, io_type, section, "
+          "bin_values, bin_counts) VALUES (?, ?, ?, ?, ?, ?)", histograms)
+
+  def _where(self, table, step, io_type, model, firmware, host):
+    conditions = ["steps.step = ?", table + ".io_type = ?"]
+    params = [step, io_type]
+    for column, value in (("duts.model", model), ("duts.firmware", firmware),
+                          ("steps.host", host)):
+      if value is not None:
+        conditions.append("%s = ?" % column)
+        params.append(value)
+    return " AND ".join(conditions), params
+
+  def query_metric(self, name, step, io_type, model=None, firmware=None,
+                   host=None) -> np.ndarray:
+    """Returns the values of a metric across all the stored steps.
+
+    Args:
+      name: metric name, e.g. "bw" or "clat_ns.99.900000".
+      step: name of the test step.
+      io_type: read, write or trim.
+      model: restricts the results to the DUT model.
+      firmware: restricts the results to the firmware revision.
+      host: restricts the results to a host.
+    Returns:
+      The values of the metric.
+    """
+    where, params = self._where(
+        "metrics", step, io_type, model, firmware, host)
+    rows = self._connection.execute(
+        "SELECT metrics.value FROM metrics "
+        "JOIN steps ON steps.id = metrics.step_id "
+        "JOIN duts ON duts.id = steps.dut_id "
+        "WHERE metrics.name = ? AND " + where,
+        [name] + params).fetchall()
+    return np.array([row[0] for row in rows], dtype=np.float64)
+
+  def query_histograms(self, section, step, io_type, model=None,
+                       firmware=None, host=None):
+    """Returns the latency histograms across all the stored steps.
+
+    Args:
+      section: latency section, e.g. "clat_ns".
+      step: name of the test step.
+      io_type: read, write or trim.
+      model: restricts the results to the DUT model.
+      firmware: restricts the results to the firmware revision.
+      host: restricts the results to a host.
+    Returns:
+      The histogram of every job of every step found.
+    """
+    where, params = self._where(
+        "histograms", step, io_type, model, firmware, host)
+    rows = self._connection.execute(
+        "SELECT histograms.bin_values, histograms.bin_counts FROM histograms "
+        "JOIN steps ON steps.id = histograms.step_id "
+        "JOIN duts ON duts.id = steps.dut_id "
+        "WHERE histograms.section = ? AND " + where,
+        [section] + params).fetchall()
+    return [
+        histogram.LatencyHistogram(
+            np.frombuffer(values, dtype=_BIN_DTYPE),
+            np.frombuffer(counts, dtype=_BIN_DTYPE)) for values, counts in rows
+    ]
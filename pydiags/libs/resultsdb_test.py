@@ -0,0 +1,81 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from . import results
+from . import resultsdb
+
+
+def _step_result(p999_ns):
+  return results.StepResult.from_fio("iops_rand_rd.fio", {
+      "jobs": [{
+          "jobname": "rand_rd",
+          "read": {
+              "bw": 1024,
+              "io_bytes": 1048576,
+              "clat_ns": {"N": 1000, "mean": 1000, "max": p999_ns,
+                          "percentile": {"99.900000": p999_ns},
+                          "bins": {"1000": 999, str(p999_ns): 1}},
+          },
+          "write": {"io_bytes": 0},
+      }]
+  })
+
+
+_FW_A = {"serial": "S1", "model": "M", "firmware": "A"}
+_FW_B = {"serial": "S2", "model": "M", "firmware": "B"}
+
+
+class ResultsStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    log_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(log_dir.cleanup)
+    self.path = os.path.join(log_dir.name, "results.db")
+    self.store = resultsdb.ResultsStore(self.path)
+    self.addCleanup(self.store.close)
+
+  def test_query_metric_by_firmware(self):
+    self.store.add_step("host", _FW_A, "/dev/nvme0n1", "iops_rd.json",
+                        _step_result(5000))
+    self.store.add_step("host", _FW_A, "/dev/nvme0n1", "iops_rd.json",
+                        _step_result(6000))
+    self.store.add_step("host", _FW_B, "/dev/nvme1n1", "iops_rd.json",
+                        _step_result(9000))
+    # nothing is written until the steps are flushed
+    self.assertEqual(self.store.query_metric(
+        "clat_ns.99.900000", "iops_rand_rd.fio", "read").size, 0)
+    self.store.flush()
+    np.testing.assert_array_equal(
+        sorted(self.store.query_metric(
+            "clat_ns.99.900000", "iops_rand_rd.fio", "read", firmware="A")),
+        [5000, 6000])
+    np.testing.assert_array_equal(
+        self.store.query_metric("bw", "iops_rand_rd.fio", "read", model="M"),
+        [1024, 1024, 1024])
+    self.assertEqual(self.store.query_metric(
+        "bw", "iops_rand_rd.fio", "write").size, 0)
+
+  def test_query_histograms(self):
+    self.store.add_step("host", _FW_B, "/dev/nvme1n1", "iops_rd.json",
+                        _step_result(9000))
+    self.store.close()
+    store = resultsdb.ResultsStore(self.path)
+    self.addCleanup(store.close)
+    histograms = store.query_histograms(
+        "clat_ns", "iops_rand_rd.fio", "read", firmware="B")
+    self.assertEqual(len(histograms), 1)
+    self.assertEqual(histograms[0].to_fio(), {"1000": 999, "9000": 1})
+
+
+if __name__ == "__main__":
+  unittest.main()
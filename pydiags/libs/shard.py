@@ -0,0 +1,107 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Splitting of a full-device step into regions, one fio job per region.
+
+A single submission thread can't saturate a fast drive, so every job of the
+step config is cloned with numjobs, the clones get consecutive regions of the
+same size through offset_increment. The results of the clones are merged back
+into the job they were cloned from.
+"""
+import os
+from dataclasses import dataclass
+
+from . import performance
+from . import results
+
+# the smallest region worth its own job
+MIN_SHARD_BYTES = 64 << 30
+# regions start on a boundary every block size divides
+ALIGN_BYTES = 1 << 20
+
+
+@dataclass
+class FailedShard:
+  job: str
+  index: int
+  offset: int
+  size: int
+  error: int
+
+
+def auto_shards(capacity, cpus=None) -> int:
+  """Picks the number of regions, a job per CPU unless regions get too small.
+
+  Args:
+    capacity: DUT size in bytes.
+    cpus: CPUs available, os.cpu_count() by default.
+  Returns:
+    The number of regions, at least 1.
+  """
+  cpus = cpus or os.cpu_count() or 1
+  return max(1, min(cpus, capacity // MIN_SHARD_BYTES))
+
+
+def shard_size(capacity, shards) -> int:
+  """Returns the size of every region, aligned down.
+
+  The last region ends up to shards MiB before the end of the device.
+  """
+  return capacity // shards // ALIGN_BYTES * ALIGN_BYTES
+
+
+def job_options(shards, size) -> dict:
+  """Returns the job options splitting every job into regions.
+
+  Args:
+    shards: number of regions.
+    size: size of every region in bytes.
+  Returns:
+    The options to set in the jobs, see fiojob.write_with.
+  """
+  return {
+      "numjobs": str(shards),
+      "size": str(size),
+      "offset_increment": str(size),
+  }
+
+
+def failed_shards(step_result, shards, size) -> list[FailedShard]:
+  """Returns the regions whose job failed, e.g. on a verify error."""
+  return [
+      FailedShard(job.name, index % shards, index % shards * size, size,
+                  job.error)
+      for index, job in enumerate(step_result.jobs) if job.error
+  ]
+
+
+def merge(step_result, shards) -> results.StepResult:
+  """Merges the clones of every job of a sharded step.
+
+  fio reports the clones of a job one after another, they are merged the way
+  group reporting does.
+
+  Args:
+    step_result: results of the sharded step.
+    shards: number of regions.
+  Returns:
+    The results of the step with one job per job of the step config.
+  """
+  jobs = []
+  job_logs = [] if step_result.job_logs else None
+  for start in range(0, len(step_result.jobs), shards):
+    clone_logs = (step_result.job_logs[start:start + shards]
+                  if step_result.job_logs else None)
+    job, logs = performance.aggregate_jobs(
+        step_result.jobs[start:start + shards], clone_logs)
+    jobs.append(job)
+    if job_logs is not None:
+      job_logs.append(logs)
+  merged = results.StepResult(step_result.name, jobs, job_logs,
+                              step_result.raw_path)
+  merged.throttle_events = step_result.throttle_events
+  merged.endurance = step_result.endurance
+  return merged
@@ -0,0 +1,79 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import tempfile
+import unittest
+
+from . import fiojob
+from . import results
+from . import shard
+from . import timeseries
+
+_GIB = 1 << 30
+
+
+def _job(name, bw, error=0):
+  return {
+      "jobname": name,
+      "error": error,
+      "write": {"bw": bw, "iops": bw // 8, "io_bytes": bw * 1024,
+                "runtime": 1000,
+                "clat_ns": {"N": 2, "bins": {"1000": 1, "2000": 1}}},
+  }
+
+
+class ShardTest(unittest.TestCase):
+
+  def test_auto_shards(self):
+    self.assertEqual(shard.auto_shards(4096 * _GIB, cpus=16), 16)
+    self.assertEqual(shard.auto_shards(256 * _GIB, cpus=16), 4)
+    self.assertEqual(shard.auto_shards(10 * _GIB, cpus=16), 1)
+
+  def test_shard_size(self):
+    size = shard.shard_size(1000 * _GIB + 12345, 3)
+    self.assertEqual(size % (1 << 20), 0)
+    self.assertLessEqual(3 * size, 1000 * _GIB)
+    self.assertGreater(3 * (size + (1 << 20)), 1000 * _GIB)
+
+  def test_job_options(self):
+    configs = os.path.join(os.path.dirname(__file__), "..", "configs")
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = fiojob.write_with(
+          os.path.join(configs,
+                       "basic_io_logical_seq_wr_8kb_bs_1024_qd_known_pattern"
+                       ".fio"),
+          os.path.join(tmpdir, "sharded.fio"), shard.job_options(4, _GIB))
+      jobs = fiojob.jobs(fiojob.read(path))
+    self.assertEqual(len(jobs), 1)
+    self.assertEqual(jobs[0].get("numjobs"), "4")
+    self.assertEqual(jobs[0].get("size"), str(_GIB))
+    self.assertEqual(jobs[0].get("offset_increment"), str(_GIB))
+    self.assertEqual(jobs[0].get("verify"), "meta")
+
+  def test_merge(self):
+    step_result = results.StepResult.from_fio("seq_wr.fio", {"jobs": [
+        _job("seq_wr", 100), _job("seq_wr", 200), _job("seq_rd", 50),
+        _job("seq_rd", 70, error=84),
+    ]})
+    step_result.job_logs = [
+        {"bw": {"write": timeseries.TimeSeries([0, 5000], [bw, bw])}}
+        for bw in (100, 200, 50, 70)
+    ]
+    self.assertEqual(shard.failed_shards(step_result, 2, _GIB), [
+        shard.FailedShard("seq_rd", 1, _GIB, _GIB, 84)])
+    merged = shard.merge(step_result, 2)
+    self.assertEqual([job.name for job in merged.jobs], ["seq_wr", "seq_rd"])
+    self.assertEqual(merged.jobs[0].io_stats["write"].bw, 300)
+    self.assertEqual(merged.jobs[0].io_stats["write"].latencies[
+        "clat_ns"].count, 4)
+    self.assertEqual(merged.jobs[1].error, 84)
+    self.assertEqual(
+        merged.job_logs[0]["bw"]["write"].values.tolist(), [300, 300])
+
+
+if __name__ == "__main__":
+  unittest.main()
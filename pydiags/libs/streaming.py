@@ -0,0 +1,119 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Live reporting of fio status snapshots as OCP measurement series."""
+import json
+from typing import Iterable, Iterator
+
+from . import results
+
+_IO_TYPES = ("read", "write", "trim")
+_CLAT_PERCENTILES = {
+    "clat50thNsec": "50.000000",
+    "clat99thNsec": "99.000000",
+    "clat999thNsec": "99.900000",
+}
+MS_IN_SEC = 1000
+
+
+def iter_json_documents(lines: Iterable[str]) -> Iterator[dict]:
+  """Splits the stream of JSON documents fio prints with --status-interval.
+
+  fio pretty-prints every report, so a document ends with a closing brace at
+  the beginning of a line. Anything outside of a document is skipped.
+
+  Args:
+    lines: the lines of fio stdout.
+  Yields:
+    Every fio report parsed, the last one holds the final results.
+  """
+  buffer = []
+  for line in lines:
+    if not buffer and not line.startswith("{"):
+      continue
+    buffer.append(line)
+    if line.rstrip() != "}":
+      continue
+    try:
+      document = json.loads("".join(buffer))
+    except json.JSONDecodeError:
+      continue
+    buffer = []
+    yield document
+
+
+class StatusReporter:
+  """Emits bandwidth, IOPS and latency of every fio job on an OCP step.
+
+  fio reports cumulative counters, bandwidth and IOPS are computed over the
+  interval between two consecutive snapshots so a stall shows up right away.
+  Latency percentiles are the cumulative ones reported by fio.
+  """
+
+  def __init__(self, step):
+    self._step = step
+    self._series = {}
+    self._counters = {}
+
+  def add_snapshot(self, snapshot: dict):
+    for job_id, job in enumerate(results.fio_jobs(snapshot)):
+      for io_type in _IO_TYPES:
+        stats = job.get(io_type)
+        if not stats or not stats.get("io_bytes"):
+          continue
+        prefix = "%s[%d].%s" % (job.get("jobname", ""), job_id, io_type)
+        counters = (stats["runtime"], stats["io_kbytes"], stats["total_ios"])
+        runtime, io_kbytes, total_ios = self._counters.get(prefix, (0, 0, 0))
+        self._counters[prefix] = counters
+        elapsed_ms = counters[0] - runtime
+        if elapsed_ms <= 0:
+          continue
+        self._add_measurement(
+            prefix + ".bwKbytesPerSec",
+            (counters[1] - io_kbytes) * MS_IN_SEC / elapsed_ms, "KiB/s")
+        self._add_measurement(
+            prefix + ".iops",
+            (counters[2] - total_ios) * MS_IN_SEC / elapsed_ms, "IOPS")
+        percentiles = stats.get("clat_ns", {}).get("percentile", {})
+        for name, fio_name in _CLAT_PERCENTILES.items():
+          if fio_name in percentiles:
+            self._add_measurement(
+                "%s.%s" % (prefix, name), percentiles[fio_name], "ns")
+
+  def _add_measurement(self, name, value, unit):
+    series = self._series.get(name)
+    if series is None:
+      series = self._step.start_measurement_series(name=name, unit=unit)
+      self._series[name] = series
+    series.add_measurement(value=value)
+
+  def end(self):
+    for series in self._series.values():
+      series.end()
+    self._series = {}
+
+
+def stream(lines: Iterable[str], step) -> dict:
+  """Reports every fio status snapshot on the step as it arrives.
+
+  Args:
+    lines: the lines of fio stdout.
+    step: OCP step the measurements are attached to.
+  Returns:
+    The final fio output.
+  Raises:
+    IOError: fio didn't report any results.
+  """
+  reporter = StatusReporter(step)
+  fio_output = None
+  try:
+    for fio_output in iter_json_documents(lines):
+      reporter.add_snapshot(fio_output)
+  finally:
+    reporter.end()
+  if fio_output is None:
+    raise IOError("fio did not report any results.")
+  return fio_output
@@ -0,0 +1,71 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json
+import unittest
+from unittest import mock
+
+from . import streaming
+
+
+def _snapshot(runtime_ms, io_kbytes, total_ios):
+  return {
+      "jobs": [{
+          "jobname": "seq_wr",
+          "write": {
+              "io_bytes": io_kbytes * 1024,
+              "io_kbytes": io_kbytes,
+              "total_ios": total_ios,
+              "runtime": runtime_ms,
+              "clat_ns": {"percentile": {"99.000000": 2000}},
+          },
+          "read": {"io_bytes": 0},
+      }]
+  }
+
+
+def _fio_stdout(*snapshots):
+  lines = ["fio: some warning\n"]
+  for snapshot in snapshots:
+    lines.extend(
+        line + "\n" for line in json.dumps(snapshot, indent=2).split("\n"))
+  return lines
+
+
+class StreamingTest(unittest.TestCase):
+
+  def test_iter_json_documents(self):
+    documents = list(streaming.iter_json_documents(
+        _fio_stdout(_snapshot(1000, 10, 1), _snapshot(2000, 20, 2))))
+    self.assertEqual(len(documents), 2)
+    self.assertEqual(documents[1]["jobs"][0]["write"]["runtime"], 2000)
+
+  def test_stream_emits_interval_measurements(self):
+    step = mock.MagicMock()
+    series = {}
+    step.start_measurement_series.side_effect = (
+        lambda name, unit: series.setdefault(name, mock.MagicMock()))
+    output = streaming.stream(
+        _fio_stdout(_snapshot(1000, 1000, 10), _snapshot(3000, 1000, 10)),
+        step)
+    self.assertEqual(output, _snapshot(3000, 1000, 10))
+    self.assertEqual(
+        sorted(series),
+        ["seq_wr[0].write.bwKbytesPerSec", "seq_wr[0].write.clat99thNsec",
+         "seq_wr[0].write.iops"])
+    bandwidth = series["seq_wr[0].write.bwKbytesPerSec"]
+    self.assertEqual(bandwidth.add_measurement.call_args_list,
+                     [mock.call(value=1000.0), mock.call(value=0.0)])
+    for item in series.values():
+      item.end.assert_called_once()
+
+  def test_stream_without_output(self):
+    with self.assertRaises(IOError):
+      streaming.stream(["fio: file not found\n"], mock.MagicMock())
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,148 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Points of a queue depth, numjobs and arrival rate sweep and their knee."""
+import itertools
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from . import histogram
+from . import results
+
+_CLAT = "clat_ns"
+NS_IN_US = 1000
+# open-loop arrivals of rate limited points
+_RATE_PROCESS = "poisson"
+
+
+@dataclass
+class SweepPoint:
+  """A single fio run of a sweep and its results once it ran."""
+  iodepth: int
+  numjobs: int
+  rate_iops: Optional[int] = None
+  raw_path: str = ""
+  jobs: list = field(default_factory=list)
+
+  @property
+  def name(self) -> str:
+    name = "qd%d_jobs%d" % (self.iodepth, self.numjobs)
+    if self.rate_iops:
+      name += "_rate%d" % self.rate_iops
+    return name
+
+  def fio_options(self) -> dict:
+    """Returns the job options of the point, see fiojob.write_with."""
+    options = {"iodepth": str(self.iodepth), "numjobs": str(self.numjobs)}
+    if self.rate_iops:
+      options.update(rate_iops=str(self.rate_iops),
+                     rate_process=_RATE_PROCESS)
+    return options
+
+  def _io_stats(self, io_type):
+    return [
+        stats for job in self.jobs for name, stats in job.io_stats.items()
+        if (io_type is None or name == io_type) and stats.io_bytes
+    ]
+
+  def iops(self, io_type=None) -> float:
+    """Returns the IOPS of all the jobs, of a single data direction if set."""
+    return float(sum(stats.iops for stats in self._io_stats(io_type)))
+
+  def bw(self, io_type=None) -> float:
+    """Returns the bandwidth of all the jobs in KiB/s."""
+    return float(sum(stats.bw for stats in self._io_stats(io_type)))
+
+  def latency_usec(self, percentile, io_type=None) -> Optional[float]:
+    """Returns a completion latency percentile of all the jobs.
+
+    Args:
+      percentile: e.g. 99.9.
+      io_type: restricts the latency to a data direction.
+    Returns:
+      The percentile in microseconds, None without latency bins.
+    """
+    histograms = [
+        stats.latencies[_CLAT].histogram for stats in self._io_stats(io_type)
+        if _CLAT in stats.latencies and
+        stats.latencies[_CLAT].histogram is not None
+    ]
+    if not histograms:
+      return None
+    merged = histogram.LatencyHistogram.merge(histograms)
+    if not merged.total:
+      return None
+    return float(merged.percentiles(np.array([percentile]))[0]) / NS_IN_US
+
+
+def grid(settings) -> list[SweepPoint]:
+  """Expands the sweep settings of a step into its points.
+
+  Args:
+    settings: playbook.Sweep of the step.
+  Returns:
+    A point for every combination of the settings, numjobs varying fastest.
+  """
+  rates = settings.rate_iops or [None]
+  return [
+      SweepPoint(iodepth, numjobs, rate)
+      for iodepth, rate, numjobs in itertools.product(
+          settings.iodepth, rates, settings.numjobs)
+  ]
+
+
+def knee(points, percentile, max_latency_usec,
+         io_type=None) -> Optional[SweepPoint]:
+  """Finds the highest IOPS point meeting a latency SLA.
+
+  Args:
+    points: points that ran.
+    percentile: completion latency percentile of the SLA, e.g. 99.9.
+    max_latency_usec: highest latency of the SLA, None for no SLA.
+    io_type: restricts IOPS and latency to a data direction.
+  Returns:
+    The point, None if none of them meets the SLA.
+  """
+  meeting = []
+  for point in points:
+    latency = point.latency_usec(percentile, io_type)
+    if max_latency_usec is None or (latency is not None and
+                                    latency <= max_latency_usec):
+      meeting.append(point)
+  return max(meeting, key=lambda point: point.iops(io_type), default=None)
+
+
+def step_result(name, settings, points) -> results.StepResult:
+  """Builds the result of a swept step.
+
+  The jobs of the step are the ones of the knee, or of the highest IOPS point
+  if none meets the SLA, so the regular targets apply to that point.
+
+  Args:
+    name: name of the step.
+    settings: playbook.Sweep of the step.
+    points: points that ran.
+  Returns:
+    The result of the step with all the points in its sweep.
+  """
+  operating = (knee(points, settings.sla_percentile, settings.sla_latency_usec)
+               or knee(points, settings.sla_percentile, None))
+  result = results.StepResult(name, operating.jobs, raw_path=operating.raw_path)
+  result.sweep = points
+  return result
+
+
+def load_point(point_descriptor) -> SweepPoint:
+  """Reads back a point recorded in a checkpoint from its fio output."""
+  point = SweepPoint(point_descriptor["iodepth"], point_descriptor["numjobs"],
+                     point_descriptor.get("rate_iops"),
+                     point_descriptor["raw_path"])
+  point.jobs = results.StepResult.from_fio(
+      "", results.load_raw(point.raw_path)).jobs
+  return point
+
@@ -0,0 +1,77 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import unittest
+
+from . import playbook
+from . import results
+from . import sweep
+
+
+def _point(iodepth, iops, p999_usec):
+  point = sweep.SweepPoint(iodepth, 1)
+  point.jobs = results.StepResult.from_fio("", {"jobs": [{
+      "jobname": "rand_rd",
+      "read": {
+          "iops": iops, "bw": iops * 4, "io_bytes": 4096 * 1000,
+          "clat_ns": {"N": 1000, "bins": {"10000": 990,
+                                          str(p999_usec * 1000): 10}},
+      },
+      "write": {"iops": 0, "io_bytes": 0},
+  }]}).jobs
+  return point
+
+
+class SweepTest(unittest.TestCase):
+
+  def test_grid(self):
+    points = sweep.grid(playbook.Sweep(iodepth=[1, 32], numjobs=[1, 4]))
+    self.assertEqual([point.name for point in points], [
+        "qd1_jobs1", "qd1_jobs4", "qd32_jobs1", "qd32_jobs4"])
+    self.assertEqual(points[3].fio_options(),
+                     {"iodepth": "32", "numjobs": "4"})
+    points = sweep.grid(playbook.Sweep(iodepth=[8], rate_iops=[1000, 2000]))
+    self.assertEqual(points[1].name, "qd8_jobs1_rate2000")
+    self.assertEqual(points[1].fio_options(), {
+        "iodepth": "8", "numjobs": "1", "rate_iops": "2000",
+        "rate_process": "poisson"})
+
+  def test_point_metrics(self):
+    point = _point(32, 100000, 800)
+    self.assertEqual(point.iops(), 100000)
+    self.assertEqual(point.iops("write"), 0)
+    self.assertEqual(point.bw("read"), 400000)
+    self.assertEqual(point.latency_usec(50), 10)
+    self.assertEqual(point.latency_usec(99.9), 800)
+    self.assertIsNone(point.latency_usec(99.9, "write"))
+
+  def test_knee(self):
+    points = [_point(1, 20000, 100), _point(32, 100000, 400),
+              _point(256, 150000, 3000)]
+    self.assertEqual(sweep.knee(points, 99.9, 500).iodepth, 32)
+    self.assertEqual(sweep.knee(points, 99.9, None).iodepth, 256)
+    self.assertIsNone(sweep.knee(points, 99.9, 50))
+    self.assertEqual(sweep.knee(points, 50, 50).iodepth, 256)
+
+  def test_step_result(self):
+    points = [_point(1, 20000, 100), _point(32, 100000, 400),
+              _point(256, 150000, 3000)]
+    points[1].raw_path = "qd32.json.gz"
+    step_result = sweep.step_result(
+        "rd.fio", playbook.Sweep(iodepth=[1, 32, 256], sla_latency_usec=500),
+        points)
+    self.assertIs(step_result.jobs, points[1].jobs)
+    self.assertEqual(step_result.raw_path, "qd32.json.gz")
+    self.assertEqual(step_result.sweep, points)
+    # no point meets the SLA, the highest IOPS one is reported
+    step_result = sweep.step_result(
+        "rd.fio", playbook.Sweep(iodepth=[1, 32, 256], sla_latency_usec=50),
+        points)
+    self.assertIs(step_result.jobs, points[2].jobs)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,173 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Time series of fio bandwidth, IOPS and latency logs."""
+import glob
+import os
+import re
+import warnings
+
+import numpy as np
+
+# data direction column of the fio logs
+_IO_TYPES = ("read", "write", "trim")
+_LOG_TYPES = ("bw", "iops", "clat")
+_JOB_LOG = re.compile(r"_(?P<log_type>[a-z]+)\.(?P<job>\d+)\.log$")
+# fio averages bandwidth over bwavgtime=5000 in the shipped configs
+WINDOW_MSEC = 5000
+CLIFF_DROP_PERCENT = 30
+
+
+class TimeSeries:
+  """Samples of a single fio log for a single data direction.
+
+  The values are rates for bandwidth (KiB/s) and IOPS logs and nanoseconds for
+  latency logs, averaged by fio over log_avg_msec.
+  """
+
+  def __init__(self, times_msec, values):
+    self._times = np.asarray(times_msec, dtype=np.int64)
+    self._values = np.asarray(values)
+
+  @property
+  def times(self) -> np.ndarray:
+    return self._times
+
+  @property
+  def values(self) -> np.ndarray:
+    return self._values
+
+  def windowed(self, window_msec=WINDOW_MSEC):
+    """Averages the samples over fixed windows.
+
+    Args:
+      window_msec: width of a window in milliseconds.
+    Returns:
+      Start time of every non-empty window and the mean value in the window.
+    """
+    if not self._values.size:
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    windows = self._times // window_msec
+    counts = np.bincount(windows)
+    sums = np.bincount(windows, weights=self._values)
+    present = np.flatnonzero(counts)
+    return present * window_msec, sums[present] / counts[present]
+
+  def min_windowed(self, window_msec=WINDOW_MSEC) -> float:
+    """Returns the lowest value averaged over a window."""
+    _, means = self.windowed(window_msec)
+    return float(means.min()) if means.size else 0.0
+
+  def cov_percent(self) -> float:
+    """Returns the coefficient of variation of the samples in percent."""
+    if not self._values.size or not self._values.mean():
+      return 0.0
+    return float(100 * self._values.std() / self._values.mean())
+
+  def drops_percent(self, window_msec=WINDOW_MSEC):
+    """Computes how far every window is below the best window before it.
+
+    Args:
+      window_msec: width of a window in milliseconds.
+    Returns:
+      Start time of every non-empty window and its drop in percent.
+    """
+    times, means = self.windowed(window_msec)
+    peaks = np.maximum.accumulate(means)
+    drops = np.zeros(means.shape, dtype=np.float64)
+    np.divide(100 * (peaks - means), peaks, out=drops, where=peaks > 0)
+    return times, drops
+
+  def max_drop_percent(self, window_msec=WINDOW_MSEC) -> float:
+    _, drops = self.drops_percent(window_msec)
+    return float(drops.max()) if drops.size else 0.0
+
+  def cliffs(self, drop_percent=CLIFF_DROP_PERCENT,
+             window_msec=WINDOW_MSEC) -> np.ndarray:
+    """Finds the points in time the performance falls off a cliff.
+
+    Args:
+      drop_percent: how far below the preceding peak a window has to be.
+      window_msec: width of a window in milliseconds.
+    Returns:
+      Start times of the windows where a drop begins.
+    """
+    times, drops = self.drops_percent(window_msec)
+    below = drops > drop_percent
+    starts = below & ~np.concatenate(([False], below[:-1]))
+    return times[starts]
+
+
+def combine(series, window_msec=WINDOW_MSEC):
+  """Sums the rates of several jobs, e.g. the bandwidth of a job group.
+
+  The jobs log at slightly different times, so the rates are summed per window.
+
+  Args:
+    series: time series of the jobs.
+    window_msec: width of a window in milliseconds.
+  Returns:
+    A time series with a sample per window.
+  """
+  windowed = [s.windowed(window_msec) for s in series]
+  times = np.concatenate([times for times, _ in windowed])
+  means = np.concatenate([means for _, means in windowed])
+  if not times.size:
+    return TimeSeries(times, means)
+  windows = times // window_msec
+  sums = np.bincount(windows, weights=means)
+  present = np.flatnonzero(np.bincount(windows))
+  return TimeSeries(present * window_msec, sums[present])
+
+
+def read_log(path):
+  """Reads a fio log without loading the text into memory at once.
+
+  Args:
+    path: fio log file.
+  Returns:
+    A time series for every data direction present in the log.
+  """
+  with warnings.catch_warnings():
+    # an empty log is not an error, the job may not have issued any IO
+    warnings.simplefilter("ignore", UserWarning)
+    samples = np.loadtxt(path, delimiter=",", usecols=(0, 1, 2),
+                         dtype=np.int64, ndmin=2)
+  series = {}
+  for ddir, io_type in enumerate(_IO_TYPES):
+    rows = samples[:, 2] == ddir
+    if rows.any():
+      series[io_type] = TimeSeries(samples[rows, 0], samples[rows, 1])
+  return series
+
+
+def fio_log_args(prefix, log_avg_msec):
+  """Returns fio options that turn on the logs read by read_job_logs."""
+  return [
+      "--write_bw_log=%s" % prefix,
+      "--write_iops_log=%s" % prefix,
+      "--write_lat_log=%s" % prefix,
+      "--log_avg_msec=%d" % log_avg_msec,
+  ]
+
+
+def read_job_logs(prefix):
+  """Reads all the logs fio wrote for a step.
+
+  Args:
+    prefix: the prefix passed to fio with fio_log_args.
+  Returns:
+    For every job, in the order of fio output, a mapping of log type to the
+    time series of every data direction, e.g. logs[0]["bw"]["write"].
+  """
+  jobs = {}
+  for path in glob.glob(glob.escape(prefix) + "_*.log"):
+    match = _JOB_LOG.search(os.path.basename(path))
+    if not match or match.group("log_type") not in _LOG_TYPES:
+      continue
+    job_logs = jobs.setdefault(int(match.group("job")), {})
+    job_logs[match.group("log_type")] = read_log(path)
+  return [jobs[job] for job in sorted(jobs)]
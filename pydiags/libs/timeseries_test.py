@@ -0,0 +1,62 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from . import timeseries
+
+# a write running at 1000 KiB/s for 20s that falls down to 400 KiB/s
+_WRITE_BW = [1000] * 20 + [400] * 10
+
+
+def _write_log(path, values, ddir=1):
+  with open(path, "w") as f:
+    for second, value in enumerate(values):
+      f.write("%d, %d, %d, 8192, 0\n" % (second * 1000, value, ddir))
+
+
+class TimeSeriesTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.series = timeseries.TimeSeries(
+        np.arange(30) * 1000, _WRITE_BW)
+
+  def test_windowed(self):
+    times, means = self.series.windowed(10000)
+    np.testing.assert_array_equal(times, [0, 10000, 20000])
+    np.testing.assert_allclose(means, [1000, 1000, 400])
+
+  def test_summary(self):
+    self.assertEqual(self.series.min_windowed(), 400)
+    self.assertAlmostEqual(self.series.max_drop_percent(), 60)
+    self.assertGreater(self.series.cov_percent(), 0)
+
+  def test_cliffs(self):
+    np.testing.assert_array_equal(self.series.cliffs(), [20000])
+    self.assertEqual(self.series.cliffs(drop_percent=70).size, 0)
+
+  def test_read_job_logs(self):
+    with tempfile.TemporaryDirectory() as log_dir:
+      prefix = os.path.join(log_dir, "seq_wr")
+      _write_log(prefix + "_bw.1.log", _WRITE_BW)
+      _write_log(prefix + "_iops.1.log", [10, 20], ddir=0)
+      _write_log(prefix + "_bw.2.log", [])
+      job_logs = timeseries.read_job_logs(prefix)
+    self.assertEqual(len(job_logs), 2)
+    self.assertEqual(sorted(job_logs[0]), ["bw", "iops"])
+    np.testing.assert_array_equal(
+        job_logs[0]["bw"]["write"].values, _WRITE_BW)
+    np.testing.assert_array_equal(job_logs[0]["iops"]["read"].values, [10, 20])
+    self.assertEqual(job_logs[1], {"bw": {}})
+
+
+if __name__ == "__main__":
+  unittest.main()
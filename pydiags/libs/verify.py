@@ -0,0 +1,155 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+"""Verify methods of the steps and the checksum throughput of the host.
+
+fio --crctest measures how fast a single CPU of the host computes every
+checksum fio verifies data with. A step asking for the fastest verify gets
+the fastest checksum of INTEGRITY_METHODS on the host, and the throughput
+tells how much CPU the verification of a step costs. The measurement takes a
+few seconds and is kept in a cache file per host and fio version.
+"""
+import dataclasses
+import functools
+import json
+import os
+import re
+import subprocess
+import time
+
+from . import fiojob
+
+# the fastest of INTEGRITY_METHODS on the host
+FASTEST = "fastest"
+# fio verify methods checksumming the whole data of every block
+INTEGRITY_METHODS = ("crc32c", "crc32", "crc64", "xxhash", "md5", "sha1",
+                     "sha256", "sha512", "sha3-224", "sha3-256", "sha3-384",
+                     "sha3-512")
+# crc16 and crc7 are too weak to tell corrupted data apart, meta and pattern
+# don't checksum the data
+METHODS = INTEGRITY_METHODS + ("crc16", "crc7", "meta", "pattern")
+# picked without a measurement, fio uses the CRC instructions of the CPU
+FALLBACK = "crc32c"
+_NO_VERIFY = ("0", "null")
+_CHECKSUMMED_IO_TYPES = ("read", "write")
+_CRCTEST_LINE = re.compile(
+    r"^(?P<name>[\w-]+):\s+(?P<throughput>\d+(\.\d+)?)\s*MiB/s")
+_CRCTEST_TIMEOUT_SEC = 120
+
+
+def parse_crctest(output) -> dict[str, float]:
+  """Returns the throughput of every checksum fio --crctest printed, in MiB/s."""
+  throughputs = {}
+  for line in output.splitlines():
+    match = _CRCTEST_LINE.match(line.strip())
+    if match:
+      throughputs[match.group("name")] = float(match.group("throughput"))
+  return throughputs
+
+
+def _run(args) -> str:
+  return subprocess.run(args, capture_output=True, text=True, check=True,
+                        timeout=_CRCTEST_TIMEOUT_SEC).stdout
+
+
+@functools.lru_cache(maxsize=None)
+def fio_version(fio_path) -> str:
+  try:
+    return _run([fio_path, "--version"]).strip()
+  except (IOError, subprocess.SubprocessError) as _:
+    return ""
+
+
+@dataclasses.dataclass
+class Profile:
+  """Checksum throughput of a host.
+
+  Attributes:
+    host: the host measured.
+    fio_version: the fio measured, its checksums may change between versions.
+    measured: when, seconds since the epoch.
+    throughputs: MiB/s of a single CPU for every checksum.
+  """
+  host: str
+  fio_version: str
+  measured: float
+  throughputs: dict[str, float]
+
+  def fastest(self) -> str:
+    """Returns the fastest integrity-grade method, FALLBACK if none measured."""
+    measured = [method for method in INTEGRITY_METHODS
+                if method in self.throughputs]
+    if not measured:
+      return FALLBACK
+    return max(measured, key=lambda method: self.throughputs[method])
+
+
+@functools.lru_cache(maxsize=None)
+def _measure(fio_path) -> tuple[tuple[str, float], ...]:
+  # the host doesn't change while the diag runs, it's measured once
+  return tuple(parse_crctest(_run([fio_path, "--crctest"])).items())
+
+
+def profile(host, fio_path, cache_path) -> Profile:
+  """Returns the checksum throughput of the host, measured if not cached.
+
+  Args:
+    host: name of the host.
+    fio_path: fio binary.
+    cache_path: JSON file keeping the profile of every host, e.g. of hosts
+      sharing a home dir.
+  Returns:
+    The profile of the host for that fio version.
+  Raises:
+    IOError: fio --crctest failed.
+  """
+  version = fio_version(fio_path)
+  profiles = {}
+  if os.path.exists(cache_path):
+    with open(cache_path) as f:
+      profiles = json.load(f)
+  cached = profiles.get(host)
+  if cached and cached["fio_version"] == version:
+    return Profile(**cached)
+  try:
+    throughputs = dict(_measure(fio_path))
+  except subprocess.SubprocessError as exc:
+    raise IOError("fio --crctest failed: %s" % exc) from exc
+  host_profile = Profile(host, version, time.time(), throughputs)
+  profiles[host] = dataclasses.asdict(host_profile)
+  os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+  with open(cache_path, "w") as f:
+    json.dump(profiles, f, indent=2)
+  return host_profile
+
+
+def verifies(sections) -> bool:
+  """Tells whether any job of a job file verifies the data."""
+  return any(
+      job.get("verify", "0") not in _NO_VERIFY
+      for job in fiojob.jobs(sections))
+
+
+def job_options(method) -> dict:
+  """Returns the job options verifying with a method, see fiojob.write_with."""
+  return {"verify": method}
+
+
+def cpu_percent(step_result, throughput) -> float:
+  """Estimates the CPU spent checksumming the data of a step.
+
+  Args:
+    step_result: results of the step, every byte read or written is
+      checksummed once.
+    throughput: MiB/s a single CPU checksums with the method of the step.
+  Returns:
+    The CPU cost in percent of a CPU.
+  """
+  kib_per_sec = sum(
+      stats.bw for job in step_result.jobs
+      for io_type, stats in job.io_stats.items()
+      if io_type in _CHECKSUMMED_IO_TYPES)
+  return kib_per_sec / 1024 / throughput * 100
@@ -0,0 +1,88 @@
+# Copyright 2024 Google LLC
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from . import fiojob
+from . import results
+from . import verify
+
+_CRCTEST = """
+md5:             587.57 MiB/s
+crc64:          2164.83 MiB/s
+crc32:           488.70 MiB/s
+crc32c:        11350.54 MiB/s
+crc16:           412.05 MiB/s
+crc7:            221.37 MiB/s
+sha1:            978.41 MiB/s
+sha256:          412.39 MiB/s
+sha512:          594.74 MiB/s
+xxhash:         8049.03 MiB/s
+murmur3:        6140.88 MiB/s
+jhash:          1560.09 MiB/s
+fnv:            4019.89 MiB/s
+sha3-224:        270.11 MiB/s
+"""
+
+
+class VerifyTest(unittest.TestCase):
+
+  def test_parse_crctest(self):
+    throughputs = verify.parse_crctest(_CRCTEST)
+    self.assertEqual(throughputs["crc32c"], 11350.54)
+    self.assertEqual(throughputs["sha3-224"], 270.11)
+    self.assertEqual(len(throughputs), 14)
+
+  def test_fastest(self):
+    profile = verify.Profile("host", "fio-3.36", 0,
+                             verify.parse_crctest(_CRCTEST))
+    self.assertEqual(profile.fastest(), "crc32c")
+    # murmur3 is not a verify method
+    profile.throughputs["crc32c"] = 100
+    self.assertEqual(profile.fastest(), "xxhash")
+    self.assertEqual(verify.Profile("host", "", 0, {}).fastest(),
+                     verify.FALLBACK)
+
+  def test_profile_cached_per_host(self):
+    tmpdir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmpdir.cleanup)
+    cache_path = os.path.join(tmpdir.name, "cache", "crctest.json")
+    verify._measure.cache_clear()
+    verify.fio_version.cache_clear()
+    self.addCleanup(verify._measure.cache_clear)
+    self.addCleanup(verify.fio_version.cache_clear)
+    with patch.object(verify, "_run",
+                      side_effect=["fio-3.36", _CRCTEST]) as run:
+      profile = verify.profile("host1", "fio", cache_path)
+      self.assertEqual(profile.fastest(), "crc32c")
+      self.assertEqual(profile.fio_version, "fio-3.36")
+      verify._measure.cache_clear()
+      self.assertEqual(verify.profile("host1", "fio", cache_path),
+                       profile)
+    self.assertEqual(run.call_count, 2)
+    with open(cache_path) as f:
+      self.assertIn("host1", json.load(f))
+
+  def test_verifies(self):
+    self.assertTrue(verify.verifies(fiojob.parse(
+        "[global]\nverify=meta\n[job]\nrw=write\n")))
+    self.assertFalse(verify.verifies(fiojob.parse("[job]\nrw=write\n")))
+    self.assertFalse(verify.verifies(fiojob.parse(
+        "[job]\nverify=0\n")))
+
+  def test_cpu_percent(self):
+    step_result = results.StepResult.from_fio("step", {"jobs": [
+        {"jobname": "job", "read": {"bw": 512 * 1024},
+         "write": {"bw": 512 * 1024}}]})
+    self.assertAlmostEqual(verify.cpu_percent(step_result, 2048), 50)
+
+
+if __name__ == "__main__":
+  unittest.main()